@@ -0,0 +1,185 @@
+"""Per-container admission control for model sessions.
+
+At most MAX_IN_FLIGHT_SESSIONS invoices talk to Bedrock at once; the rest
+wait FIFO in a bounded queue until a slot frees up or their deadline passes.
+When the queue is full, or a request would wait past its deadline, it is
+rejected immediately with a retry-after hint derived from recent session
+durations. That way throttling shows up as fast, retryable rejections
+instead of every stream slowing down together until they all time out.
+
+In-flight sessions, queue depth and a wait-time histogram are reported by
+snapshot(). They are also published to CloudWatch at most once per
+ADMISSION_METRICS_INTERVAL, with waits sent as Values/Counts so
+CloudWatch can compute percentiles.
+"""
+import asyncio
+import bisect
+import contextlib
+import math
+import os
+import time
+from collections import Counter, deque
+
+import boto3
+
+MAX_IN_FLIGHT_SESSIONS = int(os.environ.get('MAX_IN_FLIGHT_SESSIONS', '8'))
+ADMISSION_QUEUE_DEPTH = int(os.environ.get('ADMISSION_QUEUE_DEPTH', '32'))
+# Longest a request waits for a slot before it is rejected
+ADMISSION_TIMEOUT_SECONDS = float(os.environ.get('ADMISSION_TIMEOUT_SECONDS', '10'))
+ADMISSION_METRICS_INTERVAL = float(os.environ.get('ADMISSION_METRICS_INTERVAL', '60'))
+
+# Upper bounds (ms) of the wait-time histogram buckets; the last bucket is open-ended
+WAIT_BUCKETS_MS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+cloudwatch = boto3.client('cloudwatch')
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT_SESSIONS, max_queue_depth=ADMISSION_QUEUE_DEPTH,
+                 timeout=ADMISSION_TIMEOUT_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.timeout = timeout
+        self.in_flight = 0
+        self._waiters = deque()
+        self._wait_histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._interval_waits = Counter()
+        self._interval_rejected = 0
+        self._durations = deque(maxlen=50)
+        self.admitted = 0
+        self.rejected = Counter()
+        self._last_published = time.monotonic()
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    def saturated(self):
+        return self.in_flight >= self.max_in_flight
+
+    def retry_after(self):
+        """Seconds until a slot is likely to be free, from recent session durations"""
+        if not self._durations:
+            return 1
+        average = sum(self._durations) / len(self._durations)
+        rounds = (self.queue_depth + 1) / self.max_in_flight
+        return max(1, math.ceil(average * rounds))
+
+    def _record_wait(self, wait_ms):
+        self._wait_histogram[bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+        self._interval_waits[round(wait_ms)] += 1
+        self.admitted += 1
+
+    def _reject(self, reason):
+        self.rejected[reason] += 1
+        self._interval_rejected += 1
+        self.maybe_publish()
+        raise AdmissionRejected(reason, self.retry_after())
+
+    @contextlib.asynccontextmanager
+    async def session(self, timeout=None):
+        """Hold a model-session slot for the duration of the block; yields the wait in ms"""
+        timeout = self.timeout if timeout is None else min(float(timeout), self.timeout)
+        started = time.monotonic()
+
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+        else:
+            if self.queue_depth >= self.max_queue_depth:
+                self._reject("queue_full")
+            # Don't queue a request that can't be reached before its deadline
+            if self._durations and timeout < min(self._durations) * (self.queue_depth // self.max_in_flight):
+                self._reject("deadline_unreachable")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            except asyncio.TimeoutError:
+                # A slot handed over just as the deadline passed is still taken
+                if not waiter.done():
+                    waiter.cancel()
+                    self._waiters.remove(waiter)
+                    self._reject("timeout")
+            except asyncio.CancelledError:
+                # Caller went away while queued; pass on a slot we were already given
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                else:
+                    waiter.cancel()
+                    with contextlib.suppress(ValueError):
+                        self._waiters.remove(waiter)
+                raise
+
+        wait_ms = (time.monotonic() - started) * 1000
+        self._record_wait(wait_ms)
+        session_started = time.monotonic()
+        try:
+            yield wait_ms
+        finally:
+            self._durations.append(time.monotonic() - session_started)
+            self._release()
+            self.maybe_publish()
+
+    def _release(self):
+        # Hand the slot straight to the oldest waiter so in_flight never dips and refills
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def snapshot(self):
+        labels = [f"le_{bound}" for bound in WAIT_BUCKETS_MS] + [f"gt_{WAIT_BUCKETS_MS[-1]}"]
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_in_flight": self.max_in_flight,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "wait_ms_histogram": dict(zip(labels, self._wait_histogram)),
+            "retry_after": self.retry_after()
+        }
+
+    def maybe_publish(self):
+        """Publish gauges and the interval's wait distribution if the interval has elapsed"""
+        now = time.monotonic()
+        if now - self._last_published < ADMISSION_METRICS_INTERVAL:
+            return
+        self._last_published = now
+        waits, self._interval_waits = self._interval_waits, Counter()
+        rejected, self._interval_rejected = self._interval_rejected, 0
+        asyncio.get_running_loop().run_in_executor(
+            None, put_admission_metrics, self.in_flight, self.queue_depth, waits, rejected
+        )
+
+def put_admission_metrics(in_flight, queue_depth, waits, rejected):
+    dimensions = [{'Name': 'Environment', 'Value': os.environ.get('ENVIRONMENT', 'dev')}]
+    metric_data = [
+        {'MetricName': 'InFlightSessions', 'Value': in_flight, 'Unit': 'Count', 'Dimensions': dimensions},
+        {'MetricName': 'AdmissionQueueDepth', 'Value': queue_depth, 'Unit': 'Count', 'Dimensions': dimensions},
+        {'MetricName': 'AdmissionRejected', 'Value': rejected, 'Unit': 'Count', 'Dimensions': dimensions},
+    ]
+    # CloudWatch accepts up to 150 distinct values per datum
+    values = sorted(waits)
+    for start in range(0, len(values), 150):
+        chunk = values[start:start + 150]
+        metric_data.append({
+            'MetricName': 'AdmissionWaitTime',
+            'Values': [float(value) for value in chunk],
+            'Counts': [float(waits[value]) for value in chunk],
+            'Unit': 'Milliseconds',
+            'Dimensions': dimensions
+        })
+    try:
+        cloudwatch.put_metric_data(Namespace='GlobalInvoiceAI', MetricData=metric_data)
+    except Exception as e:
+        print(f"Failed to publish admission metrics: {e}")
+
+admission = AdmissionController()
@@ -0,0 +1,113 @@
+"""Currency conversion for the invoice agent.
+
+The USD-based rate table is expanded once at import into an N x N cross-rate
+matrix, so a conversion is a single indexed read and a batch of conversions
+is one vectorized gather + multiply + round over numpy arrays.
+"""
+import itertools
+from datetime import datetime
+
+import numpy as np
+
+# Hardcoded exchange rates for demo purposes
+# In production, these would come from real-time APIs like Fixer.io
+EXCHANGE_RATES = {
+    # Base rates (relative to USD)
+    "USD": 1.0,
+    "EUR": 0.85,     # 1 USD = 0.85 EUR
+    "GBP": 0.73,     # 1 USD = 0.73 GBP
+    "INR": 83.0,     # 1 USD = 83 INR
+    "CAD": 1.35,     # 1 USD = 1.35 CAD
+    "AUD": 1.52,     # 1 USD = 1.52 AUD
+    "JPY": 150.0,    # 1 USD = 150 JPY
+    "CHF": 0.92,     # 1 USD = 0.92 CHF
+    "CNY": 7.25,     # 1 USD = 7.25 CNY
+    "BRL": 5.2,      # 1 USD = 5.2 BRL
+}
+
+# ISO 4217 minor units; currencies not listed use 2 decimal places
+MINOR_UNITS = {
+    "JPY": 0,
+}
+
+CURRENCY_CODES = tuple(EXCHANGE_RATES)
+CURRENCY_INDEX = {code: i for i, code in enumerate(CURRENCY_CODES)}
+
+def _build_rate_matrix():
+    """RATE_MATRIX[i, j] converts one unit of CURRENCY_CODES[i] into CURRENCY_CODES[j]"""
+    usd_rates = np.array([EXCHANGE_RATES[code] for code in CURRENCY_CODES], dtype=np.float64)
+    matrix = usd_rates[np.newaxis, :] / usd_rates[:, np.newaxis]
+    matrix.setflags(write=False)
+    return matrix
+
+RATE_MATRIX = _build_rate_matrix()
+MINOR_UNIT_SCALE = np.array(
+    [10.0 ** MINOR_UNITS.get(code, 2) for code in CURRENCY_CODES], dtype=np.float64
+)
+MINOR_UNIT_SCALE.setflags(write=False)
+
+def round_half_up(values, scale):
+    """Round to 1/scale, halves away from zero (the usual convention for money)"""
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5) / scale
+
+def minor_unit_scale(currency):
+    """Return 10 ** minor units for a currency code (100 for USD, 1 for JPY)"""
+    return 10.0 ** MINOR_UNITS.get(currency.upper(), 2)
+
+def _currency_indices(codes):
+    """Map currency codes to matrix indices; unsupported codes map to -1"""
+    if isinstance(codes, str):
+        codes = [codes]
+    indices = np.fromiter(
+        map(CURRENCY_INDEX.get, codes, itertools.repeat(-1)), dtype=np.intp, count=len(codes)
+    )
+    # Exact-match misses get one more try normalised, so "usd" still resolves
+    for i in np.flatnonzero(indices < 0):
+        indices[i] = CURRENCY_INDEX.get(str(codes[i]).strip().upper(), -1)
+    return indices
+
+def convert_batch(amounts, from_currencies, to_currencies):
+    """Convert many amounts at once.
+
+    from_currencies / to_currencies are either one code per amount or a single
+    code applied to every amount. Returns numpy arrays (converted, rates) plus the
+    indices of rows whose currency pair is unsupported; those rows are NaN.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64).reshape(-1)
+    from_idx = np.broadcast_to(_currency_indices(from_currencies), amounts.shape)
+    to_idx = np.broadcast_to(_currency_indices(to_currencies), amounts.shape)
+
+    invalid = (from_idx < 0) | (to_idx < 0)
+    safe_from = np.where(invalid, 0, from_idx)
+    safe_to = np.where(invalid, 0, to_idx)
+
+    rates = RATE_MATRIX[safe_from, safe_to]
+    converted = round_half_up(amounts * rates, MINOR_UNIT_SCALE[safe_to])
+
+    rates = np.where(invalid, np.nan, rates)
+    converted = np.where(invalid, np.nan, converted)
+    return converted, rates, np.flatnonzero(invalid)
+
+def convert_amount(amount, from_currency, to_currency):
+    """Convert a single amount; returns the convert_currency tool result shape"""
+    from_code = from_currency.upper()
+    to_code = to_currency.upper()
+
+    if from_code not in CURRENCY_INDEX:
+        return {"error": f"Unsupported currency: {from_currency}"}
+    if to_code not in CURRENCY_INDEX:
+        return {"error": f"Unsupported currency: {to_currency}"}
+
+    to_idx = CURRENCY_INDEX[to_code]
+    exchange_rate = float(RATE_MATRIX[CURRENCY_INDEX[from_code], to_idx])
+    converted_amount = float(round_half_up(amount * exchange_rate, MINOR_UNIT_SCALE[to_idx]))
+
+    return {
+        "original_amount": amount,
+        "converted_amount": converted_amount,
+        "exchange_rate": round(exchange_rate, 4),
+        "from_currency": from_code,
+        "to_currency": to_code,
+        "timestamp": datetime.utcnow().isoformat(),
+        "source": "hardcoded"
+    }
@@ -1,165 +1,108 @@
 from strands import Agent, tool
-from strands.models import BedrockModel
-from bedrock_agentcore.runtime import BedrockAgentCoreApp
+from strands.hooks import AfterToolCallEvent, BeforeToolCallEvent, HookProvider
+from bedrock_agentcore.runtime import BedrockAgentCoreApp, PingStatus
 import boto3
 from datetime import datetime
+import asyncio
+import contextlib
+import json
 import os
-
-app = BedrockAgentCoreApp()
+import time
+
+import numpy as np
+
+from admission import AdmissionRejected, admission
+from currency import convert_amount, convert_batch
+from invoice_schema import validate_invoice
+from line_items import MAX_REPORTED_ROWS, summarize_line_item_result, validate_line_items as check_invoice_line_items
+from line_matching import match_line_items
+from model_router import (choose_tier, get_discrepancy_history, model_for_tier, needs_escalation,
+                          put_routing_metrics, routing_key, score_complexity)
+from prompt_builder import build_prompt, put_prompt_metrics
+from rate_history import convert_batch_on_date, convert_on_date, get_rate_history
+from result_cache import get_cached_result, put_cache_metrics, put_cached_result, result_cache_key
+from result_store import result_writer
+from tax_rates import resolve_tax_rate
+from tracing import current_span, current_trace, span, start_trace
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    # Flush queued result writes before the container stops
+    await asyncio.to_thread(result_writer.close)
+
+app = BedrockAgentCoreApp(lifespan=lifespan)
+
+@app.ping
+def ping():
+    # Report busy while every model-session slot is taken so new sessions go to other containers
+    return PingStatus.HEALTHY_BUSY if admission.saturated() else PingStatus.HEALTHY
 
 # Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
 s3 = boto3.client('s3')
 
 @tool
 def get_tax_rate(country: str, region: str, tax_type: str) -> dict:
-    """Get tax rate for country/region using hardcoded values"""
-    # Hardcoded tax rates for demo purposes
-    # In production, these would come from external APIs or databases
-    tax_rates = {
-        # US States
-        "US-CA": {"SALES_TAX": 0.0875, "VAT": 0.0875},
-        "US-NY": {"SALES_TAX": 0.08, "VAT": 0.08},
-        "US-TX": {"SALES_TAX": 0.0825, "VAT": 0.0825},
-        "US-FL": {"SALES_TAX": 0.07, "VAT": 0.07},
-
-        # UK
-        "UK": {"VAT": 0.20},
-
-        # India
-        "IN": {"GST": 0.18},
-        "IN-MH": {"GST": 0.18},  # Maharashtra
-        "IN-KA": {"GST": 0.18},  # Karnataka
-        "IN-DL": {"GST": 0.18},  # Delhi
-
-        # Canada
-        "CA-ON": {"HST": 0.13, "GST": 0.05, "PST": 0.08},
-        "CA-BC": {"GST": 0.05, "PST": 0.07},
-        "CA-QC": {"GST": 0.05, "QST": 0.09975},
-
-        # Australia
-        "AU-NSW": {"GST": 0.10},
-        "AU-VIC": {"GST": 0.10},
-        "AU-QLD": {"GST": 0.10},
-
-        # European Union
-        "DE": {"VAT": 0.19},  # Germany
-        "FR": {"VAT": 0.20},  # France
-        "IT": {"VAT": 0.22},  # Italy
-        "ES": {"VAT": 0.21},  # Spain
-        "NL": {"VAT": 0.21},  # Netherlands
-    }
-
-    # Get the rate
-    country_region = f"{country}-{region}" if region else country
-    if country_region in tax_rates and tax_type in tax_rates[country_region]:
-        rate = tax_rates[country_region][tax_type]
-        return {
-            "rate": rate,
-            "source": "hardcoded",
-            "last_updated": datetime.utcnow().isoformat(),
-            "tax_type": tax_type,
-            "country": country,
-            "region": region
-        }
-
-    # Fallback rates by country
-    fallback_rates = {
-        "US": 0.07,  # Average US sales tax
-        "UK": 0.20,  # Standard VAT rate
-        "IN": 0.18,  # GST
-        "CA": 0.13,  # Average HST
-        "AU": 0.10,  # GST
-        "DE": 0.19,  # VAT
-        "FR": 0.20,  # VAT
-        "IT": 0.22,  # VAT
-        "ES": 0.21,  # VAT
-        "NL": 0.21,  # VAT
-    }
-
-    rate = fallback_rates.get(country, 0.0)
-    return {
-        "rate": rate,
-        "source": "fallback",
-        "last_updated": datetime.utcnow().isoformat(),
-        "tax_type": tax_type,
-        "country": country,
-        "region": region
-    }
+    """Get tax rate for country/region, including every component of compound taxes (e.g. CA-QC GST+QST)"""
+    return resolve_tax_rate(country, region, tax_type)
 
 @tool
-def convert_currency(amount: float, from_currency: str, to_currency: str) -> dict:
-    """Convert currency using hardcoded exchange rates"""
-    # Hardcoded exchange rates for demo purposes
-    # In production, these would come from real-time APIs like Fixer.io
-    exchange_rates = {
-        # Base rates (relative to USD)
-        "USD": 1.0,
-        "EUR": 0.85,     # 1 USD = 0.85 EUR
-        "GBP": 0.73,     # 1 USD = 0.73 GBP
-        "INR": 83.0,     # 1 USD = 83 INR
-        "CAD": 1.35,     # 1 USD = 1.35 CAD
-        "AUD": 1.52,     # 1 USD = 1.52 AUD
-        "JPY": 150.0,    # 1 USD = 150 JPY
-        "CHF": 0.92,     # 1 USD = 0.92 CHF
-        "CNY": 7.25,     # 1 USD = 7.25 CNY
-        "BRL": 5.2,      # 1 USD = 5.2 BRL
-    }
-
+def convert_currency(amount: float, from_currency: str, to_currency: str, invoice_date: str = "") -> dict:
+    """Convert currency; pass invoice_date (YYYY-MM-DD) to convert at the rate on that date"""
     try:
-        # Get exchange rates
-        from_rate = exchange_rates.get(from_currency.upper(), 1.0)
-        to_rate = exchange_rates.get(to_currency.upper(), 1.0)
+        history = get_rate_history() if invoice_date else None
+        if history is not None:
+            return convert_on_date(history, amount, from_currency, to_currency, invoice_date)
+        return convert_amount(amount, from_currency, to_currency)
+    except Exception as e:
+        return {"error": f"Currency conversion failed: {str(e)}"}
 
-        if from_rate == 1.0 and from_currency.upper() not in exchange_rates:
-            return {"error": f"Unsupported currency: {from_currency}"}
+@tool
+def convert_currency_batch(amounts: list, from_currencies: list, to_currencies: list,
+                           invoice_date: str = "") -> dict:
+    """Convert many amounts in one call, e.g. every line item of a mixed-currency invoice.
 
-        if to_rate == 1.0 and to_currency.upper() not in exchange_rates:
-            return {"error": f"Unsupported currency: {to_currency}"}
+    from_currencies / to_currencies hold one code per amount, or a single code applied to all amounts.
+    Pass invoice_date (YYYY-MM-DD) to convert at the rate on that date.
+    """
+    try:
+        if len(from_currencies) not in (1, len(amounts)) or len(to_currencies) not in (1, len(amounts)):
+            return {"error": "Currency lists must have one entry per amount or a single entry"}
 
-        # Calculate conversion
-        exchange_rate = to_rate / from_rate
-        converted_amount = amount * exchange_rate
+        history = get_rate_history() if invoice_date else None
+        if history is not None:
+            converted, rates, invalid = convert_batch_on_date(
+                history, amounts, from_currencies, to_currencies, invoice_date[:10]
+            )
+        else:
+            converted, rates, invalid = convert_batch(amounts, from_currencies, to_currencies)
 
         return {
-            "original_amount": amount,
-            "converted_amount": round(converted_amount, 2),
-            "exchange_rate": round(exchange_rate, 4),
-            "from_currency": from_currency.upper(),
-            "to_currency": to_currency.upper(),
+            "converted_amounts": [None if np.isnan(value) else float(value) for value in converted],
+            "exchange_rates": [None if np.isnan(rate) else round(float(rate), 4) for rate in rates],
+            "unsupported_indices": invalid.tolist(),
             "timestamp": datetime.utcnow().isoformat(),
-            "source": "hardcoded"
+            "source": "history" if history is not None else "hardcoded"
         }
-
     except Exception as e:
         return {"error": f"Currency conversion failed: {str(e)}"}
 
 @tool
 def validate_invoice_fields(invoice_data: dict) -> dict:
-    """Validate invoice has required fields"""
-    required_fields = ['customer_name', 'total_amount', 'currency']
-    missing_fields = []
-
-    for field in required_fields:
-        if field not in invoice_data or not invoice_data[field]:
-            missing_fields.append(field)
-
-    errors = []
+    """Validate invoice fields against the shared invoice schema, then check amount and currency"""
+    # Same compiled schema the trigger rejects malformed uploads with
+    invoice_data, errors = validate_invoice(invoice_data)
     warnings = []
+    if invoice_data is None:
+        return {"valid": False, "errors": errors, "warnings": warnings}
 
-    if missing_fields:
-        errors.append(f"Missing required fields: {', '.join(missing_fields)}")
-
-    # Validate amounts
-    if 'total_amount' in invoice_data:
-        try:
-            amount = float(invoice_data['total_amount'])
-            if amount <= 0:
-                errors.append("Total amount must be positive")
-            elif amount > 1000000:
-                warnings.append("Very large amount - please verify")
-        except (ValueError, TypeError):
-            errors.append("Invalid total amount format")
+    # Validate amounts (already a number unless the schema reported it)
+    amount = invoice_data.get('total_amount')
+    if isinstance(amount, (int, float)) and not isinstance(amount, bool):
+        if amount <= 0:
+            errors.append("Total amount must be positive")
+        elif amount > 1000000:
+            warnings.append("Very large amount - please verify")
 
     # Validate currency
     if 'currency' in invoice_data:
@@ -174,8 +117,23 @@ def validate_invoice_fields(invoice_data: dict) -> dict:
     }
 
 @tool
-def detect_discrepancies(invoice: dict, expected_values: dict) -> dict:
-    """Detect pricing/quantity discrepancies"""
+def validate_line_items(invoice_data: dict) -> dict:
+    """Check line-item arithmetic: quantity x unit_price = total per line, sum of lines = subtotal,
+    subtotal + tax_amount = total_amount and subtotal x tax_rate = tax_amount, within currency rounding"""
+    try:
+        return summarize_line_item_result(check_invoice_line_items(invoice_data))
+    except Exception as e:
+        return {"valid": False, "errors": [f"Line item validation failed: {str(e)}"]}
+
+@tool
+def detect_discrepancies(invoice: dict, expected_values: dict, price_tolerance: float = 0.0,
+                         quantity_tolerance: float = 0.0) -> dict:
+    """Detect pricing/quantity discrepancies.
+
+    Line items are matched by SKU or normalized description (not position), so reordered,
+    inserted or dropped lines are reported as extra/missing instead of shifting every later line.
+    price_tolerance is relative (0.01 = 1%); quantity_tolerance is absolute.
+    """
     discrepancies = []
 
     # Compare total amount
@@ -183,60 +141,84 @@ def detect_discrepancies(invoice: dict, expected_values: dict) -> dict:
         expected_amount = float(expected_values['total_amount'])
         actual_amount = float(invoice.get('total_amount', 0))
 
-        if abs(actual_amount - expected_amount) / expected_amount > 0.05:  # 5% tolerance
+        difference = actual_amount - expected_amount
+        # No percentage against a zero expected total - any difference is reported
+        percentage = abs(difference) / expected_amount * 100 if expected_amount else None
+        if difference and (percentage is None or percentage > 5):  # 5% tolerance
             discrepancies.append({
                 "field": "total_amount",
                 "expected": expected_amount,
                 "actual": actual_amount,
-                "difference": actual_amount - expected_amount,
-                "percentage": abs(actual_amount - expected_amount) / expected_amount * 100
+                "difference": difference,
+                "percentage": percentage
             })
 
     # Compare line items if available
+    line_summary = None
     if 'line_items' in expected_values and 'line_items' in invoice:
-        for i, (expected_item, actual_item) in enumerate(
-            zip(expected_values['line_items'], invoice['line_items'])
-        ):
-            if expected_item.get('unit_price') != actual_item.get('unit_price'):
-                discrepancies.append({
-                    "field": f"line_items[{i}].unit_price",
-                    "expected": expected_item.get('unit_price'),
-                    "actual": actual_item.get('unit_price')
-                })
+        expected_items = expected_values['line_items']
+        actual_items = invoice['line_items']
+        match = match_line_items(
+            expected_items, actual_items,
+            price_tolerance=price_tolerance,
+            quantity_tolerance=quantity_tolerance,
+            currency=invoice.get('currency') or 'USD'
+        )
 
-    return {
+        for index in match['missing']:
+            discrepancies.append({
+                "type": "missing",
+                "field": f"expected_values.line_items[{index}]",
+                "expected": expected_items[index].get('description'),
+                "actual": None
+            })
+        for index in match['extra']:
+            discrepancies.append({
+                "type": "extra",
+                "field": f"line_items[{index}]",
+                "expected": None,
+                "actual": actual_items[index].get('description')
+            })
+        discrepancies.extend(match['discrepancies'])
+
+        line_summary = {
+            "matched": len(match['matched']),
+            "missing": len(match['missing']),
+            "extra": len(match['extra']),
+            "price_or_quantity_deltas": len(match['discrepancies'])
+        }
+
+    result = {
         "has_discrepancies": len(discrepancies) > 0,
-        "discrepancies": discrepancies,
+        "discrepancy_count": len(discrepancies),
+        "discrepancies": discrepancies[:MAX_REPORTED_ROWS],
         "severity": "high" if len(discrepancies) > 0 else "none"
     }
+    if line_summary is not None:
+        result["line_items"] = line_summary
+    return result
 
 @tool
 def store_invoice_result(invoice_id: str, validation_result: dict) -> dict:
     """Store validated invoice in DynamoDB"""
-    invoices_table = dynamodb.Table(os.environ.get('INVOICES_TABLE', 'globalinvoiceai-Invoices-dev'))
+    # Tools run on worker threads, so waiting on the batched write doesn't block the event loop
+    return result_writer.store_result(invoice_id, validation_result).result()
 
-    try:
-        invoices_table.update_item(
-            Key={'InvoiceId': invoice_id},
-            UpdateExpression='SET ValidationResult = :result, UpdatedAt = :updated',
-            ExpressionAttributeValues={
-                ':result': validation_result,
-                ':updated': datetime.utcnow().isoformat()
-            }
-        )
-        return {"success": True, "invoice_id": invoice_id}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+# Bump whenever the system prompt or prompt templates change so cached results are not reused
+PROMPT_VERSION = "4"
+
+# Operations whose results are deterministic enough to replay from the result cache
+CACHEABLE_OPERATIONS = {"validate"}
 
-# Initialize Bedrock model
-model = BedrockModel(
-    model_id="us.amazon.nova-pro-v1:0"
-)
+# Tax type levied on invoices per country when the invoice doesn't name one
+DEFAULT_TAX_TYPES = {"US": "SALES_TAX", "IN": "GST", "CA": "GST", "AU": "GST"}
+REPORTING_CURRENCY = "USD"
 
-# Create agent with tools
-agent = Agent(
-    model=model,
-    system_prompt="""You are an expert invoice validation and generation agent for GlobalInvoiceAI.
+# Invoices validated at once by a validate_batch invocation (overridable per request up to the max)
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '4'))
+MAX_BATCH_CONCURRENCY = 16
+
+SYSTEM_PROMPT = """You are an expert invoice validation and generation agent for GlobalInvoiceAI.
 
 Your responsibilities:
 1. Validate incoming vendor invoices for pricing discrepancies, missing fields, and compliance
@@ -246,50 +228,307 @@ Your responsibilities:
 5. Flag any errors or anomalies for human review
 
 Always use available tools to lookup tax rates, convert currencies, and validate data.
-Store all results for audit compliance.""",
-    tools=[get_tax_rate, convert_currency, validate_invoice_fields,
-           detect_discrepancies, store_invoice_result]
-)
-
-@app.entrypoint
-async def process_invoice(payload, context):
-    """Main entrypoint for invoice processing with streaming"""
-    invoice_data = payload.get("invoice_data")
-    operation = payload.get("operation", "validate")
-    invoice_id = payload.get("invoice_id")
-
-    if operation == "validate":
-        prompt = f"""Validate this vendor invoice for compliance and accuracy:
-        {json.dumps(invoice_data, indent=2)}
-
-        Check: required fields, tax calculations, pricing, currency."""
-    else:
-        prompt = f"""Generate a compliant customer invoice based on this sale data:
-        {json.dumps(invoice_data, indent=2)}
+When the prompt includes pre-computed tool results, rely on them instead of calling those tools again.
+When several amounts need converting, use convert_currency_batch once instead of calling convert_currency per amount.
+Use validate_line_items for line-item arithmetic instead of recomputing totals yourself.
+Pass the invoice's invoice_date to currency tools so amounts convert at the rate on that date.
+Store all results for audit compliance.
+Respond with a single JSON object that includes "confidence", your confidence in the result from 0 to 1."""
+
+AGENT_TOOLS = [get_tax_rate, convert_currency, convert_currency_batch, validate_invoice_fields,
+               validate_line_items, detect_discrepancies, store_invoice_result]
+
+class TraceToolCalls(HookProvider):
+    """Records each tool the model calls as a span of the invoice's trace"""
+
+    def __init__(self):
+        self._spans = {}
+
+    def register_hooks(self, registry, **kwargs):
+        registry.add_callback(BeforeToolCallEvent, self._before)
+        registry.add_callback(AfterToolCallEvent, self._after)
+
+    def _before(self, event):
+        trace = current_trace()
+        if trace is not None:
+            self._spans[event.tool_use["toolUseId"]] = (
+                trace, trace.start_span(f"tool.{event.tool_use['name']}", current_span())
+            )
+
+    def _after(self, event):
+        trace, tool_span = self._spans.pop(event.tool_use["toolUseId"], (None, None))
+        if trace is not None:
+            trace.end_span(tool_span, event.exception)
+
+# Strands hook providers attached to every agent (the replay harness registers its tool timer here)
+AGENT_HOOKS = [TraceToolCalls()]
+
+def create_agent(tier="strong"):
+    """New agent per invocation - an Agent holds conversation state and must not be shared"""
+    return Agent(
+        model=model_for_tier(tier),
+        system_prompt=SYSTEM_PROMPT,
+        tools=AGENT_TOOLS,
+        hooks=list(AGENT_HOOKS)
+    )
+
+async def precompute_tool_results(invoice_data):
+    """Run the deterministic tools the model would otherwise call one turn at a time.
+
+    Field validation, line-item arithmetic, the tax rate for the invoice's
+    jurisdiction and conversion of the total to the reporting currency are
+    computed concurrently and returned as {tool_name: result}.
+    """
+    invoice_data = invoice_data or {}
+    calls = {"validate_invoice_fields": (validate_invoice_fields, invoice_data)}
+
+    if invoice_data.get("line_items"):
+        calls["validate_line_items"] = (validate_line_items, invoice_data)
+
+    country = str(invoice_data.get("country") or "").strip().upper()
+    if country:
+        region = invoice_data.get("state") or invoice_data.get("region") or invoice_data.get("province") or ""
+        tax_type = invoice_data.get("tax_type") or DEFAULT_TAX_TYPES.get(country, "VAT")
+        calls["get_tax_rate"] = (get_tax_rate, country, region, tax_type)
+
+    currency = str(invoice_data.get("currency") or "").strip().upper()
+    amount = invoice_data.get("total_amount")
+    if currency and currency != REPORTING_CURRENCY and amount is not None:
+        try:
+            calls["convert_currency"] = (convert_currency, float(amount), currency, REPORTING_CURRENCY,
+                                         str(invoice_data.get("invoice_date") or ""))
+        except (TypeError, ValueError):
+            pass  # validate_invoice_fields reports the bad amount
+
+    def traced(name, fn, *args):
+        with span(f"precompute.{name}"):
+            return fn(*args)
+
+    results = await asyncio.gather(
+        *(asyncio.to_thread(traced, name, fn, *args) for name, (fn, *args) in calls.items()),
+        return_exceptions=True
+    )
+    return {
+        name: {"error": str(result)} if isinstance(result, Exception) else result
+        for name, result in zip(calls, results)
+    }
 
-        Calculate correct taxes, apply currency conversion if needed."""
+async def run_invoice(invoice_data, operation, invoice_id, admission_timeout=None, warmup=False, trace_id=None):
+    """Process one invoice, yielding response text chunks and then a final status dict.
+
+    The model calls run inside an admission-control session; when the container is
+    saturated the final dict is {"status": "throttled", "retry_after": seconds, ...}.
+    Warm-up runs always call the model and are neither cached nor stored. The run is
+    traced under trace_id (default invoice_id) and the final dict carries its timing.
+    """
+    with start_trace(trace_id or invoice_id, "agent") as trace:
+        async for event in _run_invoice(invoice_data, operation, invoice_id, admission_timeout, warmup):
+            if isinstance(event, dict) and "status" in event:
+                event["timing"] = trace.summary()
+            yield event
+
+async def _run_invoice(invoice_data, operation, invoice_id, admission_timeout, warmup):
+    cache_key = None
+    model_tier = None
+    if operation in CACHEABLE_OPERATIONS and not warmup:
+        cache_key = result_cache_key(invoice_data, operation, PROMPT_VERSION, routing_key())
 
     try:
-        # Stream response
-        full_response = ""
-        async for event in agent.stream_async(prompt):
-            if "data" in event:
-                full_response += event["data"]
-                yield event["data"]
+        with span("cache_lookup"):
+            cached = await asyncio.to_thread(get_cached_result, cache_key) if cache_key else None
+        if cache_key:
+            await asyncio.to_thread(
+                put_cache_metrics, cached is not None, cached["model_latency_ms"] if cached else 0.0
+            )
+
+        if cached is not None:
+            # Identical payload validated recently - replay it without calling Bedrock
+            full_response = cached["response"]
+            yield full_response
+        else:
+            # Deterministic tools run up front so the model doesn't spend a turn on each
+            started = time.monotonic()
+            with span("precompute"):
+                tool_results = await precompute_tool_results(invoice_data)
+            precompute_ms = (time.monotonic() - started) * 1000
+            with span("build_prompt"):
+                prompt, prompt_stats = build_prompt(invoice_data, operation, tool_results=tool_results)
+            print(f"Prompt for {invoice_id}: {json.dumps(prompt_stats)} (tools pre-computed in {precompute_ms:.1f} ms)")
+
+            # Simple invoices go to the fast model, escalating if its answer isn't trustworthy
+            with span("discrepancy_history"):
+                history = await asyncio.to_thread(get_discrepancy_history, (invoice_data or {}).get("customer_id"))
+            score, factors = score_complexity(invoice_data, tool_results, history)
+            routed_tier = choose_tier(score)
+            tiers = ["fast", "strong"] if routed_tier == "fast" else ["strong"]
+
+            usage = {}
+            cycles = 0
+            tier_latencies = {}
+            escalation = None
+            # Model calls only start once this container has a free session slot
+            with span("model_session") as session_span:
+                async with admission.session(admission_timeout) as admission_wait_ms:
+                    if session_span is not None:
+                        session_span["admission_wait_ms"] = round(admission_wait_ms, 1)
+                    for model_tier in tiers:
+                        # Fast answers are held back until judged confident enough to return
+                        buffered = model_tier != tiers[-1]
+                        full_response = ""
+                        started = time.monotonic()
+                        with span(f"model.{model_tier}"):
+                            async for event in create_agent(model_tier).stream_async(prompt):
+                                if "data" in event:
+                                    full_response += event["data"]
+                                    if not buffered:
+                                        yield event["data"]
+                                elif "result" in event:
+                                    metrics = getattr(event["result"], "metrics", None)
+                                    for field, value in dict(getattr(metrics, "accumulated_usage", None) or {}).items():
+                                        usage[field] = usage.get(field, 0) + value
+                                    cycles += getattr(metrics, "cycle_count", None) or 0
+                        tier_latencies[model_tier] = (time.monotonic() - started) * 1000
+
+                        if buffered:
+                            escalation = needs_escalation(full_response, tool_results)
+                            if escalation is None:
+                                yield full_response
+                                break
+            model_latency_ms = sum(tier_latencies.values())
+
+            print(f"Routing for {invoice_id}: " + json.dumps({
+                "score": score,
+                "factors": factors,
+                "routed_tier": routed_tier,
+                "final_tier": model_tier,
+                "escalation_reason": escalation,
+                "admission_wait_ms": round(admission_wait_ms, 1),
+                "latency_ms": {tier: round(ms, 1) for tier, ms in tier_latencies.items()}
+            }))
+            print(f"Model usage for {invoice_id}: {json.dumps(usage)}, cycles: {cycles}")
+            await asyncio.to_thread(put_prompt_metrics, prompt_stats, usage, cycles)
+            await asyncio.to_thread(put_routing_metrics, tier_latencies, escalation is not None)
 
         # Parse final result and store
         result = json.loads(full_response)
 
+        # Only well-formed results are worth replaying
+        if cache_key and cached is None:
+            await asyncio.to_thread(put_cached_result, cache_key, full_response, model_latency_ms)
+
         # Store result in DynamoDB
-        store_result = store_invoice_result(invoice_id, result)
-        if not store_result["success"]:
-            yield {"error": f"Failed to store result: {store_result['error']}"}
+        if not warmup:
+            with span("store_result"):
+                store_result = await asyncio.wrap_future(result_writer.store_result(invoice_id, result))
+            if not store_result["success"]:
+                yield {"error": f"Failed to store result: {store_result['error']}"}
 
         # Yield final success response
-        yield {"status": "success", "response": full_response}
-
+        yield {"status": "success", "response": full_response, "cached": cached is not None,
+               "model_tier": model_tier}
+
+    except AdmissionRejected as e:
+        yield {
+            "status": "throttled",
+            "error": f"Container saturated ({e.reason}), retry after {e.retry_after}s",
+            "reason": e.reason,
+            "retry_after": e.retry_after
+        }
     except Exception as e:
         yield {"error": str(e)}
 
+async def process_batch(payload):
+    """Validate payload["invoices"] concurrently, yielding one event per invoice as it finishes.
+
+    Each entry is {"invoice_id": ..., "invoice_data": {...}}. At most `concurrency`
+    invoices are in flight, each with its own agent. Events are tagged with
+    invoice_id and the entry's index; a batch_complete summary comes last.
+    """
+    invoices = payload.get("invoices")
+    if not isinstance(invoices, list):
+        yield {"error": "validate_batch requires an 'invoices' list"}
+        return
+
+    try:
+        concurrency = int(payload.get("concurrency") or BATCH_CONCURRENCY)
+    except (TypeError, ValueError):
+        concurrency = BATCH_CONCURRENCY
+    concurrency = max(1, min(concurrency, MAX_BATCH_CONCURRENCY))
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results = asyncio.Queue()
+
+    async def validate_entry(index, entry):
+        invoice_id = entry.get("invoice_id") if isinstance(entry, dict) else None
+        event = {"invoice_id": invoice_id, "index": index}
+        try:
+            if not isinstance(entry, dict) or not isinstance(entry.get("invoice_data"), dict):
+                raise ValueError("Batch entry requires an 'invoice_data' object")
+            async with semaphore:
+                errors = []
+                final = None
+                async for item in run_invoice(entry["invoice_data"], "validate", invoice_id,
+                                              payload.get("max_wait_seconds"),
+                                              trace_id=entry.get("trace_id") or invoice_id):
+                    if isinstance(item, dict):
+                        if "error" in item and item.get("status") != "throttled":
+                            errors.append(item["error"])
+                        else:
+                            final = item
+            if final is None:
+                event.update({"status": "error", "error": "; ".join(errors) or "No result"})
+            else:
+                event.update(final)
+                if errors:
+                    event["warnings"] = errors
+        except Exception as e:
+            event.update({"status": "error", "error": str(e)})
+        await results.put(event)
+
+    tasks = [asyncio.create_task(validate_entry(index, entry)) for index, entry in enumerate(invoices)]
+    succeeded = 0
+    try:
+        for _ in range(len(tasks)):
+            event = await results.get()
+            succeeded += event.get("status") == "success"
+            yield event
+    finally:
+        # Caller went away mid-stream: don't leave model calls running
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        "status": "batch_complete",
+        "count": len(tasks),
+        "succeeded": succeeded,
+        "failed": len(tasks) - succeeded,
+        "concurrency": concurrency
+    }
+
+@app.entrypoint
+async def process_invoice(payload, context):
+    """Main entrypoint for invoice processing with streaming.
+
+    operation "validate" / "generate" processes payload["invoice_data"];
+    "validate_batch" processes payload["invoices"] concurrently (see process_batch);
+    "admission_stats" returns in-flight sessions, queue depth and wait histogram.
+    payload["max_wait_seconds"] shortens how long invoices may queue for a model slot;
+    payload["warmup"] marks deploy-time warm-up invocations whose results are not kept;
+    payload["trace_id"] (default invoice_id) ties the agent's spans to the invoice's trace.
+    """
+    operation = payload.get("operation", "validate")
+    if operation == "admission_stats":
+        yield admission.snapshot()
+        return
+    if operation == "validate_batch":
+        async for event in process_batch(payload):
+            yield event
+        return
+
+    async for event in run_invoice(payload.get("invoice_data"), operation, payload.get("invoice_id"),
+                                   payload.get("max_wait_seconds"), bool(payload.get("warmup")),
+                                   payload.get("trace_id")):
+        yield event
+
 if __name__ == "__main__":
     app.run()
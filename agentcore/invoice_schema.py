@@ -0,0 +1,222 @@
+"""Declarative invoice schema compiled once into a fast validator.
+
+INVOICE_SCHEMA is the single definition of what an invoice payload may look
+like. compile_schema() walks a schema once and turns every field into a
+check closure that coerces and bounds-checks the value in one call (numeric
+strings from CSV rows become numbers, currency and country codes are
+upper-cased), so validating an invoice is one pass over a precomputed tuple
+of (field, required, check) with no per-call schema lookups or type
+dispatch. The compiled validate(data) returns (normalized copy, errors);
+fields outside the schema pass through unchanged.
+
+The trigger rejects malformed invoices with it before any S3 or DynamoDB
+write, and the agent's validate_invoice_fields tool reports the same errors.
+Like tracing.py, the deploy workflow copies this module into the Lambda
+packages. scripts/bench_schema.py measures the per-invoice cost.
+"""
+import math
+from datetime import date
+from decimal import Decimal
+
+# Line items reported individually before the rest are counted
+MAX_REPORTED_ITEMS = 5
+
+LINE_ITEM_SCHEMA = {
+    "description": {"type": "string", "max_length": 1024},
+    "sku": {"type": "string", "max_length": 128},
+    "quantity": {"type": "number"},
+    "unit_price": {"type": "number"},
+    "total": {"type": "number"},
+}
+
+INVOICE_SCHEMA = {
+    "customer_name": {"type": "string", "required": True, "max_length": 256},
+    "customer_address": {"type": "string", "max_length": 1024},
+    "customer_id": {"type": "string", "max_length": 128},
+    "invoice_number": {"type": "string", "max_length": 64},
+    "invoice_date": {"type": "date"},
+    "due_date": {"type": "date"},
+    "currency": {"type": "code", "length": 3, "required": True},
+    "country": {"type": "code", "length": 2},
+    "line_items": {"type": "list", "items": {"type": "object", "fields": LINE_ITEM_SCHEMA}},
+    "subtotal": {"type": "number"},
+    "tax_rate": {"type": "number", "min": 0},
+    "tax_amount": {"type": "number"},
+    # Positivity is a business rule the agent reports, not a shape error
+    "total_amount": {"type": "number", "required": True},
+    "payment_terms": {"type": "string", "max_length": 256},
+    "notes": {"type": "string", "max_length": 4096},
+}
+
+def _string_check(spec):
+    max_length = spec.get("max_length")
+    required = spec.get("required", False)
+    choices = frozenset(spec["enum"]) if "enum" in spec else None
+
+    def check(value):
+        if type(value) is not str:
+            if not isinstance(value, (int, float, Decimal)) or isinstance(value, bool):
+                raise ValueError("expected a string")
+            value = str(value)  # e.g. invoice numbers written as JSON numbers
+        value = value.strip()
+        if required and not value:
+            raise ValueError("required")
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(f"longer than {max_length} characters")
+        if choices is not None and value not in choices:
+            raise ValueError(f"must be one of {', '.join(sorted(choices))}")
+        return value
+    return check
+
+def _number_check(spec, integer=False):
+    low, high = spec.get("min"), spec.get("max")
+
+    def check(value):
+        kind = type(value)
+        if kind is float:
+            if not math.isfinite(value):
+                raise ValueError("expected a finite number")
+        elif kind is not int:
+            value = _coerce_number(value)
+        if integer:
+            if value != int(value):
+                raise ValueError("expected a whole number")
+            value = int(value)
+        if low is not None and value < low:
+            raise ValueError(f"must be at least {low}")
+        if high is not None and value > high:
+            raise ValueError(f"must be at most {high}")
+        return value
+    return check
+
+def _coerce_number(value):
+    """Slow path of the number check: numeric strings, Decimals and rejects"""
+    if isinstance(value, bool):
+        raise ValueError("expected a number")
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            value = int(text)
+        except ValueError:
+            try:
+                value = float(text)
+            except ValueError:
+                raise ValueError("expected a number") from None
+    elif not isinstance(value, (int, float, Decimal)):
+        raise ValueError("expected a number")
+    if not math.isfinite(value):
+        raise ValueError("expected a finite number")
+    return value
+
+def _boolean_check(spec):
+    def check(value):
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+            return value.strip().lower() == "true"
+        raise ValueError("expected true or false")
+    return check
+
+def _date_check(spec):
+    def check(value):
+        if not isinstance(value, str):
+            raise ValueError("expected a YYYY-MM-DD date")
+        value = value.strip()
+        try:
+            date.fromisoformat(value[:10])
+        except ValueError:
+            raise ValueError("expected a YYYY-MM-DD date") from None
+        return value
+    return check
+
+def _code_check(spec):
+    length = spec["length"]
+
+    def check(value):
+        if not isinstance(value, str):
+            raise ValueError(f"expected a {length}-letter code")
+        code = value.strip().upper()
+        if len(code) != length or not code.isalpha():
+            raise ValueError(f"expected a {length}-letter code")
+        return code
+    return check
+
+def _object_check(spec):
+    validate = compile_schema(spec["fields"])
+
+    def check(value):
+        normalized, errors = validate(value)
+        if errors:
+            raise ValueError("; ".join(errors))
+        return normalized
+    return check
+
+def _list_check(spec):
+    item_check = compile_field(spec["items"])
+    max_items = spec.get("max_items")
+
+    def check(value):
+        if not isinstance(value, (list, tuple)):
+            raise ValueError("expected a list")
+        if max_items is not None and len(value) > max_items:
+            raise ValueError(f"more than {max_items} entries")
+        normalized = []
+        problems = []
+        for index, item in enumerate(value):
+            try:
+                normalized.append(item_check(item))
+            except ValueError as e:
+                problems.append(f"entry {index + 1}: {e}")
+        if problems:
+            more = len(problems) - MAX_REPORTED_ITEMS
+            raise ValueError("; ".join(problems[:MAX_REPORTED_ITEMS]) + (f"; and {more} more" if more > 0 else ""))
+        return normalized
+    return check
+
+FIELD_CHECKS = {
+    "string": _string_check,
+    "number": _number_check,
+    "integer": lambda spec: _number_check(spec, integer=True),
+    "boolean": _boolean_check,
+    "date": _date_check,
+    "code": _code_check,
+    "object": _object_check,
+    "list": _list_check,
+}
+
+def compile_field(spec):
+    """check(value) -> normalized value for one field spec; raises ValueError with the problem"""
+    return FIELD_CHECKS[spec["type"]](spec)
+
+def compile_schema(schema):
+    """validate(data) -> (normalized copy, errors) for a {field: spec} schema.
+
+    A spec has a "type" (string, number, integer, boolean, date, code, object,
+    list) plus optional "required", "min"/"max", "max_length", "enum",
+    "length" (code), "fields" (object) and "items" (list). Missing, null and
+    empty-string values count as absent; absent empty strings are dropped.
+    """
+    fields = tuple((name, spec.get("required", False), compile_field(spec)) for name, spec in schema.items())
+
+    def validate(data):
+        if not isinstance(data, dict):
+            return None, ["expected an object"]
+        normalized = dict(data)
+        errors = []
+        get = data.get
+        for name, required, check in fields:
+            value = get(name)
+            if value is None or (type(value) is str and not value):
+                if required:
+                    errors.append(f"{name}: required")
+                elif value is not None:
+                    del normalized[name]  # CSV rows carry empty cells for absent columns
+                continue
+            try:
+                normalized[name] = check(value)
+            except ValueError as e:
+                errors.append(f"{name}: {e}")
+        return normalized, errors
+    return validate
+
+validate_invoice = compile_schema(INVOICE_SCHEMA)
@@ -0,0 +1,194 @@
+"""Line-item arithmetic validation.
+
+Every arithmetic rule is checked in a single pass over the line items:
+
+* quantity x unit_price == total for each line
+* sum(line totals) == subtotal
+* subtotal + tax_amount == total_amount
+* subtotal x tax_rate == tax_amount (when a tax rate is given)
+
+Tolerances are half a minor unit of the invoice currency (0.005 USD,
+0.5 JPY), i.e. the most a correctly rounded amount can differ by.
+
+Invoices arrive as lists of dicts, and turning those into numpy columns costs
+a Python-level pass per value - more than checking each line as it is read
+(see scripts/bench_line_items.py). validate_line_items therefore checks dicts
+in one plain loop; check_line_items runs the same rules vectorized for data
+that is already columnar, and load_line_item_columns builds columns in one
+pass for the aggregate statistics prompt_builder needs.
+"""
+import math
+import operator
+from itertools import chain
+
+import numpy as np
+
+from currency import minor_unit_scale
+
+# Cap on offending row indices returned to the model; the library call returns them all
+MAX_REPORTED_ROWS = 100
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+_line_values = operator.itemgetter('quantity', 'unit_price', 'total')
+
+def _get_line_values(item):
+    if not isinstance(item, dict):
+        return (None, None, None)
+    return (item.get('quantity'), item.get('unit_price'), item.get('total'))
+
+def load_line_item_columns(line_items):
+    """Return (quantities, unit_prices, totals) float64 columns; unparseable values are NaN"""
+    count = len(line_items)
+    try:
+        # One pass over the items straight into a (count, 3) buffer
+        matrix = np.fromiter(chain.from_iterable(map(_line_values, line_items)),
+                             dtype=np.float64, count=3 * count).reshape(count, 3)
+    except (KeyError, TypeError, ValueError):
+        # A missing field or a non-numeric value; parse each value on its own
+        matrix = np.array([[_to_float(value) for value in _get_line_values(item)] for item in line_items],
+                          dtype=np.float64).reshape(count, 3)
+    return matrix[:, 0], matrix[:, 1], matrix[:, 2]
+
+def _tolerance(currency):
+    tolerance = 0.5 / minor_unit_scale(currency or 'USD')
+    # Headroom for float error on values that are exactly half a minor unit apart
+    return tolerance * (1 + 1e-9)
+
+def check_line_items(quantities, unit_prices, totals, subtotal=None, tax_amount=None,
+                     total_amount=None, tax_rate=None, currency='USD'):
+    """Run every arithmetic check over pre-loaded columns.
+
+    Returns a dict with numpy index arrays for offending rows plus the
+    invoice-level results. Header values that are None are not checked.
+    """
+    tolerance = _tolerance(currency)
+    invalid_rows = np.flatnonzero(np.isnan(quantities) | np.isnan(unit_prices) | np.isnan(totals))
+    line_differences = quantities * unit_prices - totals
+    # NaN differences compare False, so rows with missing values only show up in invalid_rows
+    mismatched_rows = np.flatnonzero(np.abs(line_differences) > tolerance)
+
+    return _line_result(len(totals), invalid_rows, mismatched_rows, line_differences[mismatched_rows],
+                        float(np.nansum(totals)), tolerance, subtotal, tax_amount, total_amount, tax_rate)
+
+def _line_result(line_count, invalid_rows, mismatched_rows, line_differences, lines_sum, tolerance,
+                 subtotal, tax_amount, total_amount, tax_rate):
+    """Assemble the check result from the row checks and run the invoice-level rules"""
+    result = {
+        "line_count": int(line_count),
+        "invalid_rows": invalid_rows,
+        "mismatched_rows": mismatched_rows,
+        "line_differences": line_differences,
+        "lines_sum": round(lines_sum, 6),
+        "tolerance": tolerance,
+        "errors": []
+    }
+
+    if len(invalid_rows):
+        result["errors"].append(f"{len(invalid_rows)} line items have missing or non-numeric quantity, unit_price or total")
+    if len(mismatched_rows):
+        result["errors"].append(f"{len(mismatched_rows)} line items where quantity x unit_price != total")
+
+    if subtotal is not None and abs(lines_sum - subtotal) > tolerance:
+        result["errors"].append(f"Sum of line totals {lines_sum:.2f} does not match subtotal {subtotal:.2f}")
+    if subtotal is not None and tax_amount is not None and total_amount is not None:
+        if abs(subtotal + tax_amount - total_amount) > tolerance:
+            result["errors"].append(
+                f"Subtotal {subtotal:.2f} + tax {tax_amount:.2f} does not match total {total_amount:.2f}"
+            )
+    if subtotal is not None and tax_rate is not None and tax_amount is not None:
+        if abs(subtotal * tax_rate - tax_amount) > tolerance:
+            result["errors"].append(
+                f"Tax amount {tax_amount:.2f} does not match subtotal x tax_rate {subtotal * tax_rate:.2f}"
+            )
+
+    result["valid"] = not result["errors"]
+    return result
+
+def _check_plain_rows(line_items, tolerance):
+    """Row checks for lines whose fields are all plain ints/floats, or None for anything else.
+
+    A missing field, a string or a Decimal raises on the arithmetic (multiplying
+    by 1.0 first keeps a string quantity from being repeated), and a NaN fails
+    the tolerance test, so no per-value test is needed on the common path.
+    """
+    mismatched_rows = []
+    line_differences = []
+    lines_sum = 0.0
+    try:
+        for index, item in enumerate(line_items):
+            total = item['total']
+            difference = item['quantity'] * 1.0 * item['unit_price'] - total
+            if not abs(difference) <= tolerance:
+                if difference != difference:
+                    return None
+                mismatched_rows.append(index)
+                line_differences.append(difference)
+            lines_sum += total
+    except (KeyError, TypeError, OverflowError):
+        return None
+    return [], mismatched_rows, line_differences, lines_sum
+
+def _check_parsed_rows(line_items, tolerance):
+    """Row checks parsing every value; unparseable ones make the row invalid"""
+    invalid_rows = []
+    mismatched_rows = []
+    line_differences = []
+    lines_sum = 0.0
+    isnan = math.isnan
+    for index, item in enumerate(line_items):
+        quantity, unit_price, total = (_to_float(value) for value in _get_line_values(item))
+        if isnan(quantity) or isnan(unit_price) or isnan(total):
+            invalid_rows.append(index)
+        else:
+            difference = quantity * unit_price - total
+            if abs(difference) > tolerance:
+                mismatched_rows.append(index)
+                line_differences.append(difference)
+        if not isnan(total):
+            lines_sum += total
+    return invalid_rows, mismatched_rows, line_differences, lines_sum
+
+def validate_line_items(invoice_data):
+    """Validate the line-item arithmetic of an invoice dict; returns check_line_items output"""
+    def header(field):
+        value = invoice_data.get(field)
+        return None if value is None else _to_float(value)
+
+    tolerance = _tolerance(invoice_data.get('currency') or 'USD')
+    line_items = invoice_data.get('line_items') or []
+    rows = _check_plain_rows(line_items, tolerance) or _check_parsed_rows(line_items, tolerance)
+    invalid_rows, mismatched_rows, line_differences, lines_sum = rows
+
+    return _line_result(
+        len(line_items),
+        np.array(invalid_rows, dtype=np.intp),
+        np.array(mismatched_rows, dtype=np.intp),
+        np.array(line_differences, dtype=np.float64),
+        lines_sum, tolerance,
+        subtotal=header('subtotal'),
+        tax_amount=header('tax_amount'),
+        total_amount=header('total_amount'),
+        tax_rate=header('tax_rate')
+    )
+
+def summarize_line_item_result(result):
+    """JSON-safe view of a check_line_items result for tool output, capping row lists"""
+    mismatched = result["mismatched_rows"][:MAX_REPORTED_ROWS]
+    return {
+        "valid": result["valid"],
+        "errors": result["errors"],
+        "line_count": result["line_count"],
+        "lines_sum": result["lines_sum"],
+        "invalid_rows": result["invalid_rows"][:MAX_REPORTED_ROWS].tolist(),
+        "mismatched_rows": [
+            {"index": int(index), "difference": round(float(diff), 6)}
+            for index, diff in zip(mismatched, result["line_differences"][:MAX_REPORTED_ROWS])
+        ],
+        "truncated": bool(len(result["mismatched_rows"]) > MAX_REPORTED_ROWS
+                          or len(result["invalid_rows"]) > MAX_REPORTED_ROWS)
+    }
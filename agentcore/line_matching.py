@@ -0,0 +1,127 @@
+"""Key-based matching of expected (purchase order) and actual (invoice) line items.
+
+Expected items are indexed by SKU and by a normalized description key, then
+each actual item is joined against those indexes in one pass - O(n) overall,
+and insensitive to reordered, inserted or dropped lines. Duplicate keys are
+matched in order of appearance.
+"""
+import re
+from collections import defaultdict, deque
+
+from currency import minor_unit_scale
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+_SKU_NOISE = re.compile(r'[^A-Za-z0-9]')
+
+def sku_key(item):
+    sku = item.get('sku') or item.get('item_code')
+    if sku is None:
+        return None
+    sku = _SKU_NOISE.sub('', str(sku)).upper()
+    return sku or None
+
+def description_key(item):
+    """Order-insensitive fuzzy key: lowercase word tokens, naive singular, sorted"""
+    tokens = _TOKEN.findall(str(item.get('description', '')).lower())
+    tokens = [t[:-1] if len(t) > 3 and t.endswith('s') and not t.endswith('ss') else t for t in tokens]
+    return ' '.join(sorted(tokens)) or None
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def match_line_items(expected_items, actual_items, price_tolerance=0.0, quantity_tolerance=0.0,
+                     currency='USD'):
+    """Join actual against expected line items and report differences.
+
+    price_tolerance is relative (0.01 = 1%) on top of half a minor currency unit;
+    quantity_tolerance is absolute. Returns a dict of lists:
+    matched [(expected_index, actual_index)], missing [expected_index],
+    extra [actual_index] and discrepancies (price / quantity deltas).
+    """
+    by_sku = defaultdict(deque)
+    for index, item in enumerate(expected_items):
+        key = sku_key(item)
+        if key:
+            by_sku[key].append(index)
+
+    # Description keys are only needed once a SKU lookup misses, which is rare on
+    # SKU-coded purchase orders, so that index is built on first use
+    by_description = None
+
+    def description_index():
+        index_by_key = defaultdict(deque)
+        for index, item in enumerate(expected_items):
+            key = description_key(item)
+            if key:
+                index_by_key[key].append(index)
+        return index_by_key
+
+    used = bytearray(len(expected_items))
+
+    def take(bucket):
+        # Skip expected items already claimed through their other key
+        while bucket:
+            index = bucket.popleft()
+            if not used[index]:
+                used[index] = 1
+                return index
+        return None
+
+    price_slack = 0.5 / minor_unit_scale(currency or 'USD')
+    matched, extra, discrepancies = [], [], []
+
+    for actual_index, actual in enumerate(actual_items):
+        expected_index = None
+        key = sku_key(actual)
+        if key and key in by_sku:
+            expected_index = take(by_sku[key])
+        if expected_index is None:
+            if by_description is None:
+                by_description = description_index()
+            key = description_key(actual)
+            if key and key in by_description:
+                expected_index = take(by_description[key])
+        if expected_index is None:
+            extra.append(actual_index)
+            continue
+
+        matched.append((expected_index, actual_index))
+        expected = expected_items[expected_index]
+
+        expected_price = _number(expected.get('unit_price'))
+        actual_price = _number(actual.get('unit_price'))
+        if expected_price is not None and actual_price is not None:
+            allowed = price_slack + abs(expected_price) * price_tolerance
+            if abs(actual_price - expected_price) > allowed:
+                discrepancies.append({
+                    "type": "price",
+                    "field": f"line_items[{actual_index}].unit_price",
+                    "expected_index": expected_index,
+                    "expected": expected_price,
+                    "actual": actual_price,
+                    "difference": round(actual_price - expected_price, 6)
+                })
+
+        expected_quantity = _number(expected.get('quantity'))
+        actual_quantity = _number(actual.get('quantity'))
+        if expected_quantity is not None and actual_quantity is not None:
+            if abs(actual_quantity - expected_quantity) > quantity_tolerance:
+                discrepancies.append({
+                    "type": "quantity",
+                    "field": f"line_items[{actual_index}].quantity",
+                    "expected_index": expected_index,
+                    "expected": expected_quantity,
+                    "actual": actual_quantity,
+                    "difference": actual_quantity - expected_quantity
+                })
+
+    missing = [index for index, claimed in enumerate(used) if not claimed]
+    return {
+        "matched": matched,
+        "missing": missing,
+        "extra": extra,
+        "discrepancies": discrepancies
+    }
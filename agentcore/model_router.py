@@ -0,0 +1,217 @@
+"""Complexity-based routing between a fast and a strong Bedrock model.
+
+Each invoice gets a complexity score in [0, 1] from its line count, currency
+mix, cross-border / compound tax, failed pre-computed checks and the
+customer's recent discrepancy history. Invoices under the threshold go to
+the fast tier; a fast answer that doesn't parse, reports low confidence or
+contradicts the pre-computed checks is escalated to the strong tier.
+
+Set ROUTING_STUB_MODEL=1 to swap both tiers for StubModel, which answers
+instantly with canned JSON so routing can be exercised offline.
+"""
+import asyncio
+import json
+import os
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from strands.models import BedrockModel
+from strands.models.model import Model
+
+from tax_rates import COMPOUND_TAXES, jurisdiction_keys
+from ttl_cache import TTLCache
+
+MODEL_TIERS = {
+    "fast": os.environ.get('FAST_MODEL_ID', 'us.amazon.nova-lite-v1:0'),
+    "strong": os.environ.get('STRONG_MODEL_ID', 'us.amazon.nova-pro-v1:0'),
+}
+
+# Scores at or above this go straight to the strong tier
+COMPLEXITY_THRESHOLD = float(os.environ.get('ROUTING_COMPLEXITY_THRESHOLD', '0.3'))
+# Fast-tier answers reporting less confidence than this are re-run on the strong tier
+MIN_CONFIDENCE = float(os.environ.get('ROUTING_MIN_CONFIDENCE', '0.7'))
+
+# Maximum contribution of each factor; they sum to 1
+COMPLEXITY_WEIGHTS = {
+    "line_items": 0.3,
+    "currency_mix": 0.2,
+    "cross_border_tax": 0.2,
+    "failed_checks": 0.1,
+    "discrepancy_history": 0.2,
+}
+# Line count at which the line_items factor saturates
+LINE_ITEMS_FOR_MAX = 100
+# Flagged invoices in the customer's recent history at which that factor saturates
+HISTORY_FOR_MAX = 3
+HISTORY_LOOKBACK = 20
+FLAGGED_STATUSES = {"NEEDS_REVIEW", "VALIDATION_FAILED", "REJECTED"}
+REPORTING_CURRENCY = "USD"
+
+dynamodb = boto3.resource('dynamodb')
+cloudwatch = boto3.client('cloudwatch')
+
+_history_cache = TTLCache(1024, 300)
+_models = {}
+
+class StubModel(Model):
+    """Offline stand-in for BedrockModel that streams a canned JSON answer"""
+
+    # Canned answers per tier; tests can replace these to force escalation
+    RESPONSES = {
+        "fast": {"valid": True, "confidence": 0.9, "errors": [], "warnings": []},
+        "strong": {"valid": True, "confidence": 0.95, "errors": [], "warnings": []},
+    }
+
+    def __init__(self, tier, latency_ms=0):
+        self.config = {"model_id": f"stub-{tier}", "tier": tier, "latency_ms": latency_ms}
+
+    def update_config(self, **model_config):
+        self.config.update(model_config)
+
+    def get_config(self):
+        return self.config
+
+    async def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        """Canned answer parsed into output_model, as the final event like BedrockModel"""
+        if self.config["latency_ms"]:
+            await asyncio.sleep(self.config["latency_ms"] / 1000)
+        yield {"output": output_model.model_validate(self.RESPONSES[self.config["tier"]])}
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        if self.config["latency_ms"]:
+            await asyncio.sleep(self.config["latency_ms"] / 1000)
+        text = json.dumps(self.RESPONSES[self.config["tier"]])
+        yield {"messageStart": {"role": "assistant"}}
+        yield {"contentBlockStart": {"start": {}}}
+        yield {"contentBlockDelta": {"delta": {"text": text}}}
+        yield {"contentBlockStop": {}}
+        yield {"messageStop": {"stopReason": "end_turn"}}
+        yield {"metadata": {
+            "usage": {"inputTokens": 0, "outputTokens": 0, "totalTokens": 0},
+            "metrics": {"latencyMs": self.config["latency_ms"]}
+        }}
+
+def model_for_tier(tier):
+    """Shared model client per tier (model objects are stateless; agents are not)"""
+    if tier not in _models:
+        if os.environ.get('ROUTING_STUB_MODEL') == '1':
+            _models[tier] = StubModel(tier)
+        else:
+            _models[tier] = BedrockModel(model_id=MODEL_TIERS[tier])
+    return _models[tier]
+
+def routing_key():
+    """Identifies the model pair for result caching"""
+    return "|".join(f"{tier}={model_id}" for tier, model_id in sorted(MODEL_TIERS.items()))
+
+def get_discrepancy_history(customer_id):
+    """Count flagged invoices among the customer's most recent ones (0 without a customer id).
+
+    Reads CustomerIndex, whose CustomerId the trigger copies from InvoiceData.customer_id.
+    """
+    if not customer_id:
+        return 0
+    cached = _history_cache.get(customer_id)
+    if cached is not None:
+        return cached
+
+    table = dynamodb.Table(os.environ.get('INVOICES_TABLE', 'globalinvoiceai-Invoices-dev'))
+    try:
+        items = table.query(
+            IndexName='CustomerIndex',
+            KeyConditionExpression=Key('CustomerId').eq(str(customer_id)),
+            ProjectionExpression='#status, ValidationResult',
+            ExpressionAttributeNames={'#status': 'Status'},
+            ScanIndexForward=False,
+            Limit=HISTORY_LOOKBACK
+        ).get('Items', [])
+    except Exception as e:
+        print(f"Discrepancy history lookup failed: {e}")
+        return 0
+
+    flagged = sum(
+        1 for item in items
+        if item.get('Status') in FLAGGED_STATUSES
+        or (isinstance(item.get('ValidationResult'), dict) and item['ValidationResult'].get('has_discrepancies'))
+    )
+    _history_cache.put(customer_id, flagged)
+    return flagged
+
+def _failed_check(result):
+    return isinstance(result, dict) and (bool(result.get("error")) or result.get("valid") is False)
+
+def score_complexity(invoice_data, tool_results=None, discrepancy_history=0):
+    """Return (score in [0, 1], {factor: contribution})"""
+    invoice_data = invoice_data or {}
+    line_items = invoice_data.get('line_items') or []
+
+    currency = str(invoice_data.get('currency') or REPORTING_CURRENCY).strip().upper()
+    currencies = {currency} | {
+        str(item['currency']).strip().upper()
+        for item in line_items if isinstance(item, dict) and item.get('currency')
+    }
+    if len(currencies) > 1:
+        currency_mix = 1.0
+    else:
+        currency_mix = 0.0 if currency == REPORTING_CURRENCY else 0.5
+
+    country, keys = jurisdiction_keys(invoice_data.get('country'),
+                                      invoice_data.get('state') or invoice_data.get('region') or '')
+    counterparty = invoice_data.get('vendor_country') or invoice_data.get('customer_country')
+    if counterparty and jurisdiction_keys(counterparty, '')[0] != country:
+        cross_border = 1.0
+    else:
+        cross_border = 0.5 if keys[0] in COMPOUND_TAXES else 0.0
+
+    factors = {
+        "line_items": min(len(line_items) / LINE_ITEMS_FOR_MAX, 1.0),
+        "currency_mix": currency_mix,
+        "cross_border_tax": cross_border,
+        "failed_checks": 1.0 if any(_failed_check(r) for r in (tool_results or {}).values()) else 0.0,
+        "discrepancy_history": min(discrepancy_history / HISTORY_FOR_MAX, 1.0),
+    }
+    factors = {name: round(value * COMPLEXITY_WEIGHTS[name], 4) for name, value in factors.items()}
+    return round(min(sum(factors.values()), 1.0), 4), factors
+
+def choose_tier(score):
+    return "fast" if score < COMPLEXITY_THRESHOLD else "strong"
+
+def needs_escalation(response_text, tool_results=None):
+    """Return why a fast-tier answer should be re-run on the strong tier, or None"""
+    try:
+        result = json.loads(response_text)
+    except (TypeError, ValueError):
+        return "unparseable response"
+    if not isinstance(result, dict):
+        return "response is not an object"
+
+    try:
+        confidence = float(result.get("confidence"))
+    except (TypeError, ValueError):
+        return "no confidence reported"
+    if confidence < MIN_CONFIDENCE:
+        return f"confidence {confidence:.2f} below {MIN_CONFIDENCE:.2f}"
+
+    if result.get("valid") is True and any(_failed_check(r) for r in (tool_results or {}).values()):
+        return "marked valid despite failed pre-computed checks"
+    return None
+
+def put_routing_metrics(tier_latencies, escalated):
+    """Per-tier model latency plus an escalation count"""
+    environment = {'Name': 'Environment', 'Value': os.environ.get('ENVIRONMENT', 'dev')}
+    metric_data = [{
+        'MetricName': 'ModelLatency',
+        'Value': latency_ms,
+        'Unit': 'Milliseconds',
+        'Dimensions': [environment, {'Name': 'ModelTier', 'Value': tier}]
+    } for tier, latency_ms in tier_latencies.items()]
+    metric_data.append({
+        'MetricName': 'ModelEscalation',
+        'Value': 1 if escalated else 0,
+        'Unit': 'Count',
+        'Dimensions': [environment]
+    })
+    try:
+        cloudwatch.put_metric_data(Namespace='GlobalInvoiceAI', MetricData=metric_data)
+    except Exception as e:
+        print(f"Failed to publish routing metrics: {e}")
@@ -0,0 +1,141 @@
+"""Offloads large invoice payloads from DynamoDB items to compressed S3 objects.
+
+InvoiceData and ValidationResult used to be stored inline in full, which
+pushes large invoices towards the 400KB item limit and makes every scan and
+get pay for the line items. When an attribute's JSON is larger than
+PAYLOAD_INLINE_BYTES, the full value goes to PAYLOAD_BUCKET under
+payloads/<invoice_id>/, content-addressed by SHA-256. The item keeps a
+compact summary in its place (top-level scalars plus <list>_count fields) and
+a <Attribute>Ref pointer {Bucket, Key, Sha256, Codec, Size, StoredSize}.
+Lists and cover pages read the summary; hydrate() fetches the full values
+only where the detail is needed.
+
+Objects are gzip-compressed unless PAYLOAD_CODEC=zstd, which needs the
+zstandard package wherever payloads are read. Without PAYLOAD_BUCKET, or
+when the upload fails, values stay inline. Like tracing.py, the deploy
+workflow copies this module into each Lambda package.
+"""
+import gzip
+import hashlib
+import json
+import os
+from decimal import Decimal
+
+import boto3
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+PAYLOAD_INLINE_BYTES = int(os.environ.get('PAYLOAD_INLINE_BYTES', '16384'))
+PAYLOAD_CODEC = os.environ.get('PAYLOAD_CODEC', 'gzip')
+PAYLOAD_ATTRIBUTES = ('InvoiceData', 'ValidationResult')
+# Strings longer than this are left out of the inline summary
+SUMMARY_MAX_STRING = 256
+
+CODEC_EXTENSIONS = {'gzip': 'gz', 'zstd': 'zst'}
+
+s3_client = boto3.client('s3')
+
+def ref_attribute(attribute):
+    return f"{attribute}Ref"
+
+def json_default(value):
+    """json.dumps default for values read back from DynamoDB, whose numbers are Decimals"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+def encode(value):
+    """Canonical JSON bytes, so identical payloads hash and store identically"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=json_default).encode('utf-8')
+
+def compress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Payload is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def summarize(value):
+    """Top-level scalars of a dict plus a count for each list; None for anything else"""
+    if not isinstance(value, dict):
+        return None
+    summary = {}
+    for name, field in value.items():
+        if field is None or isinstance(field, (bool, int, float, Decimal)):
+            summary[name] = field
+        elif isinstance(field, str) and len(field) <= SUMMARY_MAX_STRING:
+            summary[name] = field
+        elif isinstance(field, (list, tuple)):
+            summary[f"{name}_count"] = len(field)
+    return summary
+
+def offload(invoice_id, attribute, value):
+    """Return (value to store inline, ref); ref is None when the full value stays inline"""
+    bucket = os.environ.get('PAYLOAD_BUCKET')
+    if not bucket or value is None:
+        return value, None
+    data = encode(value)
+    if len(data) <= PAYLOAD_INLINE_BYTES:
+        return value, None
+
+    codec = PAYLOAD_CODEC if PAYLOAD_CODEC == 'gzip' or zstandard is not None else 'gzip'
+    digest = hashlib.sha256(data).hexdigest()
+    key = f"payloads/{invoice_id}/{attribute}-{digest[:16]}.json.{CODEC_EXTENSIONS[codec]}"
+    body = compress(data, codec)
+    try:
+        s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/json',
+                             Metadata={'sha256': digest, 'codec': codec})
+    except Exception as e:
+        # Spilling is an optimization; an inline value under the item limit still works
+        print(f"Failed to offload {attribute} for {invoice_id} ({e}); storing inline")
+        return value, None
+    return summarize(value), {
+        "Bucket": bucket, "Key": key, "Sha256": digest, "Codec": codec, "Size": len(data), "StoredSize": len(body)
+    }
+
+def offload_attributes(invoice_id, attribute, value):
+    """Item attributes for put_item: the (possibly summarized) value and its ref when offloaded"""
+    stored, ref = offload(invoice_id, attribute, value)
+    attributes = {attribute: stored}
+    if ref is not None:
+        attributes[ref_attribute(attribute)] = ref
+    return attributes
+
+def offload_update(invoice_id, attribute, value, placeholder):
+    """(SET fragment, expression values) for update_item; a NULL ref marks a value stored inline again"""
+    stored, ref = offload(invoice_id, attribute, value)
+    fragment = f"{attribute} = {placeholder}, {ref_attribute(attribute)} = {placeholder}_ref"
+    return fragment, {placeholder: stored, f"{placeholder}_ref": ref}
+
+def fetch(ref):
+    """Download, decompress and verify an offloaded payload"""
+    body = s3_client.get_object(Bucket=ref['Bucket'], Key=ref['Key'])['Body'].read()
+    data = decompress(body, ref.get('Codec', 'gzip'))
+    if hashlib.sha256(data).hexdigest() != ref['Sha256']:
+        raise ValueError(f"Payload s3://{ref['Bucket']}/{ref['Key']} does not match its SHA-256")
+    # Decimals, as DynamoDB would have returned the value inline
+    return json.loads(data, parse_float=Decimal)
+
+def hydrate(item, attributes=PAYLOAD_ATTRIBUTES):
+    """Copy of item with offloaded attributes replaced by their full values and the refs dropped"""
+    hydrated = dict(item)
+    for attribute in attributes:
+        ref = hydrated.pop(ref_attribute(attribute), None)
+        if ref:
+            hydrated[attribute] = fetch(ref)
+    return hydrated
+
+def fingerprint(item, attribute):
+    """Something that changes exactly when the attribute's full value does, without fetching it"""
+    ref = item.get(ref_attribute(attribute))
+    if ref:
+        return {"sha256": ref['Sha256']}
+    return item.get(attribute)
@@ -0,0 +1,160 @@
+"""Opt-in sampling profiler for Lambda handlers.
+
+@profiled(service) wraps a handler so that a sampled fraction of invocations
+run under cProfile ("cpu") or tracemalloc ("memory"). Each sampled
+invocation writes one gzip-compressed artifact to S3 under
+profiles/<service>/<route>/<invoice_id>/, where the route and invoice id are
+read from the event. scripts/profile_report.py aggregates many of them into a
+ranked hot-function report.
+
+The mode and sample rate come from PROFILE_MODE / PROFILE_SAMPLE_RATE when
+set, otherwise from profileMode / profileSampleRate in the JSON system config
+at PROFILE_CONFIG_PARAM, re-read at most every PROFILE_CONFIG_TTL_SECONDS.
+Profiling is off by default, and a failure to profile or upload never fails
+the invocation. Like tracing.py, the deploy workflow copies this module into
+each Lambda package.
+"""
+import cProfile
+import functools
+import gzip
+import json
+import marshal
+import os
+import pickle
+import random
+import re
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+import boto3
+
+PROFILE_MODES = ('cpu', 'memory')
+PROFILE_CONFIG_TTL_SECONDS = float(os.environ.get('PROFILE_CONFIG_TTL_SECONDS', '60'))
+# Stack depth kept per allocation; deeper is more precise but slower
+PROFILE_TRACEMALLOC_FRAMES = int(os.environ.get('PROFILE_TRACEMALLOC_FRAMES', '10'))
+PROFILE_PREFIX = 'profiles'
+
+s3_client = boto3.client('s3')
+ssm = boto3.client('ssm')
+
+# (mode, sample_rate, read_at) from the system config parameter
+_config = (None, 0.0, float('-inf'))
+
+def profile_settings():
+    """(mode, sample_rate); mode is None when profiling is off"""
+    global _config
+    if os.environ.get('PROFILE_MODE'):
+        mode = os.environ['PROFILE_MODE'].lower()
+        rate = float(os.environ.get('PROFILE_SAMPLE_RATE', '1'))
+        return (mode if mode in PROFILE_MODES else None), rate
+
+    param = os.environ.get('PROFILE_CONFIG_PARAM')
+    if not param:
+        return None, 0.0
+    mode, rate, read_at = _config
+    if time.monotonic() - read_at >= PROFILE_CONFIG_TTL_SECONDS:
+        try:
+            config = json.loads(ssm.get_parameter(Name=param)['Parameter']['Value'])
+            mode = str(config.get('profileMode', 'off')).lower()
+            rate = float(config.get('profileSampleRate', 0))
+        except Exception as e:
+            # Missing or unreadable config means no profiling, checked again after the TTL
+            if not isinstance(e, ssm.exceptions.ParameterNotFound):
+                print(f"Failed to read profiling config from {param}: {e}")
+            mode, rate = None, 0.0
+        _config = (mode, rate, time.monotonic())
+    return (mode if mode in PROFILE_MODES else None), rate
+
+def _key_part(value):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', str(value)).strip('_') or 'none'
+
+def describe(event):
+    """(route, invoice_id) an invocation's profile is filed under"""
+    if not isinstance(event, dict):
+        return 'unknown', 'none'
+    path_parameters = event.get('pathParameters') or {}
+    invoice_id = path_parameters.get('invoiceId') or event.get('invoiceId') or event.get('trace_id')
+    if 'httpMethod' in event:
+        route = f"{event['httpMethod']} {event.get('resource') or event.get('path', '')}"
+    elif event.get('Records'):
+        route = 's3'
+        # Invoice ids are only assigned during ingest, so file S3 profiles by object key
+        invoice_id = invoice_id or event['Records'][0].get('s3', {}).get('object', {}).get('key')
+    elif 'mode' in event:
+        route = event['mode']
+    else:
+        route = 'direct'
+    return _key_part(route), _key_part(invoice_id or 'none')
+
+def profile_key(service, route, invoice_id, mode, request_id):
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%fZ')
+    suffix = 'pstats' if mode == 'cpu' else 'tracemalloc'
+    return f"{PROFILE_PREFIX}/{service}/{route}/{invoice_id}/{stamp}-{request_id}.{suffix}.gz"
+
+def upload_profile(key, data, metadata):
+    bucket = os.environ.get('PROFILE_BUCKET') or os.environ.get('PROCESSED_BUCKET')
+    if not bucket:
+        print(f"No PROFILE_BUCKET or PROCESSED_BUCKET set; dropping profile {key}")
+        return
+    try:
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=gzip.compress(data),
+            ContentType='application/octet-stream',
+            ContentEncoding='gzip',
+            Metadata={name: str(value) for name, value in metadata.items()}
+        )
+        print(f"Stored profile s3://{bucket}/{key}")
+    except Exception as e:
+        print(f"Failed to store profile {key}: {e}")
+
+def run_profiled(mode, handler, event, context, store):
+    """Run the handler under the given profiler, passing (artifact bytes, metadata) to store even if it raises"""
+    started = time.perf_counter()
+    if mode == 'cpu':
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(handler, event, context)
+        finally:
+            profiler.create_stats()
+            store(marshal.dumps(profiler.stats), {'duration-ms': round((time.perf_counter() - started) * 1000, 1)})
+
+    # Someone else (e.g. a debugging session) may already be tracing; leave it running
+    owned = not tracemalloc.is_tracing()
+    if owned:
+        tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+    tracemalloc.reset_peak()
+    try:
+        return handler(event, context)
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if owned:
+            tracemalloc.stop()
+        store(pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL),
+              {'duration-ms': round((time.perf_counter() - started) * 1000, 1), 'peak-bytes': peak})
+
+def profiled(service):
+    """Decorator sampling a Lambda handler's invocations into S3 profiles"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            mode, rate = profile_settings()
+            if mode is None or random.random() >= rate:
+                return handler(event, context)
+
+            route, invoice_id = describe(event)
+            request_id = _key_part(getattr(context, 'aws_request_id', None) or uuid.uuid4().hex)
+            key = profile_key(service, route, invoice_id, mode, request_id)
+
+            # Stored from a finally block: profiles of failed invocations are often the interesting ones
+            def store(data, metadata):
+                upload_profile(key, data, {'service': service, 'route': route, 'invoice-id': invoice_id,
+                                           'mode': mode, **metadata})
+
+            return run_profiled(mode, handler, event, context, store)
+        return wrapper
+    return decorator
@@ -0,0 +1,177 @@
+"""Prompt construction for process_invoice.
+
+Invoices are serialized compactly (no indentation, no empty values), fields
+the operation never uses are dropped, long free text is clipped and long
+line-item lists are replaced by aggregate statistics plus a sample. Tool
+results computed ahead of the model call are appended so the model reasons
+over them instead of spending a turn per tool call. If the
+result is still over the token budget the sample and text limits shrink
+until it fits. Token counts are estimated at ~4 characters per token, which
+is close enough to Bedrock's tokenizers for budgeting; the actual usage
+reported by the model is logged alongside.
+"""
+import json
+import os
+
+import boto3
+import numpy as np
+
+from line_items import load_line_item_columns, validate_line_items
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', '4000'))
+# Line-item lists longer than this are summarized
+LINE_ITEM_SAMPLE_LIMIT = int(os.environ.get('PROMPT_LINE_ITEM_LIMIT', '25'))
+MAX_TEXT_CHARS = 200
+CHARS_PER_TOKEN = 4
+
+cloudwatch = boto3.client('cloudwatch')
+
+# Fields the model never needs for an operation
+DROPPED_FIELDS = {
+    "validate": {"notes", "customer_address", "vendor_address", "billing_address",
+                 "shipping_address", "terms_and_conditions", "description"},
+    "generate": {"notes", "terms_and_conditions"},
+}
+
+PROMPT_TEMPLATES = {
+    "validate": ("Validate this vendor invoice for compliance and accuracy.\n"
+                 "Invoice JSON: {invoice}\n"
+                 "Check: required fields, tax calculations, pricing, currency."),
+    "generate": ("Generate a compliant customer invoice based on this sale data.\n"
+                 "Sale JSON: {invoice}\n"
+                 "Calculate correct taxes, apply currency conversion if needed."),
+}
+
+# Per-call metadata in tool results; irrelevant to the model and would make identical invoices
+# produce different prompts
+VOLATILE_TOOL_FIELDS = {"timestamp", "last_updated"}
+
+TOOL_RESULTS_TEMPLATE = ("\nPre-computed tool results (already run on this invoice, "
+                         "do not call these tools again): {results}")
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def compact_json(value):
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def _prune(value, max_text):
+    """Drop empty values and clip long strings, recursively"""
+    if isinstance(value, dict):
+        pruned = {k: _prune(v, max_text) for k, v in value.items()}
+        return {k: v for k, v in pruned.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [_prune(v, max_text) for v in value]
+    if isinstance(value, str) and len(value) > max_text:
+        return value[:max_text] + "..."
+    return value
+
+def summarize_line_items(line_items, invoice_data, sample_size, include_check=True):
+    """Aggregate statistics for a long line-item list, with the arithmetic pre-checked"""
+    quantities, unit_prices, totals = load_line_item_columns(line_items)
+    prices = unit_prices[np.isfinite(unit_prices)]
+    summary = {
+        "count": len(line_items),
+        "sum_of_totals": round(float(np.nansum(totals)), 2),
+        "total_quantity": round(float(np.nansum(quantities)), 4),
+        "unit_price_min": round(float(prices.min()), 2) if len(prices) else None,
+        "unit_price_max": round(float(prices.max()), 2) if len(prices) else None,
+    }
+    if include_check:
+        check = validate_line_items(invoice_data)
+        summary["arithmetic_check"] = {
+            "valid": check["valid"],
+            "errors": check["errors"],
+            "mismatched_rows": check["mismatched_rows"][:20].tolist(),
+            "invalid_rows": check["invalid_rows"][:20].tolist()
+        }
+    summary["sample"] = line_items[:sample_size]
+    return summary
+
+def build_prompt(invoice_data, operation, token_budget=None, tool_results=None):
+    """Return (prompt, stats) for an invoice and operation within the token budget.
+
+    tool_results ({tool_name: result}) are appended verbatim; only the invoice
+    part of the prompt shrinks to make room for them.
+    """
+    token_budget = token_budget or PROMPT_TOKEN_BUDGET
+    template = PROMPT_TEMPLATES.get(operation, PROMPT_TEMPLATES["generate"])
+    invoice_data = invoice_data or {}
+    tool_results = tool_results or {}
+    tool_section = ""
+    if tool_results:
+        stable = {
+            name: {k: v for k, v in result.items() if k not in VOLATILE_TOOL_FIELDS} if isinstance(result, dict) else result
+            for name, result in tool_results.items()
+        }
+        tool_section = TOOL_RESULTS_TEMPLATE.format(results=compact_json(stable))
+
+    dropped = sorted(DROPPED_FIELDS.get(operation, set()) & set(invoice_data))
+    kept = {k: v for k, v in invoice_data.items() if k not in dropped}
+    line_items = kept.pop("line_items", None)
+
+    original_tokens = estimate_tokens(template.format(invoice=json.dumps(invoice_data, indent=2, default=str)))
+    sample_size = LINE_ITEM_SAMPLE_LIMIT
+    max_text = MAX_TEXT_CHARS
+
+    while True:
+        payload = _prune(kept, max_text)
+        summarized = bool(line_items) and len(line_items) > sample_size
+        if line_items:
+            if summarized:
+                payload["line_items_summary"] = summarize_line_items(
+                    line_items, invoice_data, sample_size,
+                    include_check="validate_line_items" not in tool_results
+                )
+            else:
+                payload["line_items"] = _prune(line_items, max_text)
+
+        prompt = template.format(invoice=compact_json(payload)) + tool_section
+        tokens = estimate_tokens(prompt)
+        if tokens <= token_budget or ((not line_items or sample_size == 0) and max_text <= 40):
+            break
+        # Over budget: shrink the line-item sample first, then free text
+        if line_items and sample_size > 0:
+            sample_size = min(sample_size, len(line_items)) // 2
+        else:
+            max_text = max(max_text // 2, 40)
+
+    stats = {
+        "estimated_input_tokens": tokens,
+        "original_estimated_tokens": original_tokens,
+        "token_budget": token_budget,
+        "within_budget": tokens <= token_budget,
+        "dropped_fields": dropped,
+        "line_items_summarized": summarized,
+        "precomputed_tools": sorted(tool_results),
+    }
+    return prompt, stats
+
+def put_prompt_metrics(stats, usage=None, cycles=None):
+    """Publish estimated prompt tokens and, when the model reports them, actual usage and turns"""
+    dimensions = [{'Name': 'Environment', 'Value': os.environ.get('ENVIRONMENT', 'dev')}]
+    metric_data = [{
+        'MetricName': 'PromptEstimatedTokens',
+        'Value': stats["estimated_input_tokens"],
+        'Unit': 'Count',
+        'Dimensions': dimensions
+    }]
+    for field, metric_name in (('inputTokens', 'ModelInputTokens'), ('outputTokens', 'ModelOutputTokens')):
+        if usage and usage.get(field) is not None:
+            metric_data.append({
+                'MetricName': metric_name,
+                'Value': usage[field],
+                'Unit': 'Count',
+                'Dimensions': dimensions
+            })
+    if cycles is not None:
+        metric_data.append({
+            'MetricName': 'ModelCycles',
+            'Value': cycles,
+            'Unit': 'Count',
+            'Dimensions': dimensions
+        })
+    try:
+        cloudwatch.put_metric_data(Namespace='GlobalInvoiceAI', MetricData=metric_data)
+    except Exception as e:
+        print(f"Failed to publish prompt metrics: {e}")
@@ -0,0 +1,196 @@
+"""Historical exchange rates for converting at the rate on invoice_date.
+
+Daily snapshots (date, currency, rate per USD) are loaded from a local
+CSV/Parquet file or an s3:// URI into two compact arrays: a sorted int32
+column of day numbers and a float64 days x currencies matrix. Gaps are
+forward-filled at load time, so answering "rate for pair X on date D" is a
+binary search for the last snapshot on or before D plus two reads. Loaded
+histories are kept at module level and reused across invocations in the
+same container.
+"""
+import bisect
+import csv
+import io
+import os
+import threading
+from datetime import date, timedelta
+
+import boto3
+import numpy as np
+
+from currency import round_half_up, minor_unit_scale
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+s3 = boto3.client('s3')
+
+_histories = {}
+_histories_lock = threading.Lock()
+
+def to_day_numbers(dates):
+    """Convert ISO date strings (or datetime64 values) to int32 days since 1970-01-01"""
+    days = np.asarray(dates, dtype='datetime64[D]') - EPOCH
+    return days.astype(np.int32)
+
+class RateHistory:
+    """Forward-filled daily USD rates for a fixed set of currencies"""
+
+    def __init__(self, days, currencies, usd_rates):
+        self.days = days
+        self.currencies = tuple(currencies)
+        self.currency_index = {code: i for i, code in enumerate(self.currencies)}
+        self.usd_rates = usd_rates
+        # Plain list copy for the scalar path: bisect on a list beats a numpy call per lookup
+        self._day_list = days.tolist()
+        days.setflags(write=False)
+        usd_rates.setflags(write=False)
+
+    @classmethod
+    def from_columns(cls, dates, currencies, rates):
+        """Build from parallel date / currency / rate-per-USD columns, forward-filling gaps"""
+        days, day_positions = np.unique(to_day_numbers(dates), return_inverse=True)
+        codes, code_positions = np.unique(
+            np.char.upper(np.char.strip(np.asarray(currencies, dtype=str))), return_inverse=True
+        )
+
+        matrix = np.full((len(days), len(codes)), np.nan, dtype=np.float64)
+        matrix[day_positions.reshape(-1), code_positions.reshape(-1)] = np.asarray(rates, dtype=np.float64)
+
+        # Forward fill: each cell takes the last non-missing row at or above it
+        present = ~np.isnan(matrix)
+        last_row = np.where(present, np.arange(len(days))[:, np.newaxis], 0)
+        np.maximum.accumulate(last_row, axis=0, out=last_row)
+        matrix = matrix[last_row, np.arange(len(codes))]
+
+        codes = codes.tolist()
+        if 'USD' not in codes:
+            codes.append('USD')
+            matrix = np.column_stack([matrix, np.ones(len(days))])
+
+        return cls(days.astype(np.int32), codes, matrix)
+
+    def rate(self, from_currency, to_currency, on_date):
+        """Return (rate, snapshot_date) for a pair on a date, or None if not covered"""
+        from_idx = self.currency_index.get(from_currency.upper())
+        to_idx = self.currency_index.get(to_currency.upper())
+        if from_idx is None or to_idx is None:
+            return None
+
+        day = (date.fromisoformat(str(on_date)[:10]) - date(1970, 1, 1)).days
+        row = bisect.bisect_right(self._day_list, day) - 1
+        if row < 0:
+            return None
+
+        rate = self.usd_rates.item(row, to_idx) / self.usd_rates.item(row, from_idx)
+        if rate != rate:  # NaN: a currency with no snapshot yet on that date
+            return None
+        return rate, (date(1970, 1, 1) + timedelta(days=self._day_list[row])).isoformat()
+
+    def rates(self, from_currencies, to_currencies, on_dates):
+        """Vectorized lookup over upper-case ISO codes and dates (any of them may be a single value).
+
+        Returns (rates, snapshot_days) with NaN / -1 where a row is not covered.
+        """
+        if isinstance(from_currencies, str):
+            from_currencies = [from_currencies]
+        if isinstance(to_currencies, str):
+            to_currencies = [to_currencies]
+        rows = np.searchsorted(self.days, to_day_numbers(on_dates), side='right') - 1
+
+        from_idx = np.fromiter((self.currency_index.get(c, -1) for c in from_currencies), dtype=np.intp)
+        to_idx = np.fromiter((self.currency_index.get(c, -1) for c in to_currencies), dtype=np.intp)
+        from_idx, to_idx, rows = np.broadcast_arrays(from_idx, to_idx, rows)
+
+        invalid = (rows < 0) | (from_idx < 0) | (to_idx < 0)
+        safe_rows = np.where(invalid, 0, rows)
+        result = (self.usd_rates[safe_rows, np.where(invalid, 0, to_idx)]
+                  / self.usd_rates[safe_rows, np.where(invalid, 0, from_idx)])
+        result[invalid] = np.nan
+
+        snapshot_days = np.where(invalid, -1, self.days[safe_rows])
+        return result, snapshot_days
+
+def _read_source(source):
+    """Return (bytes, format) for a local path or s3://bucket/key URI"""
+    file_format = 'parquet' if source.lower().endswith('.parquet') else 'csv'
+    if source.startswith('s3://'):
+        bucket, key = source[len('s3://'):].split('/', 1)
+        return s3.get_object(Bucket=bucket, Key=key)['Body'].read(), file_format
+    with open(source, 'rb') as f:
+        return f.read(), file_format
+
+def load_rate_history(source):
+    """Load a rate history file with date, currency and rate (per USD) columns"""
+    data, file_format = _read_source(source)
+
+    if file_format == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required to load Parquet rate history")
+        table = pq.read_table(io.BytesIO(data), columns=['date', 'currency', 'rate'])
+        return RateHistory.from_columns(
+            table.column('date').to_numpy().astype('datetime64[D]'),
+            table.column('currency').to_numpy(zero_copy_only=False).astype(str),
+            table.column('rate').to_numpy()
+        )
+
+    reader = csv.DictReader(io.StringIO(data.decode('utf-8')))
+    dates, currencies, rates = [], [], []
+    for row in reader:
+        dates.append(row['date'])
+        currencies.append(row['currency'])
+        rates.append(float(row['rate']))
+    return RateHistory.from_columns(dates, currencies, rates)
+
+def get_rate_history(source=None):
+    """Return the cached history for source (default RATE_HISTORY_SOURCE), loading it once"""
+    source = source or os.environ.get('RATE_HISTORY_SOURCE')
+    if not source:
+        return None
+
+    history = _histories.get(source)
+    if history is None:
+        with _histories_lock:
+            history = _histories.get(source)
+            if history is None:
+                history = load_rate_history(source)
+                _histories[source] = history
+                print(f"Loaded rate history from {source}: "
+                      f"{len(history.days)} days x {len(history.currencies)} currencies")
+    return history
+
+def convert_on_date(history, amount, from_currency, to_currency, on_date):
+    """Convert at the last snapshot on or before on_date; returns the convert_currency result shape"""
+    found = history.rate(from_currency, to_currency, on_date)
+    if found is None:
+        return {"error": f"No exchange rate for {from_currency}->{to_currency} on or before {on_date}"}
+
+    exchange_rate, rate_date = found
+    converted = round_half_up(amount * exchange_rate, minor_unit_scale(to_currency))
+    return {
+        "original_amount": amount,
+        "converted_amount": float(converted),
+        "exchange_rate": round(exchange_rate, 4),
+        "from_currency": from_currency.upper(),
+        "to_currency": to_currency.upper(),
+        "rate_date": rate_date,
+        "requested_date": str(on_date)[:10],
+        "source": "history"
+    }
+
+def convert_batch_on_date(history, amounts, from_currencies, to_currencies, on_dates):
+    """Vectorized convert_on_date; returns (converted, rates, invalid_indices) like currency.convert_batch"""
+    amounts = np.asarray(amounts, dtype=np.float64).reshape(-1)
+    from_codes = [from_currencies] if isinstance(from_currencies, str) else from_currencies
+    to_codes = [to_currencies] if isinstance(to_currencies, str) else to_currencies
+    from_codes = [code.strip().upper() for code in from_codes]
+    to_codes = [code.strip().upper() for code in to_codes]
+
+    rates, _ = history.rates(from_codes, to_codes, on_dates)
+    rates = np.broadcast_to(rates, amounts.shape)
+    scales = np.broadcast_to(
+        np.fromiter((minor_unit_scale(code) for code in to_codes), dtype=np.float64), amounts.shape
+    )
+    converted = round_half_up(amounts * rates, scales)
+    return converted, rates, np.flatnonzero(np.isnan(rates))
@@ -0,0 +1,121 @@
+"""Content-addressed cache of agent results.
+
+Results are keyed on a SHA-256 of the normalized invoice payload, the
+operation, the prompt version and the model id, so a resubmitted or
+replayed invoice is answered without calling Bedrock. Lookups go to an
+in-container LRU first and then to the AgentResultCache DynamoDB table,
+whose items expire through DynamoDB TTL.
+"""
+import hashlib
+import json
+import math
+import os
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import boto3
+
+from ttl_cache import TTLCache
+
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get('RESULT_CACHE_TTL', '86400'))
+LOCAL_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', '256'))
+
+dynamodb = boto3.resource('dynamodb')
+cloudwatch = boto3.client('cloudwatch')
+
+_cache = TTLCache(LOCAL_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS)
+_table = None
+
+def _results_table():
+    global _table
+    if _table is None:
+        _table = dynamodb.Table(os.environ.get('RESULT_CACHE_TABLE', 'globalinvoiceai-AgentResultCache-dev'))
+    return _table
+
+def normalize_payload(value):
+    """Canonical form of a payload: integral numbers as ints, strings stripped"""
+    if isinstance(value, dict):
+        return {str(k): normalize_payload(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_payload(v) for v in value]
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float, Decimal)):
+        if not math.isfinite(value):
+            return str(value)
+        return int(value) if value == int(value) else float(value)
+    if isinstance(value, str):
+        return value.strip()
+    return str(value)
+
+def result_cache_key(invoice_data, operation, prompt_version, model_id):
+    canonical = json.dumps(
+        {
+            'invoice_data': normalize_payload(invoice_data),
+            'operation': operation,
+            'prompt_version': prompt_version,
+            'model_id': model_id
+        },
+        sort_keys=True,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def get_cached_result(cache_key):
+    """Return {"response": str, "model_latency_ms": float} or None"""
+    entry = _cache.get(cache_key)
+    if entry is not None:
+        return entry
+
+    try:
+        item = _results_table().get_item(Key={'CacheKey': cache_key}).get('Item')
+    except Exception as e:
+        print(f"Result cache lookup failed: {e}")
+        return None
+
+    # DynamoDB deletes expired items lazily, so honour TTL on read as well
+    if item is None or int(item.get('TTL', 0)) <= int(time.time()):
+        return None
+
+    entry = {
+        "response": item['Response'],
+        "model_latency_ms": float(item.get('ModelLatencyMs', 0))
+    }
+    _cache.put(cache_key, entry, ttl=int(item['TTL']) - int(time.time()))
+    return entry
+
+def put_cached_result(cache_key, response, model_latency_ms):
+    entry = {"response": response, "model_latency_ms": model_latency_ms}
+    _cache.put(cache_key, entry)
+    try:
+        _results_table().put_item(Item={
+            'CacheKey': cache_key,
+            'Response': response,
+            'ModelLatencyMs': Decimal(str(round(model_latency_ms, 1))),
+            'CreatedAt': datetime.utcnow().isoformat(),
+            'TTL': int(time.time()) + RESULT_CACHE_TTL_SECONDS
+        })
+    except Exception as e:
+        print(f"Result cache write failed: {e}")
+
+def put_cache_metrics(cache_hit, model_latency_saved_ms=0.0):
+    """Hit ratio = ResultCacheHit / (ResultCacheHit + ResultCacheMiss)"""
+    dimensions = [{'Name': 'Environment', 'Value': os.environ.get('ENVIRONMENT', 'dev')}]
+    metric_data = [{
+        'MetricName': 'ResultCacheHit' if cache_hit else 'ResultCacheMiss',
+        'Value': 1,
+        'Unit': 'Count',
+        'Dimensions': dimensions
+    }]
+    if cache_hit:
+        metric_data.append({
+            'MetricName': 'ModelLatencySaved',
+            'Value': model_latency_saved_ms,
+            'Unit': 'Milliseconds',
+            'Dimensions': dimensions
+        })
+    try:
+        cloudwatch.put_metric_data(Namespace='GlobalInvoiceAI', MetricData=metric_data)
+    except Exception as e:
+        print(f"Failed to publish result cache metrics: {e}")
@@ -0,0 +1,173 @@
+"""Batched, non-blocking persistence of validation results.
+
+store_result() only enqueues; a background writer thread coalesces results
+from every concurrent invocation (the latest result per invoice wins) and
+writes the batch as independent UpdateItem calls on a small thread pool, so
+Status, InvoiceData etc. are left untouched and one failing invoice cannot
+fail the others. Each caller gets a future resolving to
+{"success": ..., "write_latency_ms": ...}; pending writes are flushed on
+shutdown. Results too large to keep inline are offloaded to S3 by
+payload_store on the writer thread, off the request path.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+import boto3
+
+from payload_store import offload_update
+
+# Most results coalesced into one flush
+RESULT_WRITE_BATCH_SIZE = int(os.environ.get('RESULT_WRITE_BATCH_SIZE', '25'))
+# UpdateItem calls in flight at once during a flush
+RESULT_WRITE_CONCURRENCY = int(os.environ.get('RESULT_WRITE_CONCURRENCY', '8'))
+# How long the writer waits for more results before flushing a partial batch
+RESULT_WRITE_INTERVAL_MS = float(os.environ.get('RESULT_WRITE_INTERVAL_MS', '20'))
+
+RESULT_ATTRIBUTE = 'ValidationResult'
+
+dynamodb = boto3.resource('dynamodb')
+cloudwatch = boto3.client('cloudwatch')
+
+_STOP = object()
+
+def to_dynamodb(value):
+    """DynamoDB rejects Python floats; store them as Decimals"""
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: to_dynamodb(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamodb(v) for v in value]
+    return value
+
+class ResultWriter:
+    def __init__(self, table_name=None, batch_size=RESULT_WRITE_BATCH_SIZE, interval_ms=RESULT_WRITE_INTERVAL_MS,
+                 concurrency=RESULT_WRITE_CONCURRENCY):
+        self.table_name = table_name or os.environ.get('INVOICES_TABLE', 'globalinvoiceai-Invoices-dev')
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._table = dynamodb.Table(self.table_name)
+        self._pool = ThreadPoolExecutor(max(concurrency, 1), thread_name_prefix='result-write')
+        self._closed = False
+
+    def store_result(self, invoice_id, validation_result):
+        """Queue a result for writing; returns a concurrent.futures.Future"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                future.set_result({"success": False, "invoice_id": invoice_id, "error": "Result writer is closed"})
+                return future
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='result-writer', daemon=True)
+                self._thread.start()
+            self._queue.put((invoice_id, validation_result, time.monotonic(), future))
+        return future
+
+    def close(self, timeout=10):
+        """Flush everything queued and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join(timeout)
+        self._pool.shutdown(wait=False)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._flush(batch)
+            except Exception as e:
+                # Never leave a caller waiting on a batch that blew up
+                for invoice_id, _, _, future in batch:
+                    if not future.done():
+                        future.set_result({"success": False, "invoice_id": invoice_id, "error": str(e)})
+
+    def _flush(self, batch):
+        # Coalesce: one update per invoice, carrying the latest result
+        pending = {}
+        for invoice_id, result, queued_at, future in batch:
+            entry = pending.setdefault(invoice_id, {"futures": [], "queued_at": queued_at})
+            entry["result"] = result
+            entry["futures"].append(future)
+
+        updated = datetime.utcnow().isoformat()
+        started = time.monotonic()
+        writes = {
+            invoice_id: self._pool.submit(self._write, invoice_id, entry["result"], updated)
+            for invoice_id, entry in pending.items()
+        }
+        failures = 0
+        for invoice_id, entry in pending.items():
+            outcome = writes[invoice_id].result()
+            outcome["queued_ms"] = round((time.monotonic() - entry["queued_at"]) * 1000, 1)
+            failures += not outcome["success"]
+            for future in entry["futures"]:
+                future.set_result(outcome)
+
+        put_write_metrics(len(pending), (time.monotonic() - started) * 1000, failures)
+
+    def _write(self, invoice_id, result, updated):
+        """One UpdateItem; failures are reported in the outcome rather than raised"""
+        started = time.monotonic()
+        outcome = {"success": True, "invoice_id": invoice_id}
+        try:
+            self._table.update_item(Key={'InvoiceId': invoice_id}, **result_update(invoice_id, result, updated))
+        except Exception as e:
+            print(f"Result write for {invoice_id} failed: {e}")
+            outcome = {"success": False, "invoice_id": invoice_id, "error": str(e)}
+        outcome["write_latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return outcome
+
+def result_update(invoice_id, result, updated):
+    """UpdateItem arguments for one result; a large result is offloaded to S3 and summarized inline"""
+    fragment, values = offload_update(invoice_id, RESULT_ATTRIBUTE, to_dynamodb(result), ':result')
+    return {
+        'UpdateExpression': f"SET {fragment}, UpdatedAt = :updated",
+        'ExpressionAttributeValues': {**values, ':updated': updated}
+    }
+
+def put_write_metrics(batch_size, write_latency_ms, failures):
+    dimensions = [{'Name': 'Environment', 'Value': os.environ.get('ENVIRONMENT', 'dev')}]
+    metric_data = [
+        {'MetricName': 'ResultWriteLatency', 'Value': write_latency_ms, 'Unit': 'Milliseconds', 'Dimensions': dimensions},
+        {'MetricName': 'ResultWriteBatchSize', 'Value': batch_size, 'Unit': 'Count', 'Dimensions': dimensions},
+    ]
+    if failures:
+        metric_data.append({'MetricName': 'ResultWriteFailures', 'Value': failures, 'Unit': 'Count',
+                            'Dimensions': dimensions})
+    try:
+        cloudwatch.put_metric_data(Namespace='GlobalInvoiceAI', MetricData=metric_data)
+    except Exception as e:
+        print(f"Failed to publish result write metrics: {e}")
+
+result_writer = ResultWriter()
+# Backstop for exits that skip the app's lifespan shutdown
+atexit.register(result_writer.close)
@@ -0,0 +1,33 @@
+"""Content hash of the agent image sources, used to tag and reuse images.
+
+The agentcore-deploy Lambda tags the image it builds src-<hash[:16]> and the
+deploy workflow computes the same tag to skip builds ECR already has. This
+module has no dependencies beyond the standard library; the deploy workflow
+copies it into the agentcore-deploy package.
+
+Usage: python agentcore/source_hash.py [SOURCE_DIR]
+"""
+import hashlib
+import os
+import sys
+
+# Files that make up the image besides the Python sources; anything else in the directory doesn't change it
+IMAGE_INPUTS = ('Dockerfile', 'requirements.txt')
+
+def source_files(source_dir):
+    """Sorted names of the files copied into the image"""
+    names = [name for name in os.listdir(source_dir) if name.endswith('.py')]
+    return sorted(names + [name for name in IMAGE_INPUTS if os.path.exists(os.path.join(source_dir, name))])
+
+def source_hash(source_dir):
+    """SHA-256 over the agent source, requirements and Dockerfile (names and contents)"""
+    digest = hashlib.sha256()
+    for name in source_files(source_dir):
+        with open(os.path.join(source_dir, name), 'rb') as f:
+            content = f.read()
+        digest.update(name.encode('utf-8') + b'\0')
+        digest.update(hashlib.sha256(content).digest())
+    return digest.hexdigest()
+
+if __name__ == '__main__':
+    print(source_hash(sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,200 @@
+"""Tax-rate engine for the invoice agent.
+
+Rates are compiled once at import into an immutable index keyed by
+jurisdiction ("US-CA", "UK", ...). Lookups resolve region -> country ->
+fallback in a single pass, with a TTL-aware in-process LRU in front of the
+TaxRatesCache DynamoDB table so operator overrides in the table win over the
+built-in rates without costing a DynamoDB round trip per tool call.
+"""
+import os
+import time
+from datetime import datetime
+from types import MappingProxyType
+
+import boto3
+
+from ttl_cache import TTLCache
+
+# Hardcoded tax rates for demo purposes
+# In production, these would come from external APIs or databases
+TAX_RATES = {
+    # US States
+    "US-CA": {"SALES_TAX": 0.0875, "VAT": 0.0875},
+    "US-NY": {"SALES_TAX": 0.08, "VAT": 0.08},
+    "US-TX": {"SALES_TAX": 0.0825, "VAT": 0.0825},
+    "US-FL": {"SALES_TAX": 0.07, "VAT": 0.07},
+
+    # UK
+    "UK": {"VAT": 0.20},
+
+    # India
+    "IN": {"GST": 0.18},
+    "IN-MH": {"GST": 0.18},  # Maharashtra
+    "IN-KA": {"GST": 0.18},  # Karnataka
+    "IN-DL": {"GST": 0.18},  # Delhi
+
+    # Canada
+    "CA-ON": {"HST": 0.13, "GST": 0.05, "PST": 0.08},
+    "CA-BC": {"GST": 0.05, "PST": 0.07},
+    "CA-QC": {"GST": 0.05, "QST": 0.09975},
+
+    # Australia
+    "AU-NSW": {"GST": 0.10},
+    "AU-VIC": {"GST": 0.10},
+    "AU-QLD": {"GST": 0.10},
+
+    # European Union
+    "DE": {"VAT": 0.19},  # Germany
+    "FR": {"VAT": 0.20},  # France
+    "IT": {"VAT": 0.22},  # Italy
+    "ES": {"VAT": 0.21},  # Spain
+    "NL": {"VAT": 0.21},  # Netherlands
+}
+
+# Fallback rates by country
+FALLBACK_RATES = {
+    "US": 0.07,  # Average US sales tax
+    "UK": 0.20,  # Standard VAT rate
+    "IN": 0.18,  # GST
+    "CA": 0.13,  # Average HST
+    "AU": 0.10,  # GST
+    "DE": 0.19,  # VAT
+    "FR": 0.20,  # VAT
+    "IT": 0.22,  # VAT
+    "ES": 0.21,  # VAT
+    "NL": 0.21,  # VAT
+}
+
+# Jurisdictions where several taxes are levied together on the same sale
+COMPOUND_TAXES = {
+    "CA-BC": ("GST", "PST"),
+    "CA-QC": ("GST", "QST"),
+}
+
+# ISO codes callers commonly send for countries keyed differently above
+COUNTRY_ALIASES = {"GB": "UK"}
+
+# How long a resolved rate is trusted in-process before re-reading the table
+LOCAL_TTL_SECONDS = int(os.environ.get('TAX_RATE_CACHE_TTL', '900'))
+LOCAL_CACHE_SIZE = int(os.environ.get('TAX_RATE_CACHE_SIZE', '1024'))
+
+INDEX_LOADED_AT = datetime.utcnow().isoformat()
+
+def _compile_index():
+    """Freeze TAX_RATES into {jurisdiction: {tax_type: rate}} read-only mappings"""
+    return MappingProxyType({
+        jurisdiction: MappingProxyType(dict(rates))
+        for jurisdiction, rates in TAX_RATES.items()
+    })
+
+RATE_INDEX = _compile_index()
+FALLBACK_INDEX = MappingProxyType(dict(FALLBACK_RATES))
+
+dynamodb = boto3.resource('dynamodb')
+
+_cache = TTLCache(LOCAL_CACHE_SIZE, LOCAL_TTL_SECONDS)
+
+def jurisdiction_keys(country, region):
+    """Return candidate jurisdiction keys from most to least specific"""
+    country = (country or "").strip().upper()
+    country = COUNTRY_ALIASES.get(country, country)
+    region = (region or "").strip().upper()
+    # Accept regions passed fully qualified, e.g. region="CA-QC"
+    if region.startswith(f"{country}-"):
+        region = region[len(country) + 1:]
+    if region:
+        return country, (f"{country}-{region}", country)
+    return country, (country,)
+
+def _read_table_overrides(keys, tax_type):
+    """Fetch table rows for every candidate key in one BatchGetItem; returns {key: item}"""
+    table_name = os.environ.get('TAX_RATES_TABLE', 'globalinvoiceai-TaxRates-dev')
+    try:
+        response = dynamodb.batch_get_item(RequestItems={
+            table_name: {
+                'Keys': [{'CountryRegion': key, 'TaxType': tax_type} for key in keys]
+            }
+        })
+    except Exception as e:
+        print(f"Tax rate cache lookup failed: {e}")
+        return {}
+
+    now = int(time.time())
+    items = {}
+    for item in response.get('Responses', {}).get(table_name, []):
+        # DynamoDB deletes expired items lazily, so honour TTL on read as well
+        if 'TTL' in item and int(item['TTL']) <= now:
+            continue
+        items[item['CountryRegion']] = item
+    return items
+
+def _components(jurisdiction, tax_type, rate):
+    """Return every tax levied together with tax_type in a jurisdiction"""
+    compound = COMPOUND_TAXES.get(jurisdiction)
+    if not compound or tax_type not in compound:
+        return [{"tax_type": tax_type, "rate": rate}]
+    rates = RATE_INDEX[jurisdiction]
+    return [{"tax_type": name, "rate": rates[name]} for name in compound]
+
+def resolve_tax_rate(country, region, tax_type):
+    """Resolve a tax rate through LRU -> TaxRatesCache table -> built-in index -> fallback.
+
+    Returns a dict with the requested rate plus "components", the list of taxes
+    levied together in that jurisdiction (e.g. GST and QST for CA-QC).
+    """
+    tax_type = (tax_type or "").strip().upper()
+    country_code, keys = jurisdiction_keys(country, region)
+    cache_key = (keys[0], tax_type)
+
+    cached = _cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+
+    result = None
+    table_ttl = None
+    overrides = _read_table_overrides(keys, tax_type)
+
+    # Single pass from most to least specific: a table override at a level beats
+    # the built-in rate at that level, and any hit stops the walk
+    for key in keys:
+        if key in overrides:
+            item = overrides[key]
+            rate = float(item['Rate'])
+            result = {
+                "rate": rate,
+                "source": "cache",
+                "jurisdiction": key,
+                "last_updated": item.get('UpdatedAt', INDEX_LOADED_AT),
+                "components": [{"tax_type": tax_type, "rate": rate}]
+            }
+            if 'TTL' in item:
+                table_ttl = max(int(item['TTL']) - int(time.time()), 0)
+            break
+        rates = RATE_INDEX.get(key)
+        if rates is not None and tax_type in rates:
+            result = {
+                "rate": rates[tax_type],
+                "source": "hardcoded",
+                "jurisdiction": key,
+                "last_updated": INDEX_LOADED_AT,
+                "components": _components(key, tax_type, rates[tax_type])
+            }
+            break
+
+    if result is None:
+        rate = FALLBACK_INDEX.get(country_code, 0.0)
+        result = {
+            "rate": rate,
+            "source": "fallback",
+            "jurisdiction": country_code,
+            "last_updated": INDEX_LOADED_AT,
+            "components": [{"tax_type": tax_type, "rate": rate}]
+        }
+
+    result["combined_rate"] = round(sum(c["rate"] for c in result["components"]), 6)
+    result["tax_type"] = tax_type
+    result["country"] = country_code
+    result["region"] = region
+
+    _cache.put(cache_key, result, ttl=table_ttl)
+    return dict(result)
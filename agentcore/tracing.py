@@ -0,0 +1,148 @@
+"""Lightweight per-invoice tracing shared by the agent and the Lambdas.
+
+A trace is identified by the InvoiceId and follows the invoice across stages:
+invoice-trigger passes it to the agent as payload["trace_id"] and the PDF
+invoke carries it as event["trace_id"]. Spans nest through a context variable
+(so asyncio tasks and to_thread calls inherit their parent) and are timed with
+time.perf_counter. When a trace ends, each span is printed as one structured
+JSON log line, followed by a summary of total milliseconds per span name that
+callers store on the invoice record under TimingSummary.<stage>.
+
+This module has no dependencies beyond the standard library; the deploy
+workflow copies it into each Lambda package.
+"""
+import contextlib
+import contextvars
+import json
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+# (trace, span) the current code runs under; span is None at the trace root
+_current = contextvars.ContextVar('tracing_current', default=(None, None))
+
+class Trace:
+    def __init__(self, trace_id, service):
+        self.trace_id = trace_id
+        self.service = service
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name, parent=None, **attributes):
+        """Open a span without making it current, for callback-style start/end pairs"""
+        return {
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent["span_id"] if parent else None,
+            "name": name,
+            "start_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "_started": time.perf_counter(),
+            **attributes
+        }
+
+    def end_span(self, span, error=None):
+        span["duration_ms"] = round((time.perf_counter() - span.pop("_started")) * 1000, 3)
+        if error is not None:
+            span["error"] = str(error)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def summary(self):
+        """{"trace_id", "service", "total_ms", "spans": {name: total ms}} for storing on the invoice"""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+        return {
+            "trace_id": self.trace_id,
+            "service": self.service,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "spans": {name: round(ms, 1) for name, ms in totals.items()}
+        }
+
+    def export(self):
+        """Print every finished span, then the summary, as one JSON log line each"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        for span in spans:
+            print(json.dumps({"type": "trace_span", "trace_id": self.trace_id, "service": self.service, **span},
+                             default=str))
+        print(json.dumps({"type": "trace_summary", **self.summary()}))
+
+@contextlib.contextmanager
+def start_trace(trace_id, service):
+    """Make a new trace current for the block and export it at the end"""
+    previous = _current.get()
+    trace = Trace(trace_id, service)
+    _current.set((trace, None))
+    try:
+        yield trace
+    finally:
+        # set() rather than reset(token): async generators may resume in another context
+        _current.set(previous)
+        trace.export()
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time the block as a child of the current span; a no-op outside a trace"""
+    trace, parent = _current.get()
+    if trace is None:
+        yield None
+        return
+    current = trace.start_span(name, parent, **attributes)
+    _current.set((trace, current))
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current.set((trace, parent))
+        trace.end_span(current, error)
+
+def current_trace():
+    return _current.get()[0]
+
+def current_span():
+    return _current.get()[1]
+
+def to_dynamodb(summary):
+    """Timing summaries hold floats, which DynamoDB rejects"""
+    if isinstance(summary, float):
+        return Decimal(str(summary))
+    if isinstance(summary, dict):
+        return {k: to_dynamodb(v) for k, v in summary.items()}
+    return summary
+
+def store_summary(table, invoice_id, stage, summary):
+    """Merge one stage's summary into the invoice's TimingSummary map; never raises"""
+    def set_stage():
+        table.update_item(
+            Key={'InvoiceId': invoice_id},
+            UpdateExpression='SET TimingSummary.#stage = :summary',
+            ConditionExpression='attribute_exists(TimingSummary)',
+            ExpressionAttributeNames={'#stage': stage},
+            ExpressionAttributeValues={':summary': to_dynamodb(summary)}
+        )
+
+    conditional_check_failed = table.meta.client.exceptions.ConditionalCheckFailedException
+    try:
+        try:
+            set_stage()
+        except conditional_check_failed:
+            # First stage to report: the map doesn't exist yet
+            try:
+                table.update_item(
+                    Key={'InvoiceId': invoice_id},
+                    UpdateExpression='SET TimingSummary = :summaries',
+                    ConditionExpression='attribute_not_exists(TimingSummary)',
+                    ExpressionAttributeValues={':summaries': {stage: to_dynamodb(summary)}}
+                )
+            except conditional_check_failed:
+                # Another stage created the map in between; merge into it instead
+                set_stage()
+    except Exception as e:
+        print(f"Failed to store {stage} timing for {invoice_id}: {e}")
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { Card, Table, Button, Badge, Spinner, Alert, Modal, Form, Row, Col } from 'react-bootstrap';
 import { FaDownload, FaEye, FaFilter, FaUpload } from 'react-icons/fa';
 import { apiService } from '../utils/api';
@@ -13,10 +13,19 @@ const InvoiceList = () => {
   const [selectedFile, setSelectedFile] = useState(null);
   const [uploading, setUploading] = useState(false);
   const [filter, setFilter] = useState('all');
+  const changesCursor = useRef(null);
 
   const loadInvoices = useCallback(async () => {
     try {
       setLoading(true);
+      // Take the change cursor before the full load so nothing changed in between is missed
+      changesCursor.current = null;
+      try {
+        changesCursor.current = (await apiService.getInvoiceChanges()).cursor;
+      } catch (err) {
+        console.warn('Change feed unavailable, list will not auto-refresh:', err);
+      }
+
       const params = { limit: 100 };
       if (filter !== 'all') {
         params.status = filter;
@@ -33,10 +42,58 @@ const InvoiceList = () => {
     }
   }, [filter]);
 
+  // Merge invoices created, updated or removed since the last poll into the list
+  const applyChanges = useCallback(async () => {
+    if (!changesCursor.current) return;
+    try {
+      const latest = new Map();
+      let page;
+      do {
+        page = await apiService.getInvoiceChanges(changesCursor.current);
+        if (page.reset) {
+          loadInvoices();
+          return;
+        }
+        page.changes.forEach(({ Op, ...invoice }) => latest.set(invoice.InvoiceId, { Op, invoice }));
+        changesCursor.current = page.cursor;
+      } while (page.hasMore);
+      if (latest.size === 0) return;
+
+      const matches = (invoice) => filter === 'all' || invoice.Status === filter;
+      setInvoices((current) => {
+        const pending = new Map(latest);
+        const kept = current
+          .map((invoice) => {
+            const change = pending.get(invoice.InvoiceId);
+            if (!change) return invoice;
+            pending.delete(invoice.InvoiceId);
+            if (change.Op === 'remove') return null;
+            return {
+              ...invoice,
+              ...change.invoice,
+              InvoiceData: { ...invoice.InvoiceData, ...change.invoice.InvoiceData }
+            };
+          })
+          .filter((invoice) => invoice && matches(invoice));
+        const added = [...pending.values()]
+          .filter((change) => change.Op !== 'remove' && matches(change.invoice))
+          .map((change) => change.invoice);
+        return [...added, ...kept];
+      });
+    } catch (err) {
+      console.error('Error polling invoice changes:', err);
+    }
+  }, [filter, loadInvoices]);
+
   useEffect(() => {
     loadInvoices();
   }, [loadInvoices]);
 
+  useEffect(() => {
+    const interval = setInterval(applyChanges, 30000); // Poll for changes every 30 seconds
+    return () => clearInterval(interval);
+  }, [applyChanges]);
+
   const handleViewInvoice = async (invoiceId) => {
     try {
       const invoice = await apiService.getInvoice(invoiceId);
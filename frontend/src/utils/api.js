@@ -81,6 +81,17 @@ class ApiService {
     }
   }
 
+  // Get invoices changed since a cursor from the change feed
+  async getInvoiceChanges(since) {
+    const headers = await this.getAuthHeaders();
+    const queryParams = new URLSearchParams();
+
+    if (since) queryParams.append('since', since);
+
+    const response = await axios.get(`${this.baseURL}/invoices/changes?${queryParams}`, { headers });
+    return response.data;
+  }
+
   // Get specific invoice details
   async getInvoice(invoiceId) {
     try {
@@ -0,0 +1,97 @@
+import boto3
+import os
+from datetime import datetime, timedelta
+from boto3.dynamodb.types import TypeDeserializer
+
+dynamodb = boto3.resource('dynamodb')
+cloudwatch = boto3.client('cloudwatch')
+deserializer = TypeDeserializer()
+
+# All invoice changes share one partition so a cursor is a single sort-key position
+CHANGE_FEED = 'invoices'
+# Feed entries expire after this; older cursors get reset=true from GET /invoices/changes
+CHANGE_RETENTION_HOURS = int(os.environ.get('CHANGE_RETENTION_HOURS', '24'))
+# What the invoice list shows; a MODIFY that leaves all of these alone (e.g. a
+# TimingSummary or cache write) is not a change for pollers
+SUMMARY_FIELDS = ('invoice_number', 'customer_name', 'total_amount', 'currency', 'country')
+
+def handler(event, context):
+    """Append the compact form of each changed invoice from a DynamoDB Streams batch to the change feed"""
+    try:
+        changes_table = dynamodb.Table(os.environ['CHANGES_TABLE'])
+        # One timestamp per batch plus the record's position keeps stream order within a shard
+        stamp = datetime.utcnow().isoformat(timespec='microseconds')
+        expires = int((datetime.utcnow() + timedelta(hours=CHANGE_RETENTION_HOURS)).timestamp())
+
+        appended = 0
+        with changes_table.batch_writer() as batch:
+            for position, record in enumerate(event.get('Records', [])):
+                change = change_entry(record)
+                if change is None:
+                    continue
+                batch.put_item(Item={
+                    'Feed': CHANGE_FEED,
+                    'Seq': f"{stamp}#{position:05d}#{record['eventID'][:8]}",
+                    **change,
+                    'TTL': expires
+                })
+                appended += 1
+
+        print(f"Appended {appended} of {len(event.get('Records', []))} stream records to the change feed")
+        put_feed_metric(appended)
+        return {"appended": appended}
+
+    except Exception as e:
+        # Raising makes Lambda retry the batch; readers collapse the duplicates by InvoiceId
+        print(f"Error in change feed: {str(e)}")
+        raise e
+
+def image(record, name):
+    raw = record['dynamodb'].get(name)
+    if not raw:
+        return None
+    return {key: deserializer.deserialize(value) for key, value in raw.items()}
+
+def compact(item):
+    """The invoice as the list renders it, without payloads, results or timings"""
+    invoice_data = item.get('InvoiceData') or {}
+    return {
+        'InvoiceId': item['InvoiceId'],
+        'Status': item.get('Status'),
+        'CreatedAt': item.get('CreatedAt'),
+        'UpdatedAt': item.get('UpdatedAt'),
+        'CustomerId': item.get('CustomerId'),
+        'PDFLocation': item.get('PDFLocation'),
+        'InvoiceData': {name: invoice_data.get(name) for name in SUMMARY_FIELDS if name in invoice_data}
+    }
+
+def change_entry(record):
+    """Feed attributes for one stream record, or None when nothing a poller shows changed"""
+    if record.get('eventSource') != 'aws:dynamodb':
+        return None
+    if record['eventName'] == 'REMOVE':
+        # Deleted or moved to the archive; pollers drop it from their live list
+        keys = image(record, 'Keys')
+        return {'InvoiceId': keys['InvoiceId'], 'Op': 'remove'}
+
+    new = compact(image(record, 'NewImage'))
+    old = image(record, 'OldImage')
+    if old is not None and compact(old) == new:
+        return None
+    return {'InvoiceId': new['InvoiceId'], 'Op': 'upsert', 'Invoice': new}
+
+def put_feed_metric(appended):
+    try:
+        cloudwatch.put_metric_data(
+            Namespace='GlobalInvoiceAI',
+            MetricData=[{
+                'MetricName': 'ChangeFeedAppended',
+                'Value': appended,
+                'Unit': 'Count',
+                'Dimensions': [
+                    {'Name': 'Environment', 'Value': os.environ.get('ENVIRONMENT', 'dev')}
+                ]
+            }]
+        )
+    except Exception as e:
+        print(f"Failed to publish change feed metric: {e}")
@@ -0,0 +1,308 @@
+import json
+import boto3
+import os
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from payload_store import PAYLOAD_ATTRIBUTES, hydrate, json_default, ref_attribute
+from tracing import span, start_trace
+
+dynamodb = boto3.resource('dynamodb')
+s3_client = boto3.client('s3')
+cloudwatch = boto3.client('cloudwatch')
+
+# Invoices created longer ago than this move from DynamoDB to the Parquet archive
+ARCHIVE_RETENTION_DAYS = int(os.environ.get('ARCHIVE_RETENTION_DAYS', '365'))
+ARCHIVE_PREFIX = os.environ.get('ARCHIVE_PREFIX', 'cold/invoices')
+# Items archived per write/delete round; bounds memory and the work lost to a timeout
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '5000'))
+# Smaller row groups let queries skip more data; larger ones compress better
+ARCHIVE_ROW_GROUP_SIZE = int(os.environ.get('ARCHIVE_ROW_GROUP_SIZE', '10000'))
+# Stop starting new rounds with this much Lambda time left; the next run continues
+ARCHIVE_TIME_MARGIN_SECONDS = 120
+ARCHIVE_STATS_FILE = '_stats.json'
+
+# Summary columns are typed for predicate pushdown; full payloads are kept as JSON
+ARCHIVE_SCHEMA = pa.schema([
+    ('invoice_id', pa.string()),
+    ('customer_id', pa.string()),
+    ('invoice_number', pa.string()),
+    ('invoice_date', pa.string()),
+    ('customer_name', pa.string()),
+    ('country', pa.string()),
+    ('currency', pa.string()),
+    ('total_amount', pa.float64()),
+    ('tax_amount', pa.float64()),
+    ('created_at', pa.string()),
+    ('updated_at', pa.string()),
+    ('original_file_key', pa.string()),
+    ('pdf_location', pa.string()),
+    ('invoice_data', pa.string()),
+    ('validation_result', pa.string()),
+    ('archived_at', pa.string()),
+])
+# Hive-style directories: <prefix>/created_date=YYYY-MM-DD/status=VALIDATED/part-*.parquet
+PARTITIONING = ds.partitioning(pa.schema([('created_date', pa.string()), ('status', pa.string())]), flavor='hive')
+
+# Everything but the JSON payloads, which only detail lookups need
+DEFAULT_QUERY_COLUMNS = [name for name in ARCHIVE_SCHEMA.names if name not in ('invoice_data', 'validation_result')] \
+    + ['created_date', 'status']
+
+def handler(event, context):
+    """Archive aged invoices (scheduled) or query the archive (direct invocation with mode=query)"""
+    try:
+        if event.get('mode') == 'query':
+            rows = query_archive(
+                start_date=event.get('startDate'),
+                end_date=event.get('endDate'),
+                statuses=event.get('statuses'),
+                customer_id=event.get('customerId'),
+                invoice_id=event.get('invoiceId'),
+                columns=event.get('columns'),
+                limit=event.get('limit')
+            )
+            return {"rows": rows, "count": len(rows)}
+
+        return archive_invoices(int(event.get('retentionDays', ARCHIVE_RETENTION_DAYS)), context)
+
+    except Exception as e:
+        print(f"Error in invoice archiver: {str(e)}")
+        raise e
+
+def archive_root():
+    """(filesystem, base path) of the archive; ARCHIVE_URI (s3:// or file://) overrides the processed bucket"""
+    uri = os.environ.get('ARCHIVE_URI') or f"s3://{os.environ['PROCESSED_BUCKET']}/{ARCHIVE_PREFIX}"
+    return pafs.FileSystem.from_uri(uri)
+
+def archive_invoices(retention_days, context=None):
+    """Move invoices created before the retention cutoff into Parquet, then delete them from DynamoDB"""
+    run_id = datetime.utcnow().strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:8]
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).isoformat()
+    invoices_table = dynamodb.Table(os.environ['INVOICES_TABLE'])
+    filesystem, base = archive_root()
+
+    totals = Counter()
+    with start_trace(run_id, 'archiver'):
+        scan_params = {'FilterExpression': Attr('CreatedAt').lt(cutoff)}
+        batch = []
+        complete = False
+        while True:
+            with span('scan'):
+                response = invoices_table.scan(**scan_params)
+            batch.extend(response.get('Items', []))
+            complete = 'LastEvaluatedKey' not in response
+            if not complete:
+                scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+            stopping = complete or out_of_time(context)
+            if batch and (len(batch) >= ARCHIVE_BATCH_SIZE or stopping):
+                totals.update(archive_batch(invoices_table, filesystem, base, batch, run_id))
+                batch = []
+            if stopping:
+                break
+
+        update_archive_stats(filesystem, base, totals)
+
+    put_archive_metric(totals['archived'])
+    result = {
+        "runId": run_id,
+        "cutoff": cutoff,
+        "archived": totals['archived'],
+        "changed": totals['changed'],
+        "complete": complete,
+        "byStatus": {status[len('status:'):]: count for status, count in totals.items() if status.startswith('status:')}
+    }
+    print(f"Archive run: {json.dumps(result)}")
+    return result
+
+def out_of_time(context):
+    return context is not None and context.get_remaining_time_in_millis() / 1000 < ARCHIVE_TIME_MARGIN_SECONDS
+
+def archive_batch(invoices_table, filesystem, base, items, run_id):
+    """Write one Parquet file per (created_date, status) and delete the items that were written"""
+    archived_at = datetime.utcnow().isoformat()
+    partitions = defaultdict(list)
+    with span('hydrate', items=len(items)):
+        for item in items:
+            partitions[(item['CreatedAt'][:10], item.get('Status', 'UNKNOWN'))].append(
+                (item, archive_row(item, archived_at))
+            )
+
+    counts = Counter()
+    for (created_date, status), entries in sorted(partitions.items()):
+        table = pa.Table.from_pylist([row for _, row in entries], schema=ARCHIVE_SCHEMA)
+        # Sorted so row-group statistics on customer_id / invoice_id prune well
+        table = table.sort_by([('customer_id', 'ascending'), ('invoice_id', 'ascending')])
+        directory = f"{base}/created_date={created_date}/status={status}"
+        if isinstance(filesystem, pafs.LocalFileSystem):
+            filesystem.create_dir(directory, recursive=True)
+        with span('write', rows=table.num_rows):
+            pq.write_table(table, f"{directory}/part-{run_id}.parquet", filesystem=filesystem,
+                           compression='zstd', row_group_size=ARCHIVE_ROW_GROUP_SIZE)
+
+        with span('delete', rows=table.num_rows):
+            for item, _ in entries:
+                if delete_archived(invoices_table, item):
+                    counts['archived'] += 1
+                    counts[f"status:{status}"] += 1
+                else:
+                    counts['changed'] += 1
+    return counts
+
+def archive_row(item, archived_at):
+    """Flatten an invoice item, with offloaded payloads fetched, into an archive row"""
+    item = hydrate(item)
+    invoice_data = item.get('InvoiceData') or {}
+    return {
+        'invoice_id': item['InvoiceId'],
+        'customer_id': _string(item.get('CustomerId') or invoice_data.get('customer_id')),
+        'invoice_number': _string(invoice_data.get('invoice_number')),
+        'invoice_date': _string(invoice_data.get('invoice_date')),
+        'customer_name': _string(invoice_data.get('customer_name')),
+        'country': _string(invoice_data.get('country')),
+        'currency': _string(invoice_data.get('currency')),
+        'total_amount': _number(invoice_data.get('total_amount')),
+        'tax_amount': _number(invoice_data.get('tax_amount')),
+        'created_at': item['CreatedAt'],
+        'updated_at': _string(item.get('UpdatedAt')),
+        'original_file_key': _string(item.get('OriginalFileKey')),
+        'pdf_location': _string(item.get('PDFLocation')),
+        'invoice_data': json.dumps(item.get('InvoiceData'), default=json_default),
+        'validation_result': json.dumps(item.get('ValidationResult'), default=json_default),
+        'archived_at': archived_at
+    }
+
+def _string(value):
+    return None if value is None else str(value)
+
+def _number(value):
+    try:
+        return None if value is None else float(value)
+    except (TypeError, ValueError):
+        return None
+
+def delete_archived(invoices_table, item):
+    """Delete an archived item unless it changed since it was read; returns whether it was deleted"""
+    try:
+        if item.get('UpdatedAt') is not None:
+            invoices_table.delete_item(
+                Key={'InvoiceId': item['InvoiceId']},
+                ConditionExpression='UpdatedAt = :updated',
+                ExpressionAttributeValues={':updated': item['UpdatedAt']}
+            )
+        else:
+            invoices_table.delete_item(
+                Key={'InvoiceId': item['InvoiceId']},
+                ConditionExpression='attribute_not_exists(UpdatedAt)'
+            )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # Updated mid-run: it stays live and is archived again by a later run; queries keep the newest copy
+        print(f"Invoice {item['InvoiceId']} changed while archiving; keeping it in DynamoDB")
+        return False
+
+    # The archive row holds the full payloads, so the offloaded copies can go
+    for attribute in PAYLOAD_ATTRIBUTES:
+        ref = item.get(ref_attribute(attribute))
+        if ref:
+            try:
+                s3_client.delete_object(Bucket=ref['Bucket'], Key=ref['Key'])
+            except Exception as e:
+                print(f"Failed to delete offloaded {attribute} for {item['InvoiceId']}: {e}")
+    return True
+
+def update_archive_stats(filesystem, base, totals):
+    """Keep running per-status counts next to the archive for get_invoice_stats"""
+    path = f"{base}/{ARCHIVE_STATS_FILE}"
+    try:
+        with filesystem.open_input_stream(path) as f:
+            stats = json.loads(f.read())
+    except FileNotFoundError:
+        stats = {"total": 0, "by_status": {}}
+    if not totals['archived']:
+        return stats
+
+    stats['total'] += totals['archived']
+    for key, count in totals.items():
+        if key.startswith('status:'):
+            status = key[len('status:'):]
+            stats['by_status'][status] = stats['by_status'].get(status, 0) + count
+    stats['updated_at'] = datetime.utcnow().isoformat()
+    with filesystem.open_output_stream(path) as f:
+        f.write(json.dumps(stats).encode('utf-8'))
+    return stats
+
+def put_archive_metric(archived):
+    try:
+        cloudwatch.put_metric_data(
+            Namespace='GlobalInvoiceAI',
+            MetricData=[{
+                'MetricName': 'InvoicesArchived',
+                'Value': archived,
+                'Unit': 'Count',
+                'Dimensions': [
+                    {'Name': 'Environment', 'Value': os.environ.get('ENVIRONMENT', 'dev')}
+                ]
+            }]
+        )
+    except Exception as e:
+        print(f"Failed to publish archive metric: {e}")
+
+def query_archive(start_date=None, end_date=None, statuses=None, customer_id=None, invoice_id=None,
+                  columns=None, limit=None, root=None):
+    """Archived rows matching the filters, newest copy per invoice.
+
+    Date and status filters prune whole partitions before any file is opened;
+    customer and invoice filters are pushed into the Parquet scan, which skips
+    row groups by their statistics; and only the requested columns are read.
+    Dates are YYYY-MM-DD and compared against the invoice's CreatedAt date.
+    """
+    filesystem, base = root or archive_root()
+    try:
+        dataset = ds.dataset(base, filesystem=filesystem, format='parquet', partitioning=PARTITIONING)
+    except FileNotFoundError:
+        return []
+
+    expression = None
+    for condition in (
+        ds.field('created_date') >= start_date if start_date else None,
+        ds.field('created_date') <= end_date if end_date else None,
+        ds.field('status').isin(list(statuses)) if statuses else None,
+        ds.field('customer_id') == str(customer_id) if customer_id else None,
+        ds.field('invoice_id') == str(invoice_id) if invoice_id else None,
+    ):
+        if condition is not None:
+            expression = condition if expression is None else expression & condition
+
+    if limit:
+        # Copies of one invoice can sit in different files, so the limit applies to distinct
+        # invoices: pick them from the two key columns, then read full rows for those only
+        keys = dataset.to_table(columns=['invoice_id', 'updated_at'], filter=expression)
+        invoice_ids = list(newest_copies(keys.to_pylist()))[:int(limit)]
+        if not invoice_ids:
+            return []
+        selected = ds.field('invoice_id').isin(invoice_ids)
+        expression = selected if expression is None else expression & selected
+
+    # invoice_id and updated_at are needed to drop copies left by mid-run updates
+    requested = list(columns or DEFAULT_QUERY_COLUMNS)
+    read_columns = requested + [name for name in ('invoice_id', 'updated_at') if name not in requested]
+    table = dataset.to_table(columns=read_columns, filter=expression)
+    return [{name: row[name] for name in requested} for row in newest_copies(table.to_pylist()).values()]
+
+def newest_copies(rows):
+    """{invoice_id: row} keeping the row with the latest updated_at per invoice, in first-seen order"""
+    newest = {}
+    for row in rows:
+        current = newest.get(row['invoice_id'])
+        if current is None or (row['updated_at'] or '') > (current['updated_at'] or ''):
+            newest[row['invoice_id']] = row
+    return newest
@@ -1,15 +1,47 @@
 import json
 import boto3
 import os
+import time
 import uuid
 from datetime import datetime, timedelta
+from decimal import Decimal
 import base64
+from boto3.dynamodb.conditions import Key
+
+from invoice_schema import compile_schema, validate_invoice
+from payload_store import hydrate, json_default, offload_attributes, offload_update
+from profiling import profiled
+from tracing import span, start_trace
 
 s3_client = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
 cloudwatch = boto3.client('cloudwatch')
 ssm = boto3.client('ssm')
 
+# PUT /config payload; keys the UI doesn't send yet are optional
+CONFIG_SCHEMA = {
+    "autoApprovalThreshold": {"type": "number", "required": True, "min": 0},
+    "enabledCountries": {"type": "list", "required": True, "items": {"type": "code", "length": 2}},
+    "maxProcessingTime": {"type": "integer", "required": True, "min": 1},
+    "enablePDFGeneration": {"type": "boolean"},
+    "enableEmailNotifications": {"type": "boolean"},
+    "emailRecipients": {"type": "string", "max_length": 1024},
+    "retryFailedInvoices": {"type": "boolean"},
+    "maxRetries": {"type": "integer", "min": 0},
+    "supportedCurrencies": {"type": "list", "items": {"type": "code", "length": 3}},
+    "taxRegions": {"type": "list", "items": {"type": "code", "length": 2}},
+    "maxFileSize": {"type": "string", "max_length": 32},
+    "profileMode": {"type": "string", "enum": ["off", "cpu", "memory"]},
+    "profileSampleRate": {"type": "number", "min": 0, "max": 1},
+}
+validate_config = compile_schema(CONFIG_SCHEMA)
+
+# Invoices the runtime throttles are re-sent after its retry_after hint, capped so
+# the retries fit in the function timeout; ones still throttled are left THROTTLED
+AGENT_THROTTLE_RETRIES = int(os.environ.get('AGENT_THROTTLE_RETRIES', '2'))
+AGENT_THROTTLE_MAX_WAIT_SECONDS = 30
+
+@profiled('invoice-trigger')
 def handler(event, context):
     """Process S3 upload events and API Gateway requests"""
     try:
@@ -22,107 +54,153 @@ def handler(event, context):
             bucket_name = record['s3']['bucket']['name']
             object_key = record['s3']['object']['key']
 
-            print(f"Processing invoice: s3://{bucket_name}/{object_key}")
+            process_s3_object(bucket_name, object_key)
 
-            # Read invoice file from S3
-            response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
-            invoice_content = response['Body'].read().decode('utf-8')
+    except Exception as e:
+        print(f"Error processing invoice: {str(e)}")
+        # Log error to DynamoDB
+        logs_table = dynamodb.Table(os.environ['LOGS_TABLE'])
+        logs_table.put_item(Item={
+            'LogId': str(uuid.uuid4()),
+            'Timestamp': datetime.utcnow().isoformat(),
+            'Level': 'ERROR',
+            'Message': str(e),
+            'Source': 'InvoiceTriggerFunction'
+        })
 
-            try:
-                invoice_data = json.loads(invoice_content)
-            except json.JSONDecodeError:
-                # Try CSV format (simplified parsing)
-                import csv
-                import io
-                csv_reader = csv.DictReader(io.StringIO(invoice_content))
-                invoice_data = next(csv_reader)
+        # Send error metric
+        cloudwatch.put_metric_data(
+            Namespace='GlobalInvoiceAI',
+            MetricData=[{
+                'MetricName': 'ProcessingError',
+                'Value': 1,
+                'Unit': 'Count'
+            }]
+        )
 
-            # Generate invoice ID
-            invoice_id = str(uuid.uuid4())
+        raise e
 
-            # Store initial record in DynamoDB
-            invoices_table = dynamodb.Table(os.environ['INVOICES_TABLE'])
-            invoices_table.put_item(Item={
-                'InvoiceId': invoice_id,
-                'Status': 'PROCESSING',
-                'OriginalFileKey': object_key,
-                'InvoiceData': invoice_data,
-                'CreatedAt': datetime.utcnow().isoformat(),
-                'UpdatedAt': datetime.utcnow().isoformat()
-            })
+    return {"statusCode": 200, "body": "Processing complete"}
 
-            # Try to invoke AgentCore Runtime for validation (optional for testing)
-            try:
-                # Get AgentCore Runtime ARN from Parameter Store
-                runtime_param = ssm.get_parameter(
-                    Name=os.environ['AGENTCORE_RUNTIME_PARAM']
-                )
-                runtime_arn = runtime_param['Parameter']['Value']
-
-                # Invoke AgentCore Runtime
-                agentcore = boto3.client('bedrock-agentcore-runtime')
-                response = agentcore.invoke_agent(
-                    agentArn=runtime_arn,
-                    runtimeEndpoint='DEFAULT',
-                    prompt={
-                        "invoice_data": invoice_data,
-                        "operation": "validate",
-                        "invoice_id": invoice_id
-                    }
-                )
+def process_s3_object(bucket_name, object_key):
+    """Ingest one uploaded file, validate its invoices through AgentCore and record the outcome.
 
-                # Process streaming response
-                full_response = ""
-                for event in response.get('completion', []):
-                    if 'chunk' in event:
-                        full_response += event['chunk']['bytes'].decode('utf-8')
-
-                # Parse and store result
-                result = json.loads(full_response)
-                invoices_table.update_item(
-                    Key={'InvoiceId': invoice_id},
-                    UpdateExpression='SET #status = :status, ValidationResult = :result, UpdatedAt = :updated',
-                    ExpressionAttributeNames={'#status': 'Status'},
-                    ExpressionAttributeValues={
-                        ':status': result.get('status', 'VALIDATED'),
-                        ':result': result,
-                        ':updated': datetime.utcnow().isoformat()
-                    }
-                )
+    The file is traced under its InvoiceId (or its key when it holds several invoices);
+    trigger and agent timings are stored on each invoice as TimingSummary.
+    """
+    with start_trace(object_key, 'trigger') as trace:
+        print(f"Processing invoice: s3://{bucket_name}/{object_key}")
 
-            except ssm.exceptions.ParameterNotFound:
-                print("AgentCore Runtime not deployed yet - skipping validation for S3 upload")
-                # Update status to indicate manual review needed
-                invoices_table.update_item(
-                    Key={'InvoiceId': invoice_id},
-                    UpdateExpression='SET #status = :status, UpdatedAt = :updated',
-                    ExpressionAttributeNames={'#status': 'Status'},
-                    ExpressionAttributeValues={
-                        ':status': 'NEEDS_REVIEW',
-                        ':updated': datetime.utcnow().isoformat()
-                    }
-                )
-            except Exception as e:
-                print(f"AgentCore validation failed: {str(e)} - invoice uploaded but needs manual review")
-                # Update status to indicate manual review needed
-                invoices_table.update_item(
-                    Key={'InvoiceId': invoice_id},
-                    UpdateExpression='SET #status = :status, ValidationResult = :result, UpdatedAt = :updated',
-                    ExpressionAttributeNames={'#status': 'Status'},
-                    ExpressionAttributeValues={
-                        ':status': 'VALIDATION_FAILED',
-                        ':result': {'error': str(e)},
-                        ':updated': datetime.utcnow().isoformat()
-                    }
+        # Read invoice file from S3
+        with span('s3_read'):
+            response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
+            invoice_content = response['Body'].read().decode('utf-8')
+
+        # A file may hold one invoice or many (JSON array / CSV rows)
+        with span('parse'):
+            parsed = parse_invoice_file(invoice_content)
+        # Malformed invoices are logged and dropped before anything is written
+        with span('validate', invoices=len(parsed)):
+            parsed = accept_valid_invoices(parsed, object_key)
+        if not parsed:
+            print(f"No valid invoices in {object_key}")
+            return
+        invoices_table = dynamodb.Table(os.environ['INVOICES_TABLE'])
+        entries = []
+        with span('ingest', invoices=len(parsed)):
+            for invoice_data in parsed:
+                invoice_id = str(uuid.uuid4())
+                invoices_table.put_item(Item={
+                    'InvoiceId': invoice_id,
+                    'Status': 'PROCESSING',
+                    'OriginalFileKey': object_key,
+                    **customer_attributes(invoice_data),
+                    **offload_attributes(invoice_id, 'InvoiceData', to_dynamodb(invoice_data)),
+                    # Each stage sets its own entry; see set_invoice_status and tracing.store_summary
+                    'TimingSummary': {},
+                    'CreatedAt': datetime.utcnow().isoformat(),
+                    'UpdatedAt': datetime.utcnow().isoformat()
+                })
+                entries.append((invoice_id, invoice_data))
+        if len(entries) == 1:
+            trace.trace_id = entries[0][0]
+        started = datetime.utcnow()
+        pending = {invoice_id for invoice_id, _ in entries}
+
+        def timing(agent_timing=None):
+            summary = {'trigger': trace.summary()}
+            if agent_timing:
+                summary['agent'] = agent_timing
+            return summary
+
+        # Try to invoke AgentCore Runtime for validation (optional for testing)
+        try:
+            # Get AgentCore Runtime ARN from Parameter Store
+            with span('ssm_lookup'):
+                runtime_param = ssm.get_parameter(
+                    Name=os.environ['AGENTCORE_RUNTIME_PARAM']
                 )
+            runtime_arn = runtime_param['Parameter']['Value']
+
+            # Invoke AgentCore Runtime; invoices it throttles are sent again after its retry_after
+            agentcore = boto3.client('bedrock-agentcore-runtime')
+            throttled = {}
+            for attempt in range(AGENT_THROTTLE_RETRIES + 1):
+                if attempt:
+                    wait = min(max(throttle_wait(event) for event in throttled.values()),
+                               AGENT_THROTTLE_MAX_WAIT_SECONDS)
+                    print(f"AgentCore throttled {len(throttled)} invoices - retrying in {wait:.1f}s")
+                    time.sleep(wait)
+                throttled = {}
+                batch = [(invoice_id, invoice_data) for invoice_id, invoice_data in entries if invoice_id in pending]
+                with span('agent', invoices=len(batch), attempt=attempt + 1):
+                    for invoice_id, event in agent_results(agentcore, runtime_arn, batch):
+                        if invoice_id not in pending:
+                            continue
+                        if event.get('status') == 'throttled':
+                            throttled[invoice_id] = event
+                            continue
+                        if event.get('status') == 'success':
+                            result = json.loads(event['response'])
+                            set_invoice_status(invoices_table, invoice_id, result.get('status', 'VALIDATED'),
+                                               result, timing(event.get('timing')))
+                        else:
+                            set_invoice_status(invoices_table, invoice_id, 'VALIDATION_FAILED',
+                                               {'error': event.get('error', 'Unknown error')},
+                                               timing(event.get('timing')))
+                        pending.discard(invoice_id)
+                if not throttled:
+                    break
+
+            # Not a validation outcome: the invoice is fine, the runtime was saturated
+            for invoice_id, event in throttled.items():
+                set_invoice_status(invoices_table, invoice_id, 'THROTTLED',
+                                   {'error': event.get('error', 'AgentCore throttled'),
+                                    'retry_after': throttle_wait(event)}, timing(event.get('timing')))
+                pending.discard(invoice_id)
+
+            if pending:
+                raise RuntimeError(f"No result for {len(pending)} invoices")
 
-            # Send CloudWatch metrics
+        except ssm.exceptions.ParameterNotFound:
+            print("AgentCore Runtime not deployed yet - skipping validation for S3 upload")
+            # Update status to indicate manual review needed
+            for invoice_id in pending:
+                set_invoice_status(invoices_table, invoice_id, 'NEEDS_REVIEW', timing=timing())
+        except Exception as e:
+            print(f"AgentCore validation failed: {str(e)} - invoice uploaded but needs manual review")
+            # Update status to indicate manual review needed
+            for invoice_id in pending:
+                set_invoice_status(invoices_table, invoice_id, 'VALIDATION_FAILED', {'error': str(e)}, timing())
+
+        # Send CloudWatch metrics
+        with span('metrics'):
             cloudwatch.put_metric_data(
                 Namespace='GlobalInvoiceAI',
                 MetricData=[
                     {
                         'MetricName': 'InvoiceProcessed',
-                        'Value': 1,
+                        'Value': len(entries),
                         'Unit': 'Count',
                         'Dimensions': [
                             {'Name': 'Environment', 'Value': os.environ['ENVIRONMENT']}
@@ -130,9 +208,7 @@ def handler(event, context):
                     },
                     {
                         'MetricName': 'ProcessingTime',
-                        'Value': (datetime.utcnow() - datetime.fromisoformat(
-                            invoices_table.get_item(Key={'InvoiceId': invoice_id})['Item']['CreatedAt']
-                        )).total_seconds(),
+                        'Value': (datetime.utcnow() - started).total_seconds(),
                         'Unit': 'Seconds',
                         'Dimensions': [
                             {'Name': 'Environment', 'Value': os.environ['ENVIRONMENT']}
@@ -141,33 +217,162 @@ def handler(event, context):
                 ]
             )
 
-            print(f"Successfully processed invoice {invoice_id}")
+        print(f"Successfully processed {len(entries)} invoices from {object_key}")
 
-    except Exception as e:
-        print(f"Error processing invoice: {str(e)}")
-        # Log error to DynamoDB
+def parse_invoice_file(invoice_content):
+    """Return the invoices in an uploaded file: a JSON object, a JSON array or CSV rows"""
+    try:
+        invoice_data = json.loads(invoice_content)
+    except json.JSONDecodeError:
+        # Try CSV format (simplified parsing, one invoice per row)
+        import csv
+        import io
+        return list(csv.DictReader(io.StringIO(invoice_content)))
+    return invoice_data if isinstance(invoice_data, list) else [invoice_data]
+
+def accept_valid_invoices(invoices, object_key):
+    """Normalized invoices that pass the schema; each rejected one is logged with its errors"""
+    accepted = []
+    rejected = 0
+    for index, invoice_data in enumerate(invoices):
+        normalized, errors = validate_invoice(invoice_data)
+        if not errors:
+            accepted.append(normalized)
+            continue
+        rejected += 1
+        print(f"Rejected invoice {index} in {object_key}: {'; '.join(errors)}")
         logs_table = dynamodb.Table(os.environ['LOGS_TABLE'])
         logs_table.put_item(Item={
             'LogId': str(uuid.uuid4()),
             'Timestamp': datetime.utcnow().isoformat(),
             'Level': 'ERROR',
-            'Message': str(e),
-            'Source': 'InvoiceTriggerFunction'
+            'Message': f"Rejected malformed invoice {index} in {object_key}",
+            'Source': 'InvoiceTriggerFunction',
+            'Details': {'file': object_key, 'index': index, 'errors': errors}
         })
 
-        # Send error metric
+    if rejected:
         cloudwatch.put_metric_data(
             Namespace='GlobalInvoiceAI',
             MetricData=[{
-                'MetricName': 'ProcessingError',
-                'Value': 1,
-                'Unit': 'Count'
+                'MetricName': 'InvoiceRejected',
+                'Value': rejected,
+                'Unit': 'Count',
+                'Dimensions': [
+                    {'Name': 'Environment', 'Value': os.environ['ENVIRONMENT']}
+                ]
             }]
         )
-
-        raise e
-
-    return {"statusCode": 200, "body": "Processing complete"}
+    return accepted
+
+def iter_agent_events(completion):
+    """Yield JSON events from a streamed runtime response, one per line.
+
+    Lines may be bare JSON (NDJSON) or SSE 'data: ' frames; events can span chunks.
+    """
+    buffer = ""
+    for event in completion:
+        if 'chunk' not in event:
+            continue
+        buffer += event['chunk']['bytes'].decode('utf-8')
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            line = line.strip()
+            if line.startswith('data:'):
+                line = line[len('data:'):].strip()
+            if line:
+                yield json.loads(line)
+    buffer = buffer.strip()
+    if buffer.startswith('data:'):
+        buffer = buffer[len('data:'):].strip()
+    if buffer:
+        yield json.loads(buffer)
+
+def customer_attributes(invoice_data):
+    """Top-level CustomerId for the CustomerIndex GSI; absent when the invoice has no customer_id"""
+    customer_id = invoice_data.get('customer_id')
+    return {'CustomerId': customer_id} if customer_id else {}
+
+def agent_results(agentcore, runtime_arn, batch):
+    """Yield (invoice_id, final event) for each of batch's [(invoice_id, invoice_data)] from one runtime call.
+
+    One invoice goes as a validate call, which streams the model's answer text and then
+    a final {"status": ...} event carrying the parsed-out response and the agent's timing.
+    Several go as one validate_batch call; the runtime validates them concurrently and
+    streams one final event per invoice, tagged with its invoice_id, as each finishes.
+    """
+    if len(batch) == 1:
+        invoice_id, invoice_data = batch[0]
+        prompt = {"invoice_data": invoice_data, "operation": "validate", "invoice_id": invoice_id,
+                  "trace_id": invoice_id}
+    else:
+        prompt = {
+            "operation": "validate_batch",
+            "invoices": [
+                {"invoice_id": invoice_id, "invoice_data": invoice_data, "trace_id": invoice_id}
+                for invoice_id, invoice_data in batch
+            ]
+        }
+    response = agentcore.invoke_agent(agentArn=runtime_arn, runtimeEndpoint='DEFAULT', prompt=prompt)
+
+    if len(batch) > 1:
+        for event in iter_agent_events(response.get('completion', [])):
+            if isinstance(event, dict):
+                yield event.get('invoice_id'), event
+        return
+
+    # Text chunks are the answer as it streams; errors before the final event are warnings
+    final = None
+    errors = []
+    for event in iter_agent_events(response.get('completion', [])):
+        if not isinstance(event, dict):
+            continue
+        if 'status' in event:
+            final = event
+        elif 'error' in event:
+            errors.append(event['error'])
+    if final is None:
+        final = {"status": "error", "error": "; ".join(errors) or "No result"}
+    yield invoice_id, final
+
+def throttle_wait(event):
+    """Seconds to wait before re-sending a throttled invoice, from the runtime's retry_after"""
+    try:
+        return max(float(event.get('retry_after') or 1), 0)
+    except (TypeError, ValueError):
+        return 1.0
+
+def to_dynamodb(value):
+    """DynamoDB rejects Python floats; store them as Decimals"""
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: to_dynamodb(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_dynamodb(v) for v in value]
+    return value
+
+def set_invoice_status(invoices_table, invoice_id, status, result=None, timing=None):
+    update_expression = 'SET #status = :status, UpdatedAt = :updated'
+    values = {':status': status, ':updated': datetime.utcnow().isoformat()}
+    if result is not None:
+        # Large results go to S3; the item keeps a summary and a ValidationResultRef
+        fragment, result_values = offload_update(invoice_id, 'ValidationResult', to_dynamodb(result), ':result')
+        update_expression += f", {fragment}"
+        values.update(result_values)
+    names = {'#status': 'Status'}
+    # Only this invocation's stages are set, so entries other stages (PDF) wrote are kept
+    for index, (stage, summary) in enumerate((timing or {}).items()):
+        update_expression += f", TimingSummary.#stage{index} = :timing{index}"
+        names[f'#stage{index}'] = stage
+        values[f':timing{index}'] = to_dynamodb(summary)
+    with span('status_update'):
+        invoices_table.update_item(
+            Key={'InvoiceId': invoice_id},
+            UpdateExpression=update_expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
 
 def cors_headers():
     """Return standard CORS headers"""
@@ -194,6 +399,8 @@ def handle_api_request(event, context):
             return upload_invoice(event.get('body', '{}'))
         elif path == '/invoices/stats' and http_method == 'GET':
             return get_invoice_stats()
+        elif path == '/invoices/changes' and http_method == 'GET':
+            return get_invoice_changes(query_parameters or {})
         elif path.startswith('/invoices/') and '/pdf' in path and http_method == 'GET':
             invoice_id = path_parameters.get('invoiceId')
             return get_invoice_pdf(invoice_id)
@@ -232,6 +439,9 @@ def handle_api_request(event, context):
 def get_invoices(params):
     """Get list of invoices with optional filtering"""
     try:
+        if params.get('archived') == 'true':
+            return get_archived_invoices(params)
+
         invoices_table = dynamodb.Table(os.environ['INVOICES_TABLE'])
 
         # Build scan parameters
@@ -261,10 +471,11 @@ def get_invoices(params):
                 "Content-Type": "application/json",
                 **cors_headers()
             },
+            # Offloaded payloads stay in S3; the list shows their inline summaries
             "body": json.dumps({
                 "invoices": response.get('Items', []),
                 "total": response.get('Count', 0)
-            })
+            }, default=json_default)
         }
     except Exception as e:
         return {
@@ -276,6 +487,141 @@ def get_invoices(params):
             "body": json.dumps({"error": str(e)})
         }
 
+def get_invoice_changes(params):
+    """Invoices created, updated or removed since a cursor, read from the change feed.
+
+    Without `since` only a starting cursor is returned: take it, load the full list once,
+    then poll with the cursor from each response. Each poll reads just the feed entries
+    after the cursor. Entries from the last CHANGES_SETTLE_SECONDS are held back so a
+    slower concurrent append can't land behind a cursor already handed out. reset=true
+    means the cursor is older than the feed's retention and the list must be reloaded.
+    """
+    try:
+        now = datetime.utcnow()
+        settle = timedelta(seconds=int(os.environ.get('CHANGES_SETTLE_SECONDS', '5')))
+        retention = timedelta(hours=int(os.environ.get('CHANGE_RETENTION_HOURS', '24')))
+        horizon = f"{(now - settle).isoformat(timespec='microseconds')}#~"
+        since = params.get('since')
+        if not since:
+            return changes_response([], horizon, reset=True)
+        try:
+            since_time = datetime.fromisoformat(since.split('#')[0])
+        except ValueError:
+            return {
+                "statusCode": 400,
+                "headers": {
+                    "Content-Type": "application/json",
+                    **cors_headers()
+                },
+                "body": json.dumps({"error": "Invalid cursor"})
+            }
+        if since_time < now - retention:
+            return changes_response([], horizon, reset=True)
+
+        changes_table = dynamodb.Table(os.environ['CHANGES_TABLE'])
+        response = changes_table.query(
+            KeyConditionExpression=Key('Feed').eq('invoices') & Key('Seq').gt(since),
+            Limit=min(int(params.get('limit', 500)), 1000)
+        )
+        entries = [entry for entry in response.get('Items', []) if entry['Seq'] <= horizon]
+        has_more = 'LastEvaluatedKey' in response and len(entries) == len(response['Items'])
+        cursor = entries[-1]['Seq'] if has_more else max(since, horizon)
+
+        # Only the latest entry per invoice matters to a poller
+        latest = {}
+        for entry in entries:
+            latest.pop(entry['InvoiceId'], None)
+            latest[entry['InvoiceId']] = entry.get('Invoice') or {'InvoiceId': entry['InvoiceId']}
+            latest[entry['InvoiceId']]['Op'] = entry['Op']
+        return changes_response(list(latest.values()), cursor, has_more=has_more)
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "headers": {
+                "Content-Type": "application/json",
+                **cors_headers()
+            },
+            "body": json.dumps({"error": str(e)})
+        }
+
+def changes_response(changes, cursor, has_more=False, reset=False):
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json",
+            **cors_headers()
+        },
+        "body": json.dumps({
+            "changes": changes,
+            "cursor": cursor,
+            "hasMore": has_more,
+            "reset": reset
+        }, default=json_default)
+    }
+
+def get_archived_invoices(params):
+    """List invoices moved to the Parquet archive, queried by the archiver's partition-pruned reader"""
+    query = {
+        'mode': 'query',
+        'startDate': params.get('from'),
+        'endDate': params.get('to'),
+        'statuses': [params['status']] if 'status' in params else None,
+        'customerId': params.get('customerId'),
+        'limit': int(params.get('limit', 100))
+    }
+    archiver = boto3.client('lambda')
+    response = archiver.invoke(
+        FunctionName=os.environ.get('ARCHIVER_FUNCTION', 'globalinvoiceai-invoice-archiver-dev'),
+        InvocationType='RequestResponse',
+        Payload=json.dumps(query)
+    )
+    result = json.loads(response['Payload'].read())
+    if 'FunctionError' in response:
+        raise RuntimeError(f"Archive query failed: {result.get('errorMessage', result)}")
+
+    # Same shape as live items so the invoice list renders them unchanged
+    invoices = [{
+        'InvoiceId': row['invoice_id'],
+        'Status': row['status'],
+        'CreatedAt': row['created_at'],
+        'UpdatedAt': row['updated_at'],
+        'CustomerId': row['customer_id'],
+        'PDFLocation': row['pdf_location'],
+        'InvoiceData': {
+            'invoice_number': row['invoice_number'],
+            'invoice_date': row['invoice_date'],
+            'customer_name': row['customer_name'],
+            'country': row['country'],
+            'currency': row['currency'],
+            'total_amount': row['total_amount'],
+            'tax_amount': row['tax_amount']
+        },
+        'Archived': True
+    } for row in result['rows']]
+
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json",
+            **cors_headers()
+        },
+        "body": json.dumps({
+            "invoices": invoices,
+            "total": len(invoices)
+        })
+    }
+
+def get_archive_stats():
+    """Per-status counts of archived invoices, kept by the archiver next to the Parquet files"""
+    try:
+        response = s3_client.get_object(
+            Bucket=os.environ['PROCESSED_BUCKET'],
+            Key=f"{os.environ.get('ARCHIVE_PREFIX', 'cold/invoices')}/_stats.json"
+        )
+        return json.loads(response['Body'].read())
+    except s3_client.exceptions.NoSuchKey:
+        return {"total": 0, "by_status": {}}
+
 def upload_invoice(body):
     """Handle manual invoice upload - generate presigned URL or accept JSON data"""
     try:
@@ -312,8 +658,17 @@ def upload_invoice(body):
                 })
             }
         
-        # Otherwise, accept invoice data directly
-        invoice_data = request_data
+        # Otherwise, accept invoice data directly once it passes the schema
+        invoice_data, errors = validate_invoice(request_data)
+        if errors:
+            return {
+                "statusCode": 400,
+                "headers": {
+                    "Content-Type": "application/json",
+                    **cors_headers()
+                },
+                "body": json.dumps({"error": "Invalid invoice", "details": errors})
+            }
         invoice_id = str(uuid.uuid4())
         s3_key = f"uploads/{invoice_id}.json"
 
@@ -332,7 +687,8 @@ def upload_invoice(body):
             'InvoiceId': invoice_id,
             'Status': 'UPLOADED',
             'OriginalFileKey': s3_key,
-            'InvoiceData': invoice_data,
+            **customer_attributes(invoice_data),
+            **offload_attributes(invoice_id, 'InvoiceData', to_dynamodb(invoice_data)),
             'CreatedAt': datetime.utcnow().isoformat(),
             'UpdatedAt': datetime.utcnow().isoformat()
         })
@@ -407,7 +763,8 @@ def get_invoice(invoice_id):
                 "Content-Type": "application/json",
                 **cors_headers()
             },
-            "body": json.dumps(response['Item'])
+            # Detail view: fetch offloaded InvoiceData / ValidationResult from S3
+            "body": json.dumps(hydrate(response['Item']), default=json_default)
         }
     except Exception as e:
         return {
@@ -452,7 +809,7 @@ def get_invoice_pdf(invoice_id):
         pdf_response = pdf_generator.invoke(
             FunctionName=os.environ.get('PDF_GENERATOR_FUNCTION', 'globalinvoiceai-pdf-generator-dev'),
             InvocationType='RequestResponse',
-            Payload=json.dumps({'invoiceId': invoice_id})
+            Payload=json.dumps({'invoiceId': invoice_id, 'trace_id': invoice_id})
         )
 
         if pdf_response['StatusCode'] != 200:
@@ -476,10 +833,11 @@ def get_invoice_pdf(invoice_id):
                 "body": json.dumps({"error": "PDF generation failed"})
             }
 
-        # Get PDF from S3
+        # Get PDF from S3 - the generator reports where the (possibly cached) PDF lives
+        pdf_body = json.loads(pdf_result['body'])
         s3_response = s3_client.get_object(
             Bucket=os.environ['PROCESSED_BUCKET'],
-            Key=f"pdfs/{invoice_id}.pdf"
+            Key=pdf_body['pdfLocation']
         )
 
         pdf_content = s3_response['Body'].read()
@@ -513,9 +871,12 @@ def get_invoice_stats():
         response = invoices_table.scan()
         invoices = response.get('Items', [])
 
-        total_invoices = len(invoices)
+        # Invoices past retention live in the Parquet archive; count them from its stats file
+        archived = get_archive_stats()
+        total_invoices = len(invoices) + archived['total']
         processed_today = len([i for i in invoices if i.get('CreatedAt', '').startswith(datetime.utcnow().date().isoformat())])
-        error_rate = len([i for i in invoices if i.get('Status') == 'ERROR']) / max(total_invoices, 1) * 100
+        errors = len([i for i in invoices if i.get('Status') == 'ERROR']) + archived['by_status'].get('ERROR', 0)
+        error_rate = errors / max(total_invoices, 1) * 100
 
         # Calculate average processing time (simplified)
         avg_time = 0  # Would need to implement proper calculation
@@ -528,6 +889,7 @@ def get_invoice_stats():
             },
             "body": json.dumps({
                 "totalInvoices": total_invoices,
+                "archivedInvoices": archived['total'],
                 "processedToday": processed_today,
                 "errorRate": round(error_rate, 2),
                 "averageProcessingTime": avg_time
@@ -600,7 +962,9 @@ def get_system_config():
                 "maxRetries": 3,
                 "supportedCurrencies": ["USD", "EUR", "GBP", "INR"],
                 "taxRegions": ["US", "UK", "IN"],
-                "maxFileSize": "10MB"
+                "maxFileSize": "10MB",
+                "profileMode": "off",
+                "profileSampleRate": 0
             }
 
         return {
@@ -627,14 +991,16 @@ def update_system_config(body):
         # Parse the configuration data
         config_data = json.loads(body)
 
-        # Validate required fields (basic validation)
-        required_fields = ['autoApprovalThreshold', 'enabledCountries', 'maxProcessingTime']
-        for field in required_fields:
-            if field not in config_data:
-                return {
-                    "statusCode": 400,
-                    "body": json.dumps({"error": f"Missing required field: {field}"})
-                }
+        config_data, errors = validate_config(config_data)
+        if errors:
+            return {
+                "statusCode": 400,
+                "headers": {
+                    "Content-Type": "application/json",
+                    **cors_headers()
+                },
+                "body": json.dumps({"error": "Invalid configuration", "details": errors})
+            }
 
         # Store configuration in Parameter Store
         config_param_name = f"/globalinvoiceai/config/{os.environ['ENVIRONMENT']}"
@@ -655,7 +1021,7 @@ def update_system_config(body):
             'Level': 'INFO',
             'Message': 'System configuration updated',
             'Source': 'ConfigurationUpdate',
-            'Details': config_data
+            'Details': to_dynamodb(config_data)
         })
 
         return {
@@ -1,19 +1,44 @@
 import json
 import boto3
 import os
+import hashlib
 from datetime import datetime
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
+from pypdf import PdfReader, PdfWriter
 import io
+import zipfile
+
+from payload_store import fingerprint, hydrate
+from profiling import profiled
+from tracing import span, start_trace, store_summary
 
 s3_client = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
+cloudwatch = boto3.client('cloudwatch')
+
+# Bump when the PDF layout changes so previously rendered PDFs are regenerated
+PDF_TEMPLATE_VERSION = '1'
+
+# S3 multipart parts must be at least 5MB (except the last one)
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+
+# A statement is merged in memory before upload, so cap it well inside the 512MB
+# Lambda; larger periods should use archive mode, which streams
+MAX_STATEMENT_INVOICES = int(os.environ.get('MAX_STATEMENT_INVOICES', '500'))
 
+@profiled('pdf-generator')
 def handler(event, context):
     """Generate PDF invoice from validated invoice data"""
     try:
+        # Statement / archive bundles over many invoices (direct invocation only)
+        if event.get('mode') in ('statement', 'archive'):
+            return generate_bundle(event)
+
         # Handle API Gateway events
         if 'httpMethod' in event:
             invoice_id = event.get('pathParameters', {}).get('invoiceId')
@@ -32,140 +57,473 @@ def handler(event, context):
             # Direct Lambda invocation
             invoice_id = event['invoiceId']
 
-        # Get invoice data from DynamoDB
-        invoices_table = dynamodb.Table(os.environ['INVOICES_TABLE'])
-        response = invoices_table.get_item(Key={'InvoiceId': invoice_id})
+        # The trigger passes the InvoiceId as trace_id so this joins its trace
+        with start_trace(event.get('trace_id') or invoice_id, 'pdf') as trace:
+            # Get invoice data from DynamoDB
+            invoices_table = dynamodb.Table(os.environ['INVOICES_TABLE'])
+            with span('load_invoice'):
+                response = invoices_table.get_item(Key={'InvoiceId': invoice_id})
 
-        if 'Item' not in response:
-            return {
-                "statusCode": 404,
-                "headers": {
-                    "Content-Type": "application/json",
-                    "Access-Control-Allow-Origin": os.environ.get('AMPLIFY_DOMAIN', '*'),
-                    "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
-                    "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token"
-                },
-                "body": json.dumps({"error": "Invoice not found"})
-            }
+            if 'Item' not in response:
+                return {
+                    "statusCode": 404,
+                    "headers": {
+                        "Content-Type": "application/json",
+                        "Access-Control-Allow-Origin": os.environ.get('AMPLIFY_DOMAIN', '*'),
+                        "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
+                        "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token"
+                    },
+                    "body": json.dumps({"error": "Invoice not found"})
+                }
+
+            invoice = response['Item']
+            if invoice['Status'] != 'VALIDATED':
+                return {
+                    "statusCode": 400,
+                    "headers": {
+                        "Content-Type": "application/json",
+                        "Access-Control-Allow-Origin": os.environ.get('AMPLIFY_DOMAIN', '*'),
+                        "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
+                        "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token"
+                    },
+                    "body": json.dumps({"error": "Invoice not validated"})
+                }
+
+            pdf_key, _, cache_hit = ensure_invoice_pdf(invoices_table, invoice)
+            store_summary(invoices_table, invoice_id, 'pdf', trace.summary())
 
-        invoice = response['Item']
-        if invoice['Status'] != 'VALIDATED':
             return {
-                "statusCode": 400,
+                "statusCode": 200,
                 "headers": {
                     "Content-Type": "application/json",
                     "Access-Control-Allow-Origin": os.environ.get('AMPLIFY_DOMAIN', '*'),
                     "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
                     "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token"
                 },
-                "body": json.dumps({"error": "Invoice not validated"})
+                "body": json.dumps({
+                    "invoiceId": invoice_id,
+                    "pdfLocation": pdf_key,
+                    "bucket": os.environ['PROCESSED_BUCKET'],
+                    "cached": cache_hit
+                })
             }
 
-        # Generate PDF
-        pdf_buffer = io.BytesIO()
-        doc = SimpleDocTemplate(pdf_buffer, pagesize=A4)
-        styles = getSampleStyleSheet()
-        story = []
+    except Exception as e:
+        print(f"Error generating PDF: {str(e)}")
+        raise e
 
-        # Title
-        title = Paragraph(f"INVOICE #{invoice_id}", styles['Title'])
-        story.append(title)
-        story.append(Spacer(1, 12))
+def ensure_invoice_pdf(invoices_table, invoice):
+    """Return (pdf_key, pdf_bytes, cache_hit), rendering only when the invoice data changed.
 
-        # Invoice details table
-        invoice_data = invoice.get('InvoiceData', {})
-        details_data = [
-            ['Invoice Number', invoice_id],
-            ['Date', datetime.utcnow().strftime('%Y-%m-%d')],
-            ['Customer', invoice_data.get('customer_name', 'N/A')],
-            ['Total Amount', f"${invoice_data.get('total_amount', 0):.2f}"],
-            ['Tax Amount', f"${invoice_data.get('tax_amount', 0):.2f}"],
-            ['Currency', invoice_data.get('currency', 'USD')]
-        ]
-
-        details_table = Table(details_data, colWidths=[100, 300])
-        details_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+    pdf_bytes is None on a cache hit - the PDF is already in the processed bucket.
+    """
+    invoice_id = invoice['InvoiceId']
+
+    # Skip rendering when the stored PDF was built from identical data. Offloaded
+    # InvoiceData is compared by its payload hash, so a cache hit never fetches it.
+    content_hash = invoice_content_hash(invoice_id, fingerprint(invoice, 'InvoiceData') or {},
+                                        invoice.get('CreatedAt', ''))
+    cache_hit = bool(invoice.get('PDFLocation')) and invoice.get('PDFHash') == content_hash
+    # The bucket's lifecycle rule expires invoice PDFs, so a matching hash can point at a deleted object
+    if cache_hit and not pdf_exists(invoice['PDFLocation']):
+        print(f"Cached PDF {invoice['PDFLocation']} for invoice {invoice_id} has expired - re-rendering")
+        cache_hit = False
+    put_cache_metric(cache_hit)
+
+    if cache_hit:
+        print(f"PDF for invoice {invoice_id} is up to date - skipping render")
+        return invoice['PDFLocation'], None, True
 
-        story.append(details_table)
-        story.append(Spacer(1, 20))
-
-        # Line items (if available)
-        if 'line_items' in invoice_data:
-            items_title = Paragraph("Line Items", styles['Heading2'])
-            story.append(items_title)
-            story.append(Spacer(1, 12))
-
-            items_data = [['Description', 'Quantity', 'Unit Price', 'Total']]
-            for item in invoice_data['line_items']:
-                items_data.append([
-                    item.get('description', ''),
-                    str(item.get('quantity', 0)),
-                    f"${item.get('unit_price', 0):.2f}",
-                    f"${item.get('total', 0):.2f}"
-                ])
-
-            items_table = Table(items_data, colWidths=[200, 60, 80, 80])
-            items_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-
-            story.append(items_table)
-
-        # Build PDF
-        doc.build(story)
-
-        # Upload PDF to S3
-        pdf_key = f"invoice-{invoice_id}.pdf"
-        pdf_buffer.seek(0)
+    pdf_key = f"invoice-{invoice_id}.pdf"
+    with span('load_payload'):
+        invoice = hydrate(invoice, ('InvoiceData',))
+    with span('render'):
+        pdf_bytes = render_invoice_pdf(invoice_id, invoice)
+
+    # Upload PDF to S3
+    with span('s3_upload', bytes=len(pdf_bytes)):
         s3_client.put_object(
             Bucket=os.environ['PROCESSED_BUCKET'],
             Key=pdf_key,
-            Body=pdf_buffer.getvalue(),
+            Body=pdf_bytes,
             ContentType='application/pdf',
             Metadata={
                 'invoice-id': invoice_id,
+                'content-hash': content_hash,
                 'generated-at': datetime.utcnow().isoformat()
             }
         )
 
-        # Update invoice record with PDF location
-        invoices_table.update_item(
-            Key={'InvoiceId': invoice_id},
-            UpdateExpression='SET PDFLocation = :pdf',
-            ExpressionAttributeValues={':pdf': pdf_key}
+    # An expired PDF was re-uploaded under the key and hash already on the record
+    if invoice.get('PDFHash') == content_hash and invoice.get('PDFLocation') == pdf_key:
+        return pdf_key, pdf_bytes, False
+
+    # Update invoice record with PDF location and the hash it was rendered from.
+    # A concurrent render of the same data produces identical bytes, so losing
+    # the condition race is harmless.
+    try:
+        with span('record_update'):
+            invoices_table.update_item(
+                Key={'InvoiceId': invoice_id},
+                UpdateExpression='SET PDFLocation = :pdf, PDFHash = :hash',
+                ConditionExpression='attribute_not_exists(PDFHash) OR PDFHash <> :hash',
+                ExpressionAttributeValues={':pdf': pdf_key, ':hash': content_hash}
+            )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+    return pdf_key, pdf_bytes, False
+
+def pdf_exists(pdf_key):
+    try:
+        with span('s3_head'):
+            s3_client.head_object(Bucket=os.environ['PROCESSED_BUCKET'], Key=pdf_key)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+def invoice_content_hash(invoice_id, invoice_data, created_at=''):
+    """Return a stable SHA-256 of everything that affects the rendered PDF"""
+    canonical = json.dumps(
+        # invoice_date() falls back to the CreatedAt day when the data has no invoice_date
+        {'template': PDF_TEMPLATE_VERSION, 'invoice_id': invoice_id, 'data': invoice_data,
+         'created': created_at[:10]},
+        sort_keys=True,
+        separators=(',', ':'),
+        default=str
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def invoice_date(invoice):
+    """Date printed on the invoice - taken from the data so renders are reproducible"""
+    invoice_data = invoice.get('InvoiceData', {})
+    if invoice_data.get('invoice_date'):
+        return str(invoice_data['invoice_date'])
+    return invoice.get('CreatedAt', '')[:10] or 'N/A'
+
+def render_invoice_pdf(invoice_id, invoice):
+    """Render an invoice record to PDF bytes"""
+    pdf_buffer = io.BytesIO()
+    # invariant=1 pins the creation date and document ID so identical input gives identical bytes
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, invariant=1)
+    styles = getSampleStyleSheet()
+    story = []
+
+    # Title
+    title = Paragraph(f"INVOICE #{invoice_id}", styles['Title'])
+    story.append(title)
+    story.append(Spacer(1, 12))
+
+    # Invoice details table
+    invoice_data = invoice.get('InvoiceData', {})
+    details_data = [
+        ['Invoice Number', invoice_id],
+        ['Date', invoice_date(invoice)],
+        ['Customer', invoice_data.get('customer_name', 'N/A')],
+        ['Total Amount', f"${invoice_data.get('total_amount', 0):.2f}"],
+        ['Tax Amount', f"${invoice_data.get('tax_amount', 0):.2f}"],
+        ['Currency', invoice_data.get('currency', 'USD')]
+    ]
+
+    details_table = Table(details_data, colWidths=[100, 300])
+    details_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+
+    story.append(details_table)
+    story.append(Spacer(1, 20))
+
+    # Line items (if available)
+    if 'line_items' in invoice_data:
+        items_title = Paragraph("Line Items", styles['Heading2'])
+        story.append(items_title)
+        story.append(Spacer(1, 12))
+
+        items_data = [['Description', 'Quantity', 'Unit Price', 'Total']]
+        for item in invoice_data['line_items']:
+            items_data.append([
+                item.get('description', ''),
+                str(item.get('quantity', 0)),
+                f"${item.get('unit_price', 0):.2f}",
+                f"${item.get('total', 0):.2f}"
+            ])
+
+        items_table = Table(items_data, colWidths=[200, 60, 80, 80])
+        items_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+
+        story.append(items_table)
+
+    # Build PDF
+    doc.build(story)
+    return pdf_buffer.getvalue()
+
+def put_cache_metric(cache_hit):
+    """Record a PDF cache hit or miss; hit rate = PDFCacheHit / (PDFCacheHit + PDFCacheMiss)"""
+    try:
+        cloudwatch.put_metric_data(
+            Namespace='GlobalInvoiceAI',
+            MetricData=[{
+                'MetricName': 'PDFCacheHit' if cache_hit else 'PDFCacheMiss',
+                'Value': 1,
+                'Unit': 'Count',
+                'Dimensions': [
+                    {'Name': 'Environment', 'Value': os.environ.get('ENVIRONMENT', 'dev')}
+                ]
+            }]
         )
+    except Exception as e:
+        print(f"Failed to publish PDF cache metric: {str(e)}")
 
+def generate_bundle(event):
+    """Build a customer statement PDF or a zip archive of invoice PDFs.
+
+    Expected event: {"mode": "statement" | "archive", "customerId": optional,
+    "startDate": "YYYY-MM-DD", "endDate": "YYYY-MM-DD"}. The artifact is written
+    to the processed bucket with a multipart upload; cached invoice PDFs are reused.
+    Archives stream one PDF at a time. A statement is merged in memory before it
+    is written, so it is limited to MAX_STATEMENT_INVOICES invoices (400 above that).
+    """
+    mode = event['mode']
+    customer_id = event.get('customerId')
+    start_date = event.get('startDate', '0000-01-01')
+    end_date = event.get('endDate', '9999-12-31')
+
+    invoices_table = dynamodb.Table(os.environ['INVOICES_TABLE'])
+    invoices = query_validated_invoices(invoices_table, customer_id, start_date, end_date)
+    if not invoices:
+        return {
+            "statusCode": 404,
+            "body": json.dumps({"error": "No validated invoices found for the requested period"})
+        }
+    if mode == 'statement' and len(invoices) > MAX_STATEMENT_INVOICES:
         return {
-            "statusCode": 200,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": os.environ.get('AMPLIFY_DOMAIN', '*'),
-                "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token"
-            },
+            "statusCode": 400,
             "body": json.dumps({
-                "invoiceId": invoice_id,
-                "pdfLocation": pdf_key,
-                "bucket": os.environ['PROCESSED_BUCKET']
+                "error": f"Statement would include {len(invoices)} invoices; the limit is "
+                         f"{MAX_STATEMENT_INVOICES}. Use a shorter period or archive mode."
             })
         }
 
-    except Exception as e:
-        print(f"Error generating PDF: {str(e)}")
-        raise e
+    scope = customer_id or 'all'
+    extension = 'pdf' if mode == 'statement' else 'zip'
+    bundle_key = f"{mode}s/{scope}/{start_date}_{end_date}.{extension}"
+
+    writer = S3MultipartWriter(
+        os.environ['PROCESSED_BUCKET'],
+        bundle_key,
+        'application/pdf' if mode == 'statement' else 'application/zip'
+    )
+    reused = 0
+    try:
+        if mode == 'statement':
+            reused = write_statement(writer, invoices_table, invoices, customer_id, start_date, end_date)
+        else:
+            reused = write_archive(writer, invoices_table, invoices)
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+    print(f"Built {mode} {bundle_key} from {len(invoices)} invoices ({reused} cached PDFs reused)")
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps({
+            "mode": mode,
+            "location": bundle_key,
+            "bucket": os.environ['PROCESSED_BUCKET'],
+            "invoiceCount": len(invoices),
+            "cachedPdfs": reused
+        })
+    }
+
+def query_validated_invoices(invoices_table, customer_id, start_date, end_date):
+    """Fetch validated invoices created in [start_date, end_date], oldest first.
+
+    Customer statements read CustomerIndex, keyed on the CustomerId the trigger
+    copies from InvoiceData.customer_id; run scripts/backfill_customer_ids.py once
+    for invoices ingested before that.
+    """
+    # CreatedAt is an ISO timestamp, so extend the end bound to cover the whole day
+    created_range = Key('CreatedAt').between(start_date, f"{end_date}T99")
+
+    if customer_id:
+        query_params = {
+            'IndexName': 'CustomerIndex',
+            'KeyConditionExpression': Key('CustomerId').eq(customer_id) & created_range,
+            'FilterExpression': Attr('Status').eq('VALIDATED')
+        }
+    else:
+        query_params = {
+            'IndexName': 'StatusIndex',
+            'KeyConditionExpression': Key('Status').eq('VALIDATED') & created_range
+        }
+
+    invoices = []
+    while True:
+        response = invoices_table.query(**query_params)
+        invoices.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return invoices
+        query_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def load_invoice_pdf(invoices_table, invoice):
+    """Return (pdf_bytes, cache_hit) for an invoice, reading the cached PDF when current"""
+    pdf_key, pdf_bytes, cache_hit = ensure_invoice_pdf(invoices_table, invoice)
+    if pdf_bytes is None:
+        s3_response = s3_client.get_object(Bucket=os.environ['PROCESSED_BUCKET'], Key=pdf_key)
+        pdf_bytes = s3_response['Body'].read()
+    return pdf_bytes, cache_hit
+
+def write_statement(writer, invoices_table, invoices, customer_id, start_date, end_date):
+    """Write a cover page followed by every invoice PDF; returns the number of cached PDFs used.
+
+    pypdf needs the whole document to write its cross-reference table, so the merged
+    statement is built in memory and only the upload is chunked.
+    """
+    pdf_writer = PdfWriter()
+    cover = render_statement_cover(invoices, customer_id, start_date, end_date)
+    pdf_writer.append(PdfReader(io.BytesIO(cover)))
+
+    reused = 0
+    for invoice in invoices:
+        pdf_bytes, cache_hit = load_invoice_pdf(invoices_table, invoice)
+        reused += cache_hit
+        pdf_writer.append(PdfReader(io.BytesIO(pdf_bytes)))
+
+    pdf_writer.write(writer)
+    return reused
+
+def write_archive(writer, invoices_table, invoices):
+    """Write each invoice PDF into a zip stream; returns the number of cached PDFs used"""
+    reused = 0
+    # PDFs are already compressed, so store them as-is rather than deflating again
+    with zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for invoice in invoices:
+            pdf_bytes, cache_hit = load_invoice_pdf(invoices_table, invoice)
+            reused += cache_hit
+            archive.writestr(f"invoice-{invoice['InvoiceId']}.pdf", pdf_bytes)
+    return reused
+
+def render_statement_cover(invoices, customer_id, start_date, end_date):
+    """Render the statement cover page listing every invoice and totals per currency"""
+    pdf_buffer = io.BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, invariant=1)
+    styles = getSampleStyleSheet()
+    story = []
+
+    story.append(Paragraph("STATEMENT", styles['Title']))
+    story.append(Paragraph(f"Customer: {customer_id or 'All customers'}", styles['Normal']))
+    story.append(Paragraph(f"Period: {start_date} to {end_date}", styles['Normal']))
+    story.append(Spacer(1, 20))
+
+    rows = [['Invoice Number', 'Date', 'Customer', 'Currency', 'Total']]
+    totals = {}
+    for invoice in invoices:
+        invoice_data = invoice.get('InvoiceData', {})
+        currency = invoice_data.get('currency', 'USD')
+        amount = invoice_data.get('total_amount', 0)
+        totals[currency] = totals.get(currency, 0) + amount
+        rows.append([
+            invoice['InvoiceId'],
+            invoice_date(invoice),
+            invoice_data.get('customer_name', 'N/A'),
+            currency,
+            f"{amount:.2f}"
+        ])
+    for currency, total in sorted(totals.items()):
+        rows.append(['Total', '', '', currency, f"{total:.2f}"])
+
+    summary_table = Table(rows, colWidths=[150, 70, 140, 60, 80], repeatRows=1)
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, len(invoices) + 1), (-1, -1), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    story.append(summary_table)
+
+    doc.build(story)
+    return pdf_buffer.getvalue()
+
+class S3MultipartWriter:
+    """Write-only file object that streams to S3 in multipart chunks"""
+
+    def __init__(self, bucket, key, content_type):
+        self.bucket = bucket
+        self.key = key
+        self.buffer = bytearray()
+        self.parts = []
+        self.position = 0
+        upload = s3_client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+        self.upload_id = upload['UploadId']
+
+    def write(self, data):
+        self.buffer.extend(data)
+        self.position += len(data)
+        if len(self.buffer) >= MULTIPART_PART_SIZE:
+            self._upload_part()
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise OSError("S3MultipartWriter is not seekable")
+
+    def flush(self):
+        pass
+
+    def _upload_part(self):
+        part_number = len(self.parts) + 1
+        response = s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=bytes(self.buffer)
+        )
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        self.buffer.clear()
+
+    def close(self):
+        if self.buffer or not self.parts:
+            self._upload_part()
+        s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={'Parts': self.parts}
+        )
+
+    def abort(self):
+        try:
+            s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception as e:
+            print(f"Failed to abort multipart upload for {self.key}: {str(e)}")
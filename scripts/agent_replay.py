@@ -0,0 +1,318 @@
+"""
+Record/replay harness for the invoice agent.
+
+Recording wraps the real Bedrock models and stores every model stream (with
+event timings) and every agent tool call as one JSON fixture per prompt.
+Replaying serves those streams from ReplayModel with the recorded timing
+scaled by latency_scale, while DynamoDB and CloudWatch are swapped for
+in-memory doubles, so the whole pipeline runs offline and reproducibly.
+Prompts without a recording fall back to StubModel's canned answers.
+
+Used by scripts/bench_agent.py.
+"""
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agentcore'))
+
+from strands.hooks import AfterToolCallEvent, BeforeToolCallEvent, HookProvider  # noqa: E402
+from strands.models.model import Model  # noqa: E402
+
+from model_router import StubModel  # noqa: E402
+
+# Key attributes per table, matched against the end of the configured table name
+KEY_SCHEMAS = {
+    "Invoices": ("InvoiceId",),
+    "TaxRates": ("CountryRegion", "TaxType"),
+    "AgentResultCache": ("CacheKey",),
+}
+
+def prompt_of(messages):
+    """Text of the first user message - the invoice prompt that identifies a conversation"""
+    for message in messages:
+        if message.get("role") == "user":
+            return "".join(block.get("text", "") for block in message.get("content", []))
+    return ""
+
+def turn_of(messages):
+    """Index of the model turn about to be generated"""
+    return sum(1 for message in messages if message.get("role") == "assistant")
+
+def fixture_key(prompt):
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+class FixtureStore:
+    """Recorded conversations keyed by prompt, one JSON file each"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.fixtures = {}
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            with open(path) as f:
+                fixture = json.load(f)
+            self.fixtures[fixture_key(fixture["prompt"])] = fixture
+
+    def _fixture(self, prompt):
+        return self.fixtures.setdefault(fixture_key(prompt), {"prompt": prompt, "tiers": {}, "tool_calls": []})
+
+    def turn(self, prompt, tier, turn):
+        """Recorded [(offset_ms, event)] for a turn; falls back to another tier's recording"""
+        fixture = self.fixtures.get(fixture_key(prompt))
+        if fixture is None:
+            return None
+        tiers = fixture["tiers"]
+        for candidate in [tier] + sorted(t for t in tiers if t != tier):
+            turns = tiers.get(candidate, {}).get("turns", [])
+            if turn < len(turns):
+                return turns[turn]
+        return None
+
+    def record_turn(self, prompt, tier, turn, events):
+        turns = self._fixture(prompt)["tiers"].setdefault(tier, {"turns": []})["turns"]
+        turns[turn:] = [events]
+
+    def record_tool_call(self, prompt, call):
+        self._fixture(prompt)["tool_calls"].append(call)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for key, fixture in self.fixtures.items():
+            with open(os.path.join(self.directory, f"{key}.json"), 'w') as f:
+                json.dump(fixture, f, indent=2, default=str)
+        return len(self.fixtures)
+
+class RecordingModel(Model):
+    """Passes a real model's stream through unchanged while recording it"""
+
+    def __init__(self, model, tier, store):
+        self.model = model
+        self.tier = tier
+        self.store = store
+
+    def update_config(self, **model_config):
+        self.model.update_config(**model_config)
+
+    def get_config(self):
+        return self.model.get_config()
+
+    def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        return self.model.structured_output(output_model, prompt, system_prompt=system_prompt, **kwargs)
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        prompt, turn = prompt_of(messages), turn_of(messages)
+        events = []
+        started = time.monotonic()
+        async for event in self.model.stream(messages, tool_specs, system_prompt, **kwargs):
+            events.append([round((time.monotonic() - started) * 1000, 3), event])
+            yield event
+        self.store.record_turn(prompt, self.tier, turn, events)
+
+class ReplayModel(Model):
+    """Serves recorded streams; latency_scale 1.0 reproduces the recorded timing, 0 is instant"""
+
+    def __init__(self, tier, store, latency_scale=1.0, default_latency_ms=0.0):
+        self.tier = tier
+        self.store = store
+        self.latency_scale = latency_scale
+        self.fallback = StubModel(tier, latency_ms=default_latency_ms)
+        self.config = {"model_id": f"replay-{tier}"}
+        self.hits = 0
+        self.misses = 0
+
+    def update_config(self, **model_config):
+        self.config.update(model_config)
+
+    def get_config(self):
+        return self.config
+
+    def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        # Only streamed turns are recorded; structured calls get the canned answer
+        self.misses += 1
+        return self.fallback.structured_output(output_model, prompt, system_prompt=system_prompt, **kwargs)
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        recorded = self.store.turn(prompt_of(messages), self.tier, turn_of(messages))
+        if recorded is None:
+            self.misses += 1
+            async for event in self.fallback.stream(messages, tool_specs, system_prompt, **kwargs):
+                yield event
+            return
+
+        self.hits += 1
+        started = time.monotonic()
+        for offset_ms, event in recorded:
+            delay = offset_ms * self.latency_scale / 1000 - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield event
+
+class ToolTimer(HookProvider):
+    """Per-tool call counts and wall time, for agent-invoked and pre-computed tools"""
+
+    def __init__(self, store=None):
+        self.store = store
+        self.stats = defaultdict(lambda: [0, 0.0])
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def register_hooks(self, registry, **kwargs):
+        registry.add_callback(BeforeToolCallEvent, self._before)
+        registry.add_callback(AfterToolCallEvent, self._after)
+
+    def _before(self, event):
+        self._started[event.tool_use["toolUseId"]] = time.perf_counter()
+
+    def _after(self, event):
+        started = self._started.pop(event.tool_use["toolUseId"], None)
+        duration_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+        self.add(event.tool_use["name"], duration_ms)
+        if self.store is not None:
+            self.store.record_tool_call(prompt_of(event.agent.messages), {
+                "name": event.tool_use["name"],
+                "input": event.tool_use.get("input"),
+                "result": event.result,
+                "duration_ms": round(duration_ms, 3)
+            })
+
+    def add(self, name, duration_ms):
+        with self._lock:
+            stats = self.stats[name]
+            stats[0] += 1
+            stats[1] += duration_ms
+
+    def wrap(self, fn, name):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(name, (time.perf_counter() - started) * 1000)
+        return timed
+
+class _Table:
+    def __init__(self, name, latency_ms, db):
+        suffix = next((s for s in KEY_SCHEMAS if s in name), None)
+        self.name = name
+        self.meta = SimpleNamespace(client=db)
+        self.key_names = KEY_SCHEMAS.get(suffix, ("Id",))
+        self.latency_ms = latency_ms
+        self.items = {}
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _key(self, item):
+        return tuple(item.get(name) for name in self.key_names)
+
+    def get_item(self, Key, **kwargs):
+        self._wait()
+        item = self.items.get(self._key(Key))
+        return {"Item": dict(item)} if item is not None else {}
+
+    def put_item(self, Item, **kwargs):
+        self._wait()
+        with self._lock:
+            self.items[self._key(Item)] = dict(Item)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues=None,
+                    ExpressionAttributeNames=None, **kwargs):
+        """Supports the 'SET a = :x, #b = :y' form used by the agent"""
+        self._wait()
+        self._apply_update(Key, UpdateExpression, ExpressionAttributeValues, ExpressionAttributeNames)
+        return {}
+
+    def _apply_update(self, Key, UpdateExpression, ExpressionAttributeValues=None,
+                      ExpressionAttributeNames=None):
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self._lock:
+            item = self.items.setdefault(self._key(Key), dict(Key))
+            for assignment in UpdateExpression.strip()[len('SET'):].split(','):
+                attribute, placeholder = (part.strip() for part in assignment.split('='))
+                item[names.get(attribute, attribute)] = values[placeholder]
+
+    def query(self, KeyConditionExpression=None, Limit=None, **kwargs):
+        """Equality on the hash key only; enough for the agent's CustomerIndex lookups"""
+        self._wait()
+        expression = KeyConditionExpression.get_expression() if KeyConditionExpression else None
+        with self._lock:
+            items = list(self.items.values())
+        if expression and expression["operator"] == "=":
+            attribute, value = expression["values"][0].name, expression["values"][1]
+            items = [item for item in items if item.get(attribute) == value]
+        return {"Items": items[:Limit] if Limit else items}
+
+class InMemoryDynamoDB:
+    """Stand-in for boto3.resource('dynamodb') covering the calls the agent makes"""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self.tables = {}
+        self._lock = threading.Lock()
+
+    def Table(self, name):
+        with self._lock:
+            if name not in self.tables:
+                self.tables[name] = _Table(name, self.latency_ms, self)
+            return self.tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            responses[name] = [item for key in request["Keys"] if (item := table.get_item(Key=key).get("Item"))]
+        return {"Responses": responses}
+
+class MetricsRecorder:
+    """Stand-in for the CloudWatch client; keeps every datum published"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def put_metric_data(self, Namespace, MetricData):
+        self.metrics.extend(MetricData)
+        return {}
+
+    def total(self, metric_name):
+        return sum(datum['Value'] for datum in self.metrics if datum['MetricName'] == metric_name)
+
+def install_doubles(table_latency_ms=0.0):
+    """Point every agent module at in-memory DynamoDB and CloudWatch; returns (dynamodb, metrics)"""
+    import model_router
+    import prompt_builder
+    import result_cache
+    import result_store
+    import tax_rates
+
+    db = InMemoryDynamoDB(table_latency_ms)
+    metrics = MetricsRecorder()
+    for module in (tax_rates, result_cache, result_store, model_router):
+        module.dynamodb = db
+    for module in (result_cache, result_store, prompt_builder, model_router):
+        module.cloudwatch = metrics
+    result_cache._table = None
+    result_store.result_writer._table = db.Table(result_store.result_writer.table_name)
+    return db, metrics
+
+def install_models(factory):
+    """Route every agent's model through factory(tier)"""
+    import invoice_agent
+    invoice_agent.model_for_tier = factory
+
+def install_tool_timer(timer):
+    """Time agent-invoked tools through hooks and pre-computed ones by wrapping them"""
+    import invoice_agent
+    invoice_agent.AGENT_HOOKS.append(timer)
+    for name in ("validate_invoice_fields", "validate_line_items", "get_tax_rate", "convert_currency"):
+        setattr(invoice_agent, name, timer.wrap(getattr(invoice_agent, name), f"{name} (pre-computed)"))
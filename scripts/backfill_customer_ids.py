@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Copies InvoiceData.customer_id to the top-level CustomerId of invoices ingested before the trigger did
+Usage: python scripts/backfill_customer_ids.py --table T [--endpoint-url URL] [--dry-run]
+
+CustomerIndex is keyed on CustomerId, which customer statements (pdf-generator) and the agent's
+discrepancy history (agentcore/model_router.py) query. Older items only carry customer_id inside
+InvoiceData, or inside its inline summary when the payload was offloaded to S3, so they are
+invisible to both until this runs once. Items that already have CustomerId, or whose invoice
+has no customer_id, are left alone; re-running is safe.
+"""
+import argparse
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+def backfill(table, dry_run=False):
+    """Returns (updated, skipped) counts"""
+    scan_params = {
+        'FilterExpression': Attr('CustomerId').not_exists(),
+        'ProjectionExpression': 'InvoiceId, InvoiceData.customer_id'
+    }
+    updated = skipped = 0
+    while True:
+        response = table.scan(**scan_params)
+        for item in response.get('Items', []):
+            customer_id = (item.get('InvoiceData') or {}).get('customer_id')
+            if not customer_id:
+                skipped += 1
+                continue
+            if not dry_run:
+                try:
+                    table.update_item(
+                        Key={'InvoiceId': item['InvoiceId']},
+                        UpdateExpression='SET CustomerId = :customer',
+                        ConditionExpression='attribute_exists(InvoiceId) AND attribute_not_exists(CustomerId)',
+                        ExpressionAttributeValues={':customer': str(customer_id)}
+                    )
+                except ClientError as e:
+                    # Archived or written by the trigger since the scan read it
+                    if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                        raise
+                    skipped += 1
+                    continue
+            updated += 1
+        if 'LastEvaluatedKey' not in response:
+            return updated, skipped
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--table', required=True)
+    parser.add_argument('--endpoint-url')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    table = boto3.resource('dynamodb', endpoint_url=args.endpoint_url).Table(args.table)
+    updated, skipped = backfill(table, args.dry_run)
+    action = 'Would set' if args.dry_run else 'Set'
+    print(f"{action} CustomerId on {updated} invoices; {skipped} have no customer_id or were already done")
+
+if __name__ == '__main__':
+    main()
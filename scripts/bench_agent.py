@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the agent pipeline end to end through process_invoice (validate_batch)
+Usage: python scripts/bench_agent.py [--synthetic N] [--lines L] [--concurrency C]
+                                     [--fixtures DIR] [--latency-scale X] [--default-latency-ms MS]
+                                     [--table-latency-ms MS] [--record] [--verbose]
+
+Replays recorded model streams from --fixtures (default scripts/fixtures, which holds
+recordings for the sample-data invoices) against in-memory DynamoDB/CloudWatch; prompts
+without a recording get StubModel answers after --default-latency-ms, and the run fails
+if no model turn was served from a recording (stale fixtures or a wrong --fixtures). --record runs against live Bedrock and AWS instead and
+writes the fixtures. In replay mode the in-memory invoices table is seeded with
+HISTORY_FLAGGED prior flagged invoices for HISTORY_CUSTOMER, so the routing's
+discrepancy-history factor is exercised through the CustomerIndex lookup.
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agentcore'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import agent_replay  # noqa: E402
+import invoice_agent  # noqa: E402
+from bench_line_items import synthetic_invoice  # noqa: E402
+
+SAMPLE_DATA = os.path.join(os.path.dirname(__file__), '..', 'sample-data')
+# Customer of sample-data/invoice-test-validation.json, given a record of flagged invoices
+HISTORY_CUSTOMER = 'CUST-TEST-0002'
+HISTORY_FLAGGED = 3
+
+def load_corpus(synthetic, lines):
+    invoices = []
+    for path in sorted(glob.glob(os.path.join(SAMPLE_DATA, 'invoice-*.json'))):
+        with open(path) as f:
+            invoices.append({"invoice_id": os.path.basename(path)[:-len('.json')], "invoice_data": json.load(f)})
+    for i in range(synthetic):
+        invoice = synthetic_invoice(lines, bad_every=0)
+        invoice.update({"customer_name": f"Synthetic Customer {i}", "customer_id": f"SYN-CUST-{i:05d}",
+                        "invoice_number": f"SYN-{i:05d}",
+                        "invoice_date": "2024-01-15", "country": "US", "state": "NY"})
+        invoices.append({"invoice_id": f"synthetic-{i}", "invoice_data": invoice})
+    return invoices
+
+def seed_discrepancy_history(db):
+    """Prior invoices for HISTORY_CUSTOMER as the trigger stores them, with a top-level CustomerId"""
+    table = db.Table(os.environ.get('INVOICES_TABLE', 'globalinvoiceai-Invoices-dev'))
+    for i in range(HISTORY_FLAGGED):
+        table.put_item(Item={"InvoiceId": f"history-{i}", "CustomerId": HISTORY_CUSTOMER,
+                             "Status": "NEEDS_REVIEW", "CreatedAt": f"2023-12-{i + 1:02d}T00:00:00"})
+
+def record_history_lookups(lookups):
+    """Wrap the agent's discrepancy-history lookup to keep {customer_id: flagged count}"""
+    lookup = invoice_agent.get_discrepancy_history
+
+    def recorded(customer_id):
+        flagged = lookup(customer_id)
+        lookups[customer_id] = flagged
+        return flagged
+    invoice_agent.get_discrepancy_history = recorded
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+async def run_batch(invoices, concurrency):
+    payload = {"operation": "validate_batch", "invoices": invoices, "concurrency": concurrency}
+    started = time.perf_counter()
+    events = []
+    async for event in invoice_agent.process_invoice(payload, None):
+        events.append((time.perf_counter() - started, event))
+    return time.perf_counter() - started, events
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--synthetic', type=int, default=50)
+    parser.add_argument('--lines', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=invoice_agent.BATCH_CONCURRENCY)
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(__file__), 'fixtures'))
+    parser.add_argument('--latency-scale', type=float, default=1.0)
+    parser.add_argument('--default-latency-ms', type=float, default=500.0)
+    parser.add_argument('--table-latency-ms', type=float, default=5.0)
+    parser.add_argument('--record', action='store_true')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    store = agent_replay.FixtureStore(args.fixtures)
+    timer = agent_replay.ToolTimer(store if args.record else None)
+    agent_replay.install_tool_timer(timer)
+
+    metrics = None
+    replay_models = {}
+    history_lookups = {}
+    record_history_lookups(history_lookups)
+    if args.record:
+        live_models = invoice_agent.model_for_tier
+        agent_replay.install_models(lambda tier: agent_replay.RecordingModel(live_models(tier), tier, store))
+    else:
+        db, metrics = agent_replay.install_doubles(args.table_latency_ms)
+        seed_discrepancy_history(db)
+
+        def replay_model(tier):
+            if tier not in replay_models:
+                replay_models[tier] = agent_replay.ReplayModel(tier, store, args.latency_scale,
+                                                               args.default_latency_ms)
+            return replay_models[tier]
+        agent_replay.install_models(replay_model)
+
+    invoices = load_corpus(args.synthetic, args.lines)
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        elapsed, events = asyncio.run(run_batch(invoices, args.concurrency))
+
+    results = [event for _, event in events if "invoice_id" in event]
+    finish_times = [at for at, event in events if "invoice_id" in event]
+    statuses = Counter(event.get("status") for event in results)
+    tiers = Counter(event.get("model_tier") for event in results if event.get("status") == "success")
+
+    print(f"Mode:                     {'record (live)' if args.record else 'replay'}")
+    print(f"Invoices:                 {len(invoices)} ({args.synthetic} synthetic x {args.lines} lines)")
+    print(f"Concurrency:              {args.concurrency}")
+    print(f"Wall time:                {elapsed:8.2f} s")
+    print(f"Throughput:               {len(results) / elapsed:8.2f} invoices/s")
+    print(f"Completion p50 / p95:     {percentile(finish_times, 0.5):8.2f} s / {percentile(finish_times, 0.95):.2f} s")
+    print(f"Results:                  {dict(statuses)}")
+    print(f"Model tiers:              {dict(tiers)}")
+    replay_turns = replay_misses = 0
+    if replay_models:
+        replay_misses = sum(model.misses for model in replay_models.values())
+        replay_turns = replay_misses + sum(model.hits for model in replay_models.values())
+        print(f"Replay misses (stubbed):  {replay_misses} of {replay_turns} model turns "
+              f"({100 * replay_misses / max(replay_turns, 1):.0f}%)")
+    flagged_customers = {customer: flagged for customer, flagged in history_lookups.items() if flagged}
+    print(f"History lookups:          {len(history_lookups)} customers, flagged history for {flagged_customers}")
+    if metrics is not None:
+        print(f"Escalations:              {int(metrics.total('ModelEscalation'))}")
+        print(f"Model cycles:             {int(metrics.total('ModelCycles'))}")
+
+    print(f"\n{'Tool':44} {'calls':>7} {'total ms':>10} {'mean ms':>9}")
+    for name, (calls, total_ms) in sorted(timer.stats.items(), key=lambda item: -item[1][1]):
+        print(f"{name:44} {calls:7d} {total_ms:10.1f} {total_ms / calls:9.2f}")
+
+    if args.record:
+        print(f"\nRecorded {store.save()} fixtures to {args.fixtures}")
+    elif replay_turns and replay_misses == replay_turns:
+        sys.exit(f"\nNo model turn matched a recording in {args.fixtures} ({len(store.fixtures)} fixtures); "
+                 "the figures above are StubModel timings. Re-record with --record after prompt changes.")
+
+if __name__ == '__main__':
+    main()
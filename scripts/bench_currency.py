@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Benchmarks batch currency conversion against the per-amount path
+Usage: python scripts/bench_currency.py [conversions]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agentcore'))
+
+from currency import CURRENCY_CODES, convert_amount, convert_batch  # noqa: E402
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(42)
+    amounts = [round(rng.uniform(0.01, 50_000), 2) for _ in range(count)]
+    from_currencies = [rng.choice(CURRENCY_CODES) for _ in range(count)]
+    to_currencies = [rng.choice(CURRENCY_CODES) for _ in range(count)]
+
+    start = time.perf_counter()
+    single = [convert_amount(a, f, t)['converted_amount']
+              for a, f, t in zip(amounts, from_currencies, to_currencies)]
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    converted, _, invalid = convert_batch(amounts, from_currencies, to_currencies)
+    batch_seconds = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(single, converted.tolist()) if a != b)
+
+    print(f"Conversions:        {count:,}")
+    print(f"convert_amount:     {single_seconds * 1000:9.1f} ms  ({count / single_seconds:,.0f}/s)")
+    print(f"convert_batch:      {batch_seconds * 1000:9.1f} ms  ({count / batch_seconds:,.0f}/s)")
+    print(f"Speedup:            {single_seconds / batch_seconds:9.1f}x")
+    print(f"Unsupported rows:   {len(invalid)}")
+    print(f"Result mismatches:  {mismatches}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmarks line-item validation against a bare per-line Python loop
+Usage: python scripts/bench_line_items.py [lines]
+
+validate_line_items (dict input, one checked pass) should stay within a few percent
+of the bare loop, which skips the NaN and header checks. The column figures show
+what the vectorized path costs when the columns have to be built from dicts first;
+each figure is the best of 5 runs.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agentcore'))
+
+from line_items import check_line_items, load_line_item_columns, validate_line_items  # noqa: E402
+
+def synthetic_invoice(lines, bad_every=1000):
+    rng = random.Random(7)
+    line_items = []
+    for i in range(lines):
+        quantity = rng.randint(1, 50)
+        unit_price = round(rng.uniform(0.5, 500), 2)
+        total = round(quantity * unit_price, 2)
+        if bad_every and i % bad_every == 0:
+            total += 1.0
+        line_items.append({"description": f"Item {i}", "quantity": quantity,
+                           "unit_price": unit_price, "total": total})
+    subtotal = round(sum(item["total"] for item in line_items), 2)
+    tax_amount = round(subtotal * 0.08, 2)
+    return {"currency": "USD", "line_items": line_items, "subtotal": subtotal,
+            "tax_rate": 0.08, "tax_amount": tax_amount, "total_amount": round(subtotal + tax_amount, 2)}
+
+def loop_validate(invoice):
+    """Reference implementation: the straightforward per-line loop"""
+    bad = []
+    lines_sum = 0.0
+    for i, item in enumerate(invoice["line_items"]):
+        if abs(item["quantity"] * item["unit_price"] - item["total"]) > 0.005:
+            bad.append(i)
+        lines_sum += item["total"]
+    return bad, abs(lines_sum - invoice["subtotal"]) <= 0.005
+
+def timed(fn, *args):
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    invoice = synthetic_invoice(lines)
+
+    (loop_bad, _), loop_seconds = timed(loop_validate, invoice)
+    result, full_seconds = timed(validate_line_items, invoice)
+    columns, load_seconds = timed(load_line_item_columns, invoice["line_items"])
+    _, check_seconds = timed(check_line_items, *columns, invoice["subtotal"], invoice["tax_amount"],
+                             invoice["total_amount"], invoice["tax_rate"], "USD")
+
+    print(f"Lines:                    {lines:,}")
+    print(f"Python loop:              {loop_seconds * 1000:8.1f} ms")
+    print(f"validate_line_items:      {full_seconds * 1000:8.1f} ms")
+    print(f"Columns from dicts:       {load_seconds * 1000:8.1f} ms")
+    print(f"Vectorized checks:        {check_seconds * 1000:8.1f} ms")
+    print(f"Mismatched rows:          {len(result['mismatched_rows'])} (loop found {len(loop_bad)})")
+    print(f"Errors:                   {result['errors']}")
+
+if __name__ == '__main__':
+    main()
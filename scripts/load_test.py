@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Load-tests the upload pipeline offline: invoice-trigger -> agent -> pdf-generator
+Usage: python scripts/load_test.py [--rate R] [--duration S] [--workers W] [--invoices-per-file N]
+                                   [--aws-latency-ms MS] [--agent-latency-ms MS] [--agent-jitter-ms MS]
+                                   [--agent-concurrency C] [--review-every N] [--poll-interval S] [--verbose]
+
+The real Lambda handlers run in-process against moto (S3, DynamoDB, SSM, CloudWatch) and
+an AgentCore stand-in that answers the trigger's invoke_agent calls after --agent-latency-ms.
+Every AWS call first sleeps --aws-latency-ms. S3 events are fired at --rate files per second
+for --duration seconds; each file is ingested by invoice-trigger, then pdf-generator renders
+every invoice it produced. Latency is measured from each event's scheduled time, so queueing
+shows up when the pipeline can't keep up with the rate. Meanwhile a dashboard stand-in
+polls GET /invoices/changes every --poll-interval seconds, with scripts/stream_simulator.py
+feeding the Invoices stream to change-feed, and at the end the list it built from the
+deltas is checked against the table. Needs moto, reportlab and pypdf.
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+os.environ.update({
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'INVOICES_TABLE': 'loadtest-Invoices',
+    'CHANGES_TABLE': 'loadtest-InvoiceChanges',
+    'CHANGES_SETTLE_SECONDS': '0',
+    'LOGS_TABLE': 'loadtest-ProcessingLogs',
+    'UPLOAD_BUCKET': 'loadtest-upload',
+    'PROCESSED_BUCKET': 'loadtest-processed',
+    'PAYLOAD_BUCKET': 'loadtest-payloads',
+    'AGENTCORE_RUNTIME_PARAM': '/globalinvoiceai/agentcore/runtime-arn',
+    'ENVIRONMENT': 'loadtest',
+})
+
+# The Lambdas import the shared tracing module, which the deploy workflow copies into their packages
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agentcore'))
+
+import boto3  # noqa: E402
+from moto import mock_aws  # noqa: E402
+from stream_simulator import StreamSimulator  # noqa: E402
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), '..', 'lambda')
+SAMPLE_DATA = os.path.join(os.path.dirname(__file__), '..', 'sample-data')
+
+# Trigger-side AWS calls grouped into pipeline stages
+TRIGGER_STAGES = {
+    "s3.GetObject": "s3_read",
+    "dynamodb.PutItem": "ingest",
+    "ssm.GetParameter": "ssm_lookup",
+    "agentcore.InvokeAgent": "agent",
+    "dynamodb.UpdateItem": "status_update",
+    "cloudwatch.PutMetricData": "metrics",
+}
+STAGE_ORDER = ["queue_wait", "s3_read", "ingest", "ssm_lookup", "agent", "status_update", "metrics",
+               "trigger_total", "pdf_total", "end_to_end"]
+
+def load_handler(name):
+    """Import lambda/<name>/index.py under its own module name"""
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(LAMBDA_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class FileRecord:
+    """Timings and AWS calls for one uploaded file"""
+
+    def __init__(self, key, scheduled):
+        self.key = key
+        self.scheduled = scheduled
+        self.phase = "trigger"
+        self.stages = defaultdict(float)
+        self.calls = Counter()
+        self.call_ms = defaultdict(float)
+        self.invoice_ids = []
+        self.pdfs = Counter()
+        self.error = None
+
+class CallTracker:
+    """botocore hooks that inject latency before each AWS call and attribute it to the current file"""
+
+    def __init__(self, latency_ms):
+        self.latency_ms = latency_ms
+        self.local = threading.local()
+
+    @property
+    def record(self):
+        return getattr(self.local, 'record', None)
+
+    @record.setter
+    def record(self, record):
+        self.local.record = record
+
+    def instrument(self, client):
+        client.meta.events.register('before-parameter-build', self._capture_invoice_id)
+        client.meta.events.register('before-call', self._before)
+        client.meta.events.register('after-call', self._after)
+        return client
+
+    def _capture_invoice_id(self, model, params, **kwargs):
+        # Invoice ids are generated inside the trigger; collect them from its PutItem calls
+        record = self.record
+        if record is not None and model.name == 'PutItem' and params.get('TableName') == os.environ['INVOICES_TABLE']:
+            invoice_id = params['Item']['InvoiceId']
+            # Already in wire format ({'S': ...}) if the resource layer serialized it first
+            record.invoice_ids.append(invoice_id['S'] if isinstance(invoice_id, dict) else invoice_id)
+
+    def _before(self, model, **kwargs):
+        record = self.record
+        if self.latency_ms and record is not None:
+            time.sleep(self.latency_ms / 1000)
+        self.local.started = time.perf_counter()
+
+    def _after(self, model, **kwargs):
+        if self.record is not None:
+            self.add(f"{model.service_model.service_name}.{model.name}",
+                     (time.perf_counter() - self.local.started) * 1000 + self.latency_ms)
+
+    def add(self, name, duration_ms):
+        record = self.record
+        record.calls[name] += 1
+        record.call_ms[name] += duration_ms
+        if record.phase == "trigger" and name in TRIGGER_STAGES:
+            record.stages[TRIGGER_STAGES[name]] += duration_ms
+
+class FakeAgentCore:
+    """Answers invoke_agent like the runtime: NDJSON events, the answer text then a final status event for one invoice"""
+
+    def __init__(self, tracker, latency_ms, jitter_ms, concurrency, review_every):
+        self.tracker = tracker
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.concurrency = concurrency
+        self.review_every = review_every
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _result(self):
+        with self._lock:
+            self.count += 1
+            review = self.review_every and self.count % self.review_every == 0
+        return {"status": "NEEDS_REVIEW" if review else "VALIDATED", "valid": not review,
+                "confidence": 0.9, "errors": [], "warnings": []}
+
+    def _latency(self):
+        return max(self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms), 0)
+
+    def invoke_agent(self, agentArn, runtimeEndpoint, prompt):
+        started = time.perf_counter()
+        if prompt.get("operation") == "validate_batch":
+            invoices = prompt["invoices"]
+            # The runtime validates `concurrency` invoices at a time
+            time.sleep(sum(self._latency() for _ in range(math.ceil(len(invoices) / self.concurrency))) / 1000)
+            body = "".join(json.dumps({"invoice_id": entry["invoice_id"], "status": "success",
+                                       "response": json.dumps(self._result())}) + "\n" for entry in invoices)
+        else:
+            time.sleep(self._latency() / 1000)
+            response = json.dumps(self._result())
+            body = json.dumps(response) + "\n" + json.dumps({"status": "success", "response": response}) + "\n"
+        self.tracker.add("agentcore.InvokeAgent", (time.perf_counter() - started) * 1000)
+        return {"completion": [{"chunk": {"bytes": body.encode('utf-8')}}]}
+
+def create_resources():
+    dynamodb = boto3.client('dynamodb')
+    dynamodb.create_table(
+        TableName=os.environ['INVOICES_TABLE'],
+        KeySchema=[{'AttributeName': 'InvoiceId', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'InvoiceId', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST',
+        StreamSpecification={'StreamEnabled': True, 'StreamViewType': 'NEW_AND_OLD_IMAGES'}
+    )
+    dynamodb.create_table(
+        TableName=os.environ['CHANGES_TABLE'],
+        KeySchema=[{'AttributeName': 'Feed', 'KeyType': 'HASH'}, {'AttributeName': 'Seq', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': 'Feed', 'AttributeType': 'S'},
+                              {'AttributeName': 'Seq', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    dynamodb.create_table(
+        TableName=os.environ['LOGS_TABLE'],
+        KeySchema=[{'AttributeName': 'LogId', 'KeyType': 'HASH'}, {'AttributeName': 'Timestamp', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': 'LogId', 'AttributeType': 'S'},
+                              {'AttributeName': 'Timestamp', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    s3 = boto3.client('s3')
+    for bucket in (os.environ['UPLOAD_BUCKET'], os.environ['PROCESSED_BUCKET'], os.environ['PAYLOAD_BUCKET']):
+        s3.create_bucket(Bucket=bucket, CreateBucketConfiguration={'LocationConstraint': os.environ['AWS_DEFAULT_REGION']})
+    boto3.client('ssm').put_parameter(Name=os.environ['AGENTCORE_RUNTIME_PARAM'], Type='String',
+                                      Value='arn:aws:bedrock-agentcore:us-west-2:123456789012:runtime/loadtest')
+
+def upload_files(count, invoices_per_file):
+    """Put `count` synthetic upload files in the bucket, cycling through the sample invoices"""
+    samples = []
+    for name in sorted(os.listdir(SAMPLE_DATA)):
+        if name.startswith('invoice-') and name.endswith('.json'):
+            with open(os.path.join(SAMPLE_DATA, name)) as f:
+                samples.append(json.load(f))
+    s3 = boto3.client('s3')
+    keys = []
+    for i in range(count):
+        invoices = []
+        for j in range(invoices_per_file):
+            invoice = dict(samples[(i * invoices_per_file + j) % len(samples)])
+            invoice['invoice_number'] = f"LOAD-{i:06d}-{j:03d}"
+            invoices.append(invoice)
+        key = f"uploads/load-{i:06d}.json"
+        s3.put_object(Bucket=os.environ['UPLOAD_BUCKET'], Key=key,
+                      Body=json.dumps(invoices[0] if invoices_per_file == 1 else invoices))
+        keys.append(key)
+    return keys
+
+def s3_event(key):
+    return {"Records": [{"s3": {"bucket": {"name": os.environ['UPLOAD_BUCKET']}, "object": {"key": key}}}]}
+
+def process_file(trigger, pdf, tracker, record):
+    tracker.record = record
+    started = time.perf_counter()
+    record.stages["queue_wait"] = (started - record.scheduled) * 1000
+    try:
+        trigger.handler(s3_event(record.key), None)
+        trigger_done = time.perf_counter()
+        record.stages["trigger_total"] = (trigger_done - started) * 1000
+
+        record.phase = "pdf"
+        for invoice_id in record.invoice_ids:
+            response = pdf.handler({"invoiceId": invoice_id, "trace_id": invoice_id}, None)
+            record.pdfs["rendered" if response["statusCode"] == 200 else "skipped"] += 1
+        record.stages["pdf_total"] = (time.perf_counter() - trigger_done) * 1000
+    except Exception as e:
+        record.error = f"{type(e).__name__}: {e}"
+    finally:
+        record.stages["end_to_end"] = (time.perf_counter() - record.scheduled) * 1000
+        tracker.record = None
+
+class ChangePoller:
+    """Keeps an invoice list current from GET /invoices/changes, like a polling dashboard"""
+
+    def __init__(self, trigger, simulator):
+        self.trigger = trigger
+        self.simulator = simulator
+        self.invoices = {}
+        self.polls = []
+        self.cursor = self.request(None)['cursor']
+
+    def request(self, since):
+        event = {"httpMethod": "GET", "path": "/invoices/changes", "pathParameters": None,
+                 "queryStringParameters": {"since": since} if since else None}
+        response = self.trigger.handle_api_request(event, None)
+        if response["statusCode"] != 200:
+            raise RuntimeError(f"GET /invoices/changes returned {response['statusCode']}: {response['body']}")
+        return json.loads(response["body"])
+
+    def poll(self):
+        self.simulator.pump()
+        changes = 0
+        while True:
+            page = self.request(self.cursor)
+            for change in page["changes"]:
+                if change["Op"] == "remove":
+                    self.invoices.pop(change["InvoiceId"], None)
+                else:
+                    self.invoices[change["InvoiceId"]] = change["Status"]
+            changes += len(page["changes"])
+            self.cursor = page["cursor"]
+            if not page["hasMore"]:
+                break
+        self.polls.append(changes)
+
+    def run(self, interval, stop):
+        while not stop.wait(interval):
+            self.poll()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=10.0)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--invoices-per-file', type=int, default=1)
+    parser.add_argument('--aws-latency-ms', type=float, default=5.0)
+    parser.add_argument('--agent-latency-ms', type=float, default=800.0)
+    parser.add_argument('--agent-jitter-ms', type=float, default=200.0)
+    parser.add_argument('--agent-concurrency', type=int, default=4)
+    parser.add_argument('--review-every', type=int, default=10)
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    with mock_aws():
+        create_resources()
+        count = max(int(args.rate * args.duration), 1)
+        keys = upload_files(count, args.invoices_per_file)
+
+        tracker = CallTracker(args.aws_latency_ms)
+        trigger = load_handler('invoice-trigger')
+        pdf = load_handler('pdf-generator')
+        for module in (trigger, pdf):
+            for name in ('s3_client', 'cloudwatch', 'ssm'):
+                if hasattr(module, name):
+                    tracker.instrument(getattr(module, name))
+            tracker.instrument(module.dynamodb.meta.client)
+
+        agentcore = FakeAgentCore(tracker, args.agent_latency_ms, args.agent_jitter_ms,
+                                  args.agent_concurrency, args.review_every)
+        trigger.boto3 = SimpleNamespace(
+            client=lambda name, **kwargs: agentcore if name == 'bedrock-agentcore-runtime' else boto3.client(name, **kwargs),
+            resource=boto3.resource
+        )
+
+        records = []
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            simulator = StreamSimulator(os.environ['INVOICES_TABLE'], load_handler('change-feed').handler)
+            poller = ChangePoller(trigger, simulator)
+            stop_polling = threading.Event()
+            polling = threading.Thread(target=poller.run, args=(args.poll_interval, stop_polling))
+            polling.start()
+        with output, ThreadPoolExecutor(args.workers) as pool:
+            started = time.perf_counter()
+            for i, key in enumerate(keys):
+                scheduled = started + i / args.rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                record = FileRecord(key, scheduled)
+                records.append(record)
+                pool.submit(process_file, trigger, pdf, tracker, record)
+        elapsed = time.perf_counter() - started
+
+        with output:
+            stop_polling.set()
+            polling.join()
+            poller.poll()
+
+        table_statuses = {item['InvoiceId']['S']: item['Status']['S'] for item in boto3.client('dynamodb').scan(
+            TableName=os.environ['INVOICES_TABLE'], ProjectionExpression='InvoiceId, #s',
+            ExpressionAttributeNames={'#s': 'Status'})['Items']}
+        statuses = Counter(table_statuses.values())
+
+    invoices = sum(len(record.invoice_ids) for record in records)
+    errors = Counter(record.error for record in records if record.error)
+    pdfs = sum((record.pdfs for record in records), Counter())
+
+    print(f"Target rate:              {args.rate:8.2f} files/s for {args.duration:.0f} s "
+          f"({args.invoices_per_file} invoices/file, {args.workers} workers)")
+    print(f"Achieved:                 {len(records) / elapsed:8.2f} files/s, {invoices / elapsed:.2f} invoices/s")
+    print(f"Wall time:                {elapsed:8.2f} s")
+    print(f"Invoices:                 {invoices} ({dict(statuses)})")
+    print(f"PDFs:                     {dict(pdfs)}")
+    print(f"Change feed:              {len(poller.polls)} polls, {sum(poller.polls) / max(len(poller.polls), 1):.1f} "
+          f"changes/poll vs {len(table_statuses)} items per full scan; list from deltas "
+          f"{'matches' if poller.invoices == table_statuses else 'DIFFERS from'} the table")
+    if errors:
+        print(f"Failed files:             {sum(errors.values())}")
+        for error, n in errors.most_common(5):
+            print(f"  {n:5d} x {error[:100]}")
+
+    print(f"\n{'Stage (ms per file)':24} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for stage in STAGE_ORDER:
+        values = [record.stages.get(stage, 0.0) for record in records]
+        print(f"{stage:24} {percentile(values, 0.5):9.1f} {percentile(values, 0.95):9.1f} "
+              f"{percentile(values, 0.99):9.1f} {max(values, default=0.0):9.1f}")
+
+    calls = sum((record.calls for record in records), Counter())
+    call_ms = defaultdict(float)
+    for record in records:
+        for name, ms in record.call_ms.items():
+            call_ms[name] += ms
+    print(f"\n{'AWS call':34} {'per invoice':>11} {'mean ms':>9}")
+    for name, n in calls.most_common():
+        print(f"{name:34} {n / max(invoices, 1):11.2f} {call_ms[name] / n:9.2f}")
+    print(f"{'total':34} {sum(calls.values()) / max(invoices, 1):11.2f}")
+
+if __name__ == '__main__':
+    main()
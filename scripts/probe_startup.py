@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Measures agent cold start: image size, import time of invoice_agent and time to first response
+Usage: python scripts/probe_startup.py [--image URI] [--port P] [--timeout S] [--json]
+                                       [--publish] [--max-first-response S]
+
+With --image the probe runs the built container; without it, agentcore/ is started
+with the current interpreter. Time to first response runs from process start until
+an admission_stats invocation returns, so no Bedrock or DynamoDB calls are made.
+--publish sends the numbers to CloudWatch; --max-first-response exits non-zero when
+the first response takes longer, for use as a regression gate in CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'agentcore')
+
+IMPORT_PROBE = "import time; t = time.perf_counter(); import invoice_agent; print(time.perf_counter() - t)"
+
+# Enough for boto3 clients to be created at import without real credentials
+PROBE_ENV = {"AWS_DEFAULT_REGION": os.environ.get('AWS_DEFAULT_REGION', 'us-west-2'), "ROUTING_STUB_MODEL": "1"}
+
+def image_size_mb(image):
+    output = subprocess.run(['docker', 'image', 'inspect', '--format', '{{.Size}}', image],
+                            check=True, capture_output=True, text=True).stdout
+    return int(output.strip()) / 1024 / 1024
+
+def docker_env_args():
+    args = []
+    for name, value in PROBE_ENV.items():
+        args += ['-e', f"{name}={value}"]
+    return args
+
+def import_time(image=None):
+    if image:
+        command = ['docker', 'run', '--rm', '--entrypoint', 'python'] + docker_env_args() + [image, '-c', IMPORT_PROBE]
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
+    else:
+        result = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=AGENT_DIR, check=True,
+                                capture_output=True, text=True, env={**os.environ, **PROBE_ENV})
+    return float(result.stdout.strip().splitlines()[-1])
+
+def start_agent(port, image=None):
+    if image:
+        command = ['docker', 'run', '--rm', '-p', f"{port}:8080"] + docker_env_args() + [image]
+        return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    command = [sys.executable, '-c', f"import invoice_agent; invoice_agent.app.run(port={port})"]
+    return subprocess.Popen(command, cwd=AGENT_DIR, env={**os.environ, **PROBE_ENV},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+def first_response(port, image=None, timeout=60):
+    """Return (seconds until /ping answers, seconds until the first invocation returns)"""
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = start_agent(port, image)
+    try:
+        deadline = started + timeout
+        ready = None
+        while ready is None:
+            if process.poll() is not None:
+                raise RuntimeError(f"Agent exited during startup: {process.stderr.read().decode()[-2000:]}")
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"Agent did not answer /ping within {timeout}s")
+            try:
+                with urllib.request.urlopen(f"{base}/ping", timeout=1) as response:
+                    response.read()
+                ready = time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.05)
+
+        request = urllib.request.Request(f"{base}/invocations", data=json.dumps({"operation": "admission_stats"}).encode(),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+        return ready, time.perf_counter() - started
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def publish(results):
+    import boto3
+    dimensions = [{'Name': 'Environment', 'Value': os.environ.get('ENVIRONMENT', 'dev')}]
+    units = {"image_size_mb": ('AgentImageSize', 'Megabytes'), "import_s": ('AgentImportTime', 'Seconds'),
+             "ready_s": ('AgentTimeToReady', 'Seconds'), "first_response_s": ('AgentTimeToFirstResponse', 'Seconds')}
+    boto3.client('cloudwatch').put_metric_data(Namespace='GlobalInvoiceAI', MetricData=[
+        {'MetricName': name, 'Value': results[key], 'Unit': unit, 'Dimensions': dimensions}
+        for key, (name, unit) in units.items() if results.get(key) is not None
+    ])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--publish', action='store_true')
+    parser.add_argument('--max-first-response', type=float)
+    args = parser.parse_args()
+
+    results = {
+        "image": args.image or "local",
+        "image_size_mb": round(image_size_mb(args.image), 1) if args.image else None,
+        "import_s": round(import_time(args.image), 3),
+    }
+    ready, first = first_response(args.port, args.image, args.timeout)
+    results.update({"ready_s": round(ready, 3), "first_response_s": round(first, 3)})
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"Image:                   {results['image']}")
+        if results["image_size_mb"] is not None:
+            print(f"Image size:              {results['image_size_mb']:8.1f} MB")
+        print(f"Import invoice_agent:    {results['import_s']:8.3f} s")
+        print(f"Time to /ping:           {results['ready_s']:8.3f} s")
+        print(f"Time to first response:  {results['first_response_s']:8.3f} s")
+
+    if args.publish:
+        publish(results)
+    if args.max_first_response is not None and results["first_response_s"] > args.max_first_response:
+        print(f"First response took {results['first_response_s']:.3f}s, over the {args.max_first_response}s limit")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
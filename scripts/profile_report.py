@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Aggregates Lambda profiles written by agentcore/profiling.py into a ranked hot-function report
+Usage: python scripts/profile_report.py [PATH ...] [--bucket B] [--prefix P] [--route R]
+                                        [--sort self|cumulative|calls] [--top N] [--json]
+
+PATHs are profile files or directories of them (*.pstats.gz / *.tracemalloc.gz); with --bucket
+every profile under --prefix (default profiles/) is downloaded as well. CPU profiles are merged
+per function: self and cumulative time are summed and the report shows the share of total
+self time and how many profiles each function appears in. Memory snapshots are merged per
+allocation site and ranked by bytes still allocated when the handler returned. --route keeps
+only profiles whose key contains the given text, e.g. --route GET_/invoices.
+"""
+import argparse
+import glob
+import gzip
+import json
+import marshal
+import os
+import pickle
+import sys
+from collections import defaultdict
+
+PROFILE_SUFFIXES = ('.pstats.gz', '.tracemalloc.gz')
+
+def local_profiles(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for suffix in PROFILE_SUFFIXES:
+                for name in sorted(glob.glob(os.path.join(path, '**', f'*{suffix}'), recursive=True)):
+                    yield name, lambda name=name: open(name, 'rb').read()
+        else:
+            yield path, lambda path=path: open(path, 'rb').read()
+
+def s3_profiles(bucket, prefix):
+    import boto3
+    s3 = boto3.client('s3')
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get('Contents', []):
+            if item['Key'].endswith(PROFILE_SUFFIXES):
+                yield item['Key'], lambda key=item['Key']: s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+
+def function_name(func):
+    filename, line, name = func
+    if filename == '~':
+        return name  # built-ins, e.g. <built-in method marshal.dumps>
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+def merge_cpu(stats, totals):
+    """Add one marshalled pstats dict {func: (cc, nc, tt, ct, callers)} into totals"""
+    for func, (_, calls, self_time, cumulative, _) in stats.items():
+        entry = totals[function_name(func)]
+        entry["calls"] += calls
+        entry["self_s"] += self_time
+        entry["cumulative_s"] += cumulative
+        entry["profiles"] += 1
+
+def merge_memory(snapshot, totals):
+    for stat in snapshot.statistics('lineno'):
+        frame = stat.traceback[0]
+        entry = totals[f"{os.path.basename(frame.filename)}:{frame.lineno}"]
+        entry["bytes"] += stat.size
+        entry["blocks"] += stat.count
+        entry["profiles"] += 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*')
+    parser.add_argument('--bucket')
+    parser.add_argument('--prefix', default='profiles/')
+    parser.add_argument('--route')
+    parser.add_argument('--sort', choices=['self', 'cumulative', 'calls'], default='self')
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+    if not args.paths and not args.bucket:
+        parser.error("give profile paths and/or --bucket")
+
+    sources = list(local_profiles(args.paths))
+    if args.bucket:
+        sources += list(s3_profiles(args.bucket, args.prefix))
+
+    cpu = defaultdict(lambda: {"calls": 0, "self_s": 0.0, "cumulative_s": 0.0, "profiles": 0})
+    memory = defaultdict(lambda: {"bytes": 0, "blocks": 0, "profiles": 0})
+    counts = {"cpu": 0, "memory": 0}
+    for name, read in sources:
+        if args.route and args.route not in name:
+            continue
+        data = gzip.decompress(read())
+        if name.endswith('.pstats.gz'):
+            merge_cpu(marshal.loads(data), cpu)
+            counts["cpu"] += 1
+        else:
+            merge_memory(pickle.loads(data), memory)
+            counts["memory"] += 1
+
+    sort_key = {"self": "self_s", "cumulative": "cumulative_s", "calls": "calls"}[args.sort]
+    total_self = sum(entry["self_s"] for entry in cpu.values()) or 1.0
+    hot = sorted(cpu.items(), key=lambda item: item[1][sort_key], reverse=True)[:args.top]
+    allocations = sorted(memory.items(), key=lambda item: item[1]["bytes"], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            "profiles": counts,
+            "cpu": [{"function": name, **entry, "self_share": entry["self_s"] / total_self} for name, entry in hot],
+            "memory": [{"site": name, **entry} for name, entry in allocations]
+        }, indent=2))
+        return
+
+    if not any(counts.values()):
+        print("No profiles found")
+        sys.exit(1)
+    if counts["cpu"]:
+        print(f"CPU: {counts['cpu']} profiles, {total_self:.3f}s self time, sorted by {args.sort}\n")
+        print(f"{'self s':>9} {'self %':>7} {'cum s':>9} {'calls':>10} {'profiles':>9}  function")
+        for name, entry in hot:
+            print(f"{entry['self_s']:9.3f} {entry['self_s'] / total_self:7.1%} {entry['cumulative_s']:9.3f} "
+                  f"{entry['calls']:10d} {entry['profiles']:9d}  {name}")
+    if counts["memory"]:
+        if counts["cpu"]:
+            print()
+        print(f"Memory: {counts['memory']} snapshots, live allocations at handler return\n")
+        print(f"{'KiB':>10} {'blocks':>9} {'profiles':>9}  site")
+        for name, entry in allocations:
+            print(f"{entry['bytes'] / 1024:10.1f} {entry['blocks']:9d} {entry['profiles']:9d}  {name}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Feeds a DynamoDB table's stream to a Lambda handler locally, the way an event source mapping would
+Usage: python scripts/stream_simulator.py --table T --changes-table C [--endpoint-url URL]
+                                          [--interval S] [--batch-size N]
+
+StreamSimulator reads every shard of the table's stream from the start, in order, and
+calls handler({"Records": [...]}, None) with batches shaped like the Lambda event
+(epoch ApproximateCreationDateTime, eventSourceARN). It works against moto, as
+scripts/load_test.py uses it, and against DynamoDB Local. From the command line it runs
+lambda/change-feed against a local table until interrupted, so GET /invoices/changes
+can be exercised without AWS. The table needs a stream (NEW_AND_OLD_IMAGES).
+"""
+import argparse
+import importlib.util
+import os
+import time
+
+import boto3
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), '..', 'lambda')
+
+class StreamSimulator:
+    def __init__(self, table_name, handler, batch_size=100, endpoint_url=None):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.streams = boto3.client('dynamodbstreams', endpoint_url=endpoint_url)
+        table = boto3.client('dynamodb', endpoint_url=endpoint_url).describe_table(TableName=table_name)['Table']
+        self.stream_arn = table.get('LatestStreamArn')
+        if not self.stream_arn:
+            raise ValueError(f"Table {table_name} has no stream enabled")
+        # shard id -> iterator to resume from; None once a closed shard is drained
+        self.iterators = {}
+
+    def lambda_record(self, record):
+        """A GetRecords record in the shape Lambda delivers it"""
+        stream_record = dict(record['dynamodb'])
+        if 'ApproximateCreationDateTime' in stream_record:
+            stream_record['ApproximateCreationDateTime'] = int(stream_record['ApproximateCreationDateTime'].timestamp())
+        return {**record, 'dynamodb': stream_record, 'eventSourceARN': self.stream_arn}
+
+    def pump(self):
+        """Deliver every record written since the last pump; returns how many were delivered"""
+        delivered = 0
+        shards = self.streams.describe_stream(StreamArn=self.stream_arn)['StreamDescription']['Shards']
+        for shard in shards:
+            shard_id = shard['ShardId']
+            if shard_id not in self.iterators:
+                self.iterators[shard_id] = self.streams.get_shard_iterator(
+                    StreamArn=self.stream_arn, ShardId=shard_id, ShardIteratorType='TRIM_HORIZON'
+                )['ShardIterator']
+            while self.iterators[shard_id]:
+                response = self.streams.get_records(ShardIterator=self.iterators[shard_id], Limit=self.batch_size)
+                self.iterators[shard_id] = response.get('NextShardIterator')
+                if not response['Records']:
+                    break
+                self.handler({"Records": [self.lambda_record(record) for record in response['Records']]}, None)
+                delivered += len(response['Records'])
+        return delivered
+
+def load_handler(name):
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(LAMBDA_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--table', required=True)
+    parser.add_argument('--changes-table', required=True)
+    parser.add_argument('--endpoint-url')
+    parser.add_argument('--interval', type=float, default=1.0)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    os.environ['CHANGES_TABLE'] = args.changes_table
+    change_feed = load_handler('change-feed')
+    if args.endpoint_url:
+        change_feed.dynamodb = boto3.resource('dynamodb', endpoint_url=args.endpoint_url)
+    simulator = StreamSimulator(args.table, change_feed.handler, args.batch_size, args.endpoint_url)
+    print(f"Streaming {simulator.stream_arn} into {args.changes_table}; Ctrl-C to stop")
+    try:
+        while True:
+            simulator.pump()
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()